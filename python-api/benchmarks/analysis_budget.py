@@ -0,0 +1,95 @@
+"""Analysis resolution: fixed RESIZE_WIDTH vs the pixel-budget mode.
+
+Runs the engine's miniature analysis on every Testimages/ photo, cropped to
+three aspect ratios (as shot, a tall half-width strip, a squat half-height
+band) to stand in for tall and squat minis, once with the fixed 300 px
+width and once per pixel budget. Reports the analysed (masked) pixel count
+and the analysis time per case, and their spread across cases — budget
+mode should pin the first and narrow the second.
+
+    python -m benchmarks.analysis_budget [--budgets 40000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+from benchmarks.engine_load import get_engine
+from benchmarks.stability import _TESTIMAGES, _matte_rgb
+from config import ColorDetection
+
+
+def _shapes(rgb: np.ndarray, alpha: np.ndarray):
+    h, w = alpha.shape
+    yield "as shot", rgb, alpha
+    yield "tall", rgb[:, w // 4:3 * w // 4], alpha[:, w // 4:3 * w // 4]
+    yield "squat", rgb[h // 4:3 * h // 4], alpha[h // 4:3 * h // 4]
+
+
+def _analyse(engine, rgb, alpha, repeats: int = 2) -> tuple[int, float]:
+    masked = []
+    original = engine.smart_extractor.extract_colors
+
+    def counting(img, mask, **kwargs):
+        masked.append(int(mask.sum()))
+        return original(img, mask, **kwargs)
+
+    engine.smart_extractor.extract_colors = counting
+    try:
+        best = float('inf')
+        for _ in range(repeats):
+            start = time.perf_counter()
+            engine.analyze_miniature(rgb.copy(), mode="mini", remove_base=True,
+                                     precomputed_rgba=np.dstack([rgb, alpha]))
+            best = min(best, time.perf_counter() - start)
+    finally:
+        del engine.smart_extractor.extract_colors
+    return masked[-1], best * 1000
+
+
+def run(budgets=(40_000,)) -> list[dict]:
+    engine = get_engine()
+    original = ColorDetection.ANALYSIS_PIXEL_BUDGET
+    rows = []
+    try:
+        for name in sorted(os.listdir(_TESTIMAGES)):
+            rgb, alpha = _matte_rgb(os.path.join(_TESTIMAGES, name))
+            for shape, r, a in _shapes(rgb, alpha):
+                for budget in (0, *budgets):
+                    ColorDetection.ANALYSIS_PIXEL_BUDGET = budget
+                    masked, ms = _analyse(engine, np.ascontiguousarray(r),
+                                          np.ascontiguousarray(a))
+                    rows.append({'image': name, 'shape': shape, 'budget': budget,
+                                 'masked_px': masked, 'analysis_ms': ms})
+    finally:
+        ColorDetection.ANALYSIS_PIXEL_BUDGET = original
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budgets", nargs="+", type=int, default=[40_000])
+    args = parser.parse_args()
+    rows = run(args.budgets)
+    print("| image | shape | mode | masked px | analysis ms |")
+    print("|---|---|---|---:|---:|")
+    for r in rows:
+        mode = f"budget {r['budget']}" if r['budget'] else "fixed 300 px"
+        print(f"| {r['image']} | {r['shape']} | {mode} | {r['masked_px']} "
+              f"| {r['analysis_ms']:.0f} |")
+    print("\n| mode | masked px min–max | analysis ms min–max |")
+    print("|---|---:|---:|")
+    for budget in (0, *args.budgets):
+        sel = [r for r in rows if r['budget'] == budget]
+        mode = f"budget {budget}" if budget else "fixed 300 px"
+        px = [r['masked_px'] for r in sel]
+        ms = [r['analysis_ms'] for r in sel]
+        print(f"| {mode} | {min(px)}–{max(px)} | {min(ms):.0f}–{max(ms):.0f} |")
+
+
+if __name__ == "__main__":
+    main()
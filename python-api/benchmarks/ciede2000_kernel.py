@@ -0,0 +1,67 @@
+"""CIEDE2000 per-call latency: skimage vs core.ciede2000.
+
+Times the call shapes the app makes — one pair, and one target against a
+retrieval shortlist (48) or a brand pool (300) — through skimage's
+deltaE_ciede2000 (tiled to image shape, as PaintMatcher used to call it),
+the kernel on raw LAB arrays, and the kernel on candidates prepared once
+with precompute() and gathered per call (the matcher's path). Latency only.
+
+    python -m benchmarks.ciede2000_kernel
+"""
+
+from __future__ import annotations
+
+import time
+
+import numpy as np
+from skimage.color import deltaE_ciede2000
+
+from core.ciede2000 import ciede2000_one_to_many, ciede2000_scalar, precompute
+
+
+def _per_call_us(fn, calls: int = 2000, repeats: int = 3) -> float:
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        best = min(best, time.perf_counter() - start)
+    return best / calls * 1e6
+
+
+def run(sizes=(1, 48, 300)) -> list[dict]:
+    rng = np.random.default_rng(0)
+    db = np.column_stack([rng.uniform(5, 95, 1300), rng.uniform(-60, 60, 1300),
+                          rng.uniform(-60, 60, 1300)])
+    terms = precompute(db)
+    target = np.array([52.0, 31.0, 18.0])
+    rows = []
+    for n in sizes:
+        idx = rng.choice(len(db), n, replace=False)
+
+        def skimage_call():
+            t = np.tile(target, (n, 1)).reshape(n, 1, 3)
+            return deltaE_ciede2000(t, db[idx].reshape(n, 1, 3)).flatten()
+
+        row = {'candidates': n,
+               'skimage_us': _per_call_us(skimage_call),
+               'kernel_raw_us': _per_call_us(lambda: ciede2000_one_to_many(target, db[idx])),
+               'kernel_prepared_us': _per_call_us(
+                   lambda: ciede2000_one_to_many(target, terms.take(idx)))}
+        if n == 1:
+            row['kernel_scalar_us'] = _per_call_us(lambda: ciede2000_scalar(target, db[idx[0]]))
+        rows.append(row)
+    return rows
+
+
+def main() -> None:
+    print("| candidates | skimage µs | kernel (raw LAB) µs | kernel (prepared) µs | scalar µs |")
+    print("|---:|---:|---:|---:|---:|")
+    for r in run():
+        scalar = f"{r['kernel_scalar_us']:.1f}" if 'kernel_scalar_us' in r else "—"
+        print(f"| {r['candidates']} | {r['skimage_us']:.1f} | {r['kernel_raw_us']:.1f} "
+              f"| {r['kernel_prepared_us']:.1f} | {scalar} |")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Pixel colour conversion: skimage chain vs the uint8 LUT kernel.
+
+Times extract_colors' conversion of a scan's masked pixels to CIELAB and
+OKLab — skimage's rgb2lab followed by lab_to_oklab, as the extractor used
+to run it, against core.colour_maths.pixels_to_lab_oklab in float64 and
+float32 — and the peak memory each allocates (tracemalloc).
+
+    python -m benchmarks.colour_conversion
+"""
+
+from __future__ import annotations
+
+import time
+import tracemalloc
+
+import numpy as np
+from skimage.color import rgb2lab
+
+from core.colour_maths import lab_to_oklab, pixels_to_lab_oklab
+
+
+def _skimage_chain(pixels: np.ndarray):
+    lab = rgb2lab(pixels.reshape(-1, 1, 3) / 255.0).reshape(-1, 3)
+    return lab, lab_to_oklab(lab)
+
+
+def _measure(fn, repeats: int = 5) -> tuple[float, float]:
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best * 1000, peak / 1e6
+
+
+def run(sizes=(20_000, 100_000, 250_000)) -> list[dict]:
+    rng = np.random.default_rng(0)
+    rows = []
+    for n in sizes:
+        pixels = rng.integers(0, 256, (n, 3), dtype=np.uint8)
+        for name, fn in (("skimage + lab_to_oklab", lambda: _skimage_chain(pixels)),
+                         ("LUT kernel float64", lambda: pixels_to_lab_oklab(pixels)),
+                         ("LUT kernel float32",
+                          lambda: pixels_to_lab_oklab(pixels, dtype=np.float32))):
+            ms, peak_mb = _measure(fn)
+            rows.append({'pixels': n, 'path': name, 'ms': ms, 'peak_mb': peak_mb})
+    return rows
+
+
+def main() -> None:
+    print("| pixels | path | ms | peak MB |")
+    print("|---:|---|---:|---:|")
+    for r in run():
+        print(f"| {r['pixels']} | {r['path']} | {r['ms']:.1f} | {r['peak_mb']:.1f} |")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Start-up import cost of the API and the scan engine.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter for
+each entry point and reports the total, the import time of every top-level
+package it pulled in (its modules' self times summed), and which of the
+heavy scan-only packages (sklearn, skimage, scipy, cv2, supabase) were
+imported. `main` must import none of them: the web worker binds and answers
+/health and /api/ready while the pre-warm thread pays for them (see
+tests/test_import_budget.py).
+
+    python -m benchmarks.import_time [--modules main core.schemestealer_engine] [--top 12]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+_API_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+HEAVY = ("sklearn", "skimage", "scipy", "cv2", "supabase")
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def importtime(module: str) -> list[tuple[int, int, int, str]]:
+    """(self µs, cumulative µs, depth, name) per import, in -X importtime order."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=_API_ROOT, capture_output=True, text=True, check=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            rows.append((int(m.group(1)), int(m.group(2)), len(m.group(3)) // 2, m.group(4)))
+    return rows
+
+
+def summarise(rows) -> dict:
+    """Total ms, per-top-level-package self ms and the heavy packages seen."""
+    packages: dict[str, float] = defaultdict(float)
+    for self_us, _, _, name in rows:
+        packages[name.split(".")[0]] += self_us / 1000
+    total = sum(cum for _, cum, depth, _ in rows if depth == 0) / 1000
+    return {"total_ms": total, "packages": dict(packages),
+            "heavy": sorted(p for p in HEAVY if p in packages)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modules", nargs="+",
+                        default=["main", "core.schemestealer_engine"])
+    parser.add_argument("--top", type=int, default=12)
+    args = parser.parse_args()
+    for module in args.modules:
+        s = summarise(importtime(module))
+        print(f"## import {module}: {s['total_ms']:.0f} ms "
+              f"(heavy: {', '.join(s['heavy']) or 'none'})\n")
+        print("| package | self ms |")
+        print("|---|---:|")
+        ranked = sorted(s["packages"].items(), key=lambda kv: -kv[1])
+        for name, ms in ranked[:args.top]:
+            print(f"| {name} | {ms:.0f} |")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Inspiration scans: full-resolution extraction vs the coarse-to-fine pyramid.
+
+Runs the engine's inspiration analysis (the call InspirationScannerService
+makes) on every Testimages/ photo with and without INSPIRATION_PYRAMID, and
+reports the extractor's time, the whole analysis's time, and whether the
+pyramid keeps the full-resolution card families — with the family Jaccard
+distance and per-family coverage L1 from benchmarks.stability where not.
+
+A "full +1 LSB" row runs full-resolution extraction on the photo brightened
+by one code value: the card list moves under that too, so it is the noise
+floor the pyramid's disagreement should be read against.
+
+    python -m benchmarks.inspiration_pyramid [--repeats 3]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.engine_load import get_engine
+from benchmarks.stability import (_TESTIMAGES, _coverage_l1, _family_jaccard, _lsb,
+                                  _signature)
+from config import Affiliate, ColorDetection
+
+
+def _cards(engine, rgb: np.ndarray, log: list) -> list[dict]:
+    start = time.perf_counter()
+    artefact = engine.extract(rgb, mode="inspiration", remove_base=False, use_awb=True,
+                              detect_details=False, brands=Affiliate.SUPPORTED_BRANDS)
+    log.append(time.perf_counter() - start)
+    return [{'family': str(r['family']).lower(), 'coverage': float(r['dominance'])}
+            for r in artefact.recipes]
+
+
+def _timed(extract, log: list):
+    def call(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return extract(*args, **kwargs)
+        finally:
+            log.append(time.perf_counter() - start)
+    return call
+
+
+def run(repeats: int = 3) -> list[dict]:
+    engine = get_engine()
+    extractor = engine.smart_extractor
+    original = ColorDetection.INSPIRATION_PYRAMID
+    rows = []
+    try:
+        for name in sorted(os.listdir(_TESTIMAGES)):
+            rgb = np.asarray(Image.open(os.path.join(_TESTIMAGES, name)).convert("RGB"))
+            reference = None
+            for variant in ("full", "pyramid", "full +1 LSB"):
+                ColorDetection.INSPIRATION_PYRAMID = variant == "pyramid"
+                image = _lsb(rgb, 1) if variant.endswith("LSB") else rgb
+                extract_log: list[float] = []
+                total_log: list[float] = []
+                extractor.extract_colors = _timed(type(extractor).extract_colors.__get__(extractor),
+                                                  extract_log)
+                try:
+                    for _ in range(repeats):
+                        cards = _cards(engine, image, total_log)
+                finally:
+                    del extractor.extract_colors
+                if reference is None:
+                    reference = cards
+                rows.append({
+                    'image': name, 'variant': variant,
+                    'extract_ms': min(extract_log) * 1000, 'analysis_ms': min(total_log) * 1000,
+                    'families': _signature(cards)[1],
+                    'same_families': _signature(cards) == _signature(reference),
+                    'family_jaccard': _family_jaccard(cards, reference),
+                    'coverage_l1': _coverage_l1(cards, reference),
+                })
+    finally:
+        ColorDetection.INSPIRATION_PYRAMID = original
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=3, help="best-of-N timing")
+    args = parser.parse_args()
+    print("| image | variant | extract ms | analysis ms | same families "
+          "| family Jaccard | coverage L1 pp | families |")
+    print("|---|---|---:|---:|:---:|---:|---:|---|")
+    for r in run(args.repeats):
+        print(f"| {r['image']} | {r['variant']} | {r['extract_ms']:.0f} "
+              f"| {r['analysis_ms']:.0f} | {'yes' if r['same_families'] else 'no'} "
+              f"| {r['family_jaccard']:.2f} | {r['coverage_l1']:.1f} "
+              f"| {', '.join(r['families'])} |")
+
+
+if __name__ == "__main__":
+    main()
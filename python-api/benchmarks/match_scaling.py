@@ -0,0 +1,133 @@
+"""PaintMatcher latency against paint-DB size.
+
+Builds synthetic DBs of 1k, 10k and 100k paints (six brands, the real role
+categories and families, LABs spread over the gamut) and times match_color
+and match_many with the k-d tree shortlist on and off. Latency only — the
+synthetic paints carry no colour-accuracy meaning; use benchmarks.run for
+that.
+
+    python -m benchmarks.match_scaling [--sizes 1000 10000 100000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np
+
+import core.color_engine as color_engine
+from core.color_engine import Paint, PaintMatcher
+from core.recipe_geometry import FAMILY_ADJACENCY
+
+BRANDS = ["Citadel", "Vallejo", "Army Painter", "AK", "Pro Acryl", "Two Thin Coats"]
+CATEGORIES = ["base", "layer", "contrast", "air", "wash", "shade"]
+FAMILIES = sorted(FAMILY_ADJACENCY)
+
+
+def synthetic_db(n: int, seed: int = 0) -> list[Paint]:
+    rng = np.random.default_rng(seed)
+    labs = np.column_stack([rng.uniform(5, 95, n), rng.uniform(-60, 60, n),
+                            rng.uniform(-60, 60, n)])
+    paints = []
+    for k in range(n):
+        family = FAMILIES[rng.integers(len(FAMILIES))]
+        p = Paint(name=f"synthetic-{k}", brand=BRANDS[k % len(BRANDS)], hex="#808080",
+                  type=CATEGORIES[rng.integers(len(CATEGORIES))], color_family=family,
+                  metallic=family in ("gold", "silver", "bronze"),
+                  transparency=float(rng.choice([0.0, 0.0, 0.0, 0.6])),
+                  paint_id=f"synthetic-{k}", measured_lab=labs[k].tolist())
+        p.compute_properties()
+        paints.append(p)
+    return paints
+
+
+def _targets(n: int, seed: int = 1):
+    rng = np.random.default_rng(seed)
+    labs = np.column_stack([rng.uniform(10, 90, n), rng.uniform(-50, 50, n),
+                            rng.uniform(-50, 50, n)])
+    families = [FAMILIES[i] for i in rng.integers(len(FAMILIES), size=n)]
+    return labs, families
+
+
+def _best_of(fn, repeats: int = 3) -> float:
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _time_matcher(matcher: PaintMatcher, labs, families) -> tuple[float, float]:
+    """(µs per match_color call, µs per cluster × brand through match_many),
+    best of three passes so one-off pool-tree builds are not counted."""
+    def singles():
+        for lab, family in zip(labs, families):
+            for brand in BRANDS:
+                matcher.match_color(None, brand, target_family=family, target_lab=lab)
+
+    def batches():
+        for k in range(0, len(labs), 5):                    # a scan's worth of clusters
+            matcher.match_many(labs[k:k + 5], BRANDS, families=families[k:k + 5])
+
+    calls = len(labs) * len(BRANDS)
+    return _best_of(singles) / calls * 1e6, _best_of(batches) / calls * 1e6
+
+
+def _time_shortlist(matcher: PaintMatcher, labs, families) -> float:
+    """µs per retrieval shortlist alone (stage 1), over the family-gated
+    dominant pools match_color searches."""
+    oks = color_engine._lab_to_oklab(np.asarray(labs))
+    keys = [matcher._candidate_key(brand, "dominant", family, False)
+            for family in families for brand in BRANDS]
+    pools = [matcher._pool(*key) for key in keys]
+    targets = [ok for ok in oks for _ in BRANDS]
+
+    def shortlists():
+        for ok, pool, key in zip(targets, pools, keys):
+            matcher._retrieval_shortlist(ok, pool, key)
+
+    return _best_of(shortlists) / len(keys) * 1e6
+
+
+def run(sizes, n_targets: int = 100) -> list[dict]:
+    labs, families = _targets(n_targets)
+    rows = []
+    for size in sizes:
+        matcher = PaintMatcher(synthetic_db(size))
+        pool = len(matcher._pool(BRANDS[0], "dominant", None, False))
+        saved = color_engine._KDTREE_MIN_POOL
+        try:
+            color_engine._KDTREE_MIN_POOL = 1 << 62
+            scan_single, scan_many = _time_matcher(matcher, labs, families)
+            scan_shortlist = _time_shortlist(matcher, labs, families)
+        finally:
+            color_engine._KDTREE_MIN_POOL = saved
+        tree_single, tree_many = _time_matcher(matcher, labs, families)
+        tree_shortlist = _time_shortlist(matcher, labs, families)
+        rows.append({'paints': size, 'brand_role_pool': pool,
+                     'scan_shortlist_us': scan_shortlist, 'tree_shortlist_us': tree_shortlist,
+                     'scan_match_color_us': scan_single, 'tree_match_color_us': tree_single,
+                     'scan_match_many_us': scan_many, 'tree_match_many_us': tree_many})
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--targets", type=int, default=100)
+    args = parser.parse_args()
+    print("| paints | brand×role pool | shortlist scan µs | shortlist tree µs "
+          "| match_color scan µs | match_color tree µs "
+          "| match_many scan µs/match | match_many tree µs/match |")
+    print("|---:|---:|---:|---:|---:|---:|---:|---:|")
+    for r in run(args.sizes, args.targets):
+        print(f"| {r['paints']} | {r['brand_role_pool']} | {r['scan_shortlist_us']:.1f} "
+              f"| {r['tree_shortlist_us']:.1f} | {r['scan_match_color_us']:.0f} "
+              f"| {r['tree_match_color_us']:.0f} | {r['scan_match_many_us']:.0f} "
+              f"| {r['tree_match_many_us']:.0f} |")
+
+
+if __name__ == "__main__":
+    main()
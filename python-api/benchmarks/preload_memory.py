@@ -0,0 +1,101 @@
+"""Per-worker memory and start-up with and without preload mode (Linux).
+
+Forks N workers the way gunicorn does and reports, per worker, the time
+until it holds warm scanners and its private memory (USS: pages no other
+process shares) after one miniature scan:
+
+  * per-worker  each worker builds its own scanners after the fork (the
+                default pre-warm thread)
+  * preload     the parent builds them once and freezes the heap
+                (services/preload.py); workers inherit them copy-on-write
+
+    python -m benchmarks.preload_memory [--workers 3]
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+
+from benchmarks import engine_load  # noqa: F401  (chdir to python-api/)
+
+
+def _uss_mb(pid: int | str = "self") -> float:
+    total = 0
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            if line.startswith(("Private_Clean:", "Private_Dirty:")):
+                total += int(line.split()[1])
+    return total / 1024
+
+
+def _frame() -> np.ndarray:
+    rng = np.random.default_rng(0)
+    frame = np.zeros((320, 240, 4), np.uint8)
+    frame[40:280, 40:200, :3] = rng.integers(40, 200, (240, 160, 3), dtype=np.uint8)
+    frame[40:280, 40:200, 3] = 255
+    return frame
+
+
+def _worker(scanners, forked_at: float, out_fd: int) -> None:
+    from services.scan_pool import build_scanners
+    if scanners is None:
+        scanners = build_scanners()
+    ready = time.perf_counter() - forked_at
+    scanners["miniature"].scan_array(_frame())
+    os.write(out_fd, f"{ready:.3f} {_uss_mb():.1f}\n".encode())
+    os._exit(0)
+
+
+def run(workers: int, preload: bool) -> list[tuple[float, float]]:
+    scanners = None
+    if preload:
+        from services.preload import preload_scanners
+        scanners = preload_scanners()
+    read_fd, write_fd = os.pipe()
+    pids = []
+    for _ in range(workers):
+        forked_at = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            _worker(scanners, forked_at, write_fd)
+        pids.append(pid)
+        os.waitpid(pid, 0)          # one at a time: single-core timings stay honest
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        rows = [tuple(map(float, line.split())) for line in f]
+    if preload:
+        gc.unfreeze()
+    return rows
+
+
+def main() -> None:
+    warnings.simplefilter("ignore", FutureWarning)
+    if not sys.platform.startswith("linux"):
+        raise SystemExit("needs fork and /proc (Linux)")
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--mode", choices=("per-worker", "preload"))
+    args = parser.parse_args()
+    if args.mode is None:
+        # Each mode in a fresh interpreter, so neither inherits the other's heap.
+        import subprocess
+        print("| mode | worker | ready s | USS MB |")
+        print("|---|---:|---:|---:|")
+        for mode in ("per-worker", "preload"):
+            subprocess.run([sys.executable, "-m", "benchmarks.preload_memory",
+                            "--workers", str(args.workers), "--mode", mode], check=True)
+        return
+    for k, (ready, uss) in enumerate(run(args.workers, args.mode == "preload"), 1):
+        print(f"| {args.mode} | {k} | {ready:.2f} | {uss:.0f} |")
+
+
+if __name__ == "__main__":
+    main()
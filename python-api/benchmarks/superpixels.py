@@ -0,0 +1,87 @@
+"""Superpixel backends on the real photographs: latency and card agreement.
+
+Runs the production engine's miniature analysis on every Testimages/ photo
+once per backend in core/superpixels.py, and reports the superpixel call's
+time, the whole analysis's time, and whether the served cards keep the
+reference (skimage) backend's family multiset — with the family Jaccard
+distance and per-family coverage L1 from benchmarks.stability where not.
+
+The card list is not stable under imperceptible input changes either, so a
+"skimage +1 LSB" row runs the reference on the photo brightened by one
+code value: the noise floor any backend's disagreement should be read
+against.
+
+    python -m benchmarks.superpixels [--backends grid]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import time
+
+from benchmarks.engine_load import get_engine
+from benchmarks.stability import (_TESTIMAGES, _cards, _coverage_l1, _family_jaccard,
+                                  _lsb, _matte_rgb, _signature)
+from core.superpixels import BACKENDS
+
+
+def _timed(backend, log: list):
+    def call(*args):
+        start = time.perf_counter()
+        try:
+            return backend(*args)
+        finally:
+            log.append(time.perf_counter() - start)
+    return call
+
+
+def run(backends=("grid",)) -> list[dict]:
+    engine = get_engine()
+    extractor = engine.smart_extractor
+    original = extractor.superpixel_backend
+    rows = []
+    try:
+        for name in sorted(os.listdir(_TESTIMAGES)):
+            rgb, alpha = _matte_rgb(os.path.join(_TESTIMAGES, name))
+            reference = None
+            for backend in ("skimage", *backends, "skimage +1 LSB"):
+                log: list[float] = []
+                extractor.superpixel_backend = _timed(BACKENDS[backend.split()[0]], log)
+                image = _lsb(rgb, 1) if backend.endswith("LSB") else rgb
+                start = time.perf_counter()
+                cards = _cards(engine, image, alpha, use_awb=True)
+                total = time.perf_counter() - start
+                if reference is None:
+                    reference = cards
+                rows.append({
+                    'image': name, 'backend': backend,
+                    'superpixel_ms': sum(log) * 1000, 'analysis_ms': total * 1000,
+                    'families': _signature(cards)[1],
+                    'same_families': _signature(cards) == _signature(reference),
+                    'family_jaccard': _family_jaccard(cards, reference),
+                    'coverage_l1': _coverage_l1(cards, reference),
+                })
+    finally:
+        extractor.superpixel_backend = original
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", nargs="+", default=["grid"],
+                        choices=sorted(set(BACKENDS) - {"skimage"}),
+                        help="backends to compare with the skimage reference")
+    args = parser.parse_args()
+    print("| image | backend | superpixels ms | analysis ms | same families "
+          "| family Jaccard | coverage L1 pp | families |")
+    print("|---|---|---:|---:|:---:|---:|---:|---|")
+    for r in run(args.backends):
+        print(f"| {r['image']} | {r['backend']} | {r['superpixel_ms']:.0f} "
+              f"| {r['analysis_ms']:.0f} | {'yes' if r['same_families'] else 'no'} "
+              f"| {r['family_jaccard']:.2f} | {r['coverage_l1']:.1f} "
+              f"| {', '.join(r['families'])} |")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Merged-cluster medians: peak memory and time of the merge stages.
+
+Runs SmartColorExtractor.extract_colors on every Testimages/ photo at two
+analysis sizes (about 300 and 600 px wide, top eighth masked out) under
+tracemalloc. Reports the whole extraction's traced peak, the peak from the
+start of the perceptual merge to the end of extraction (the working set the
+union medians add to), and the time spent in _combine_clusters.
+
+    python -m benchmarks.union_median
+"""
+
+from __future__ import annotations
+
+import os
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.stability import _TESTIMAGES
+from core.smart_color_system import SmartColorExtractor
+
+_MB = 1024 * 1024
+
+
+def _frames():
+    for name in sorted(os.listdir(_TESTIMAGES)):
+        img = np.array(Image.open(os.path.join(_TESTIMAGES, name)).convert('RGB'))
+        for width in (300, 600):
+            step = max(1, img.shape[1] // width)
+            frame = np.ascontiguousarray(img[::step, ::step])
+            mask = np.ones(frame.shape[:2], dtype=bool)
+            mask[:frame.shape[0] // 8] = False
+            yield name, width, frame, mask
+
+
+def _measure(extractor: SmartColorExtractor, frame, mask) -> dict:
+    peaks, combine_s = [], []
+    merge, combine = extractor._merge_perceptually_similar, extractor._combine_clusters
+
+    def merging(*args, **kwargs):
+        # Peak so far (superpixels, k-means, the sweep), then restart it.
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        return merge(*args, **kwargs)
+
+    def combining(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return combine(*args, **kwargs)
+        finally:
+            combine_s.append(time.perf_counter() - start)
+
+    extractor._merge_perceptually_similar = merging
+    extractor._combine_clusters = combining
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        extractor.extract_colors(frame, mask)
+        merge_peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        del extractor._merge_perceptually_similar, extractor._combine_clusters
+    return {'pixels': int(mask.sum()),
+            'extract_peak_mb': (max(peaks[0], merge_peak) - base) / _MB,
+            'merge_peak_mb': (merge_peak - base) / _MB,
+            'combine_ms': sum(combine_s) * 1000, 'combines': len(combine_s)}
+
+
+def run() -> list[dict]:
+    extractor = SmartColorExtractor()
+    return [dict(image=name, width=width, **_measure(extractor, frame, mask))
+            for name, width, frame, mask in _frames()]
+
+
+def main() -> None:
+    rows = run()
+    print("| image | width | pixels | extract peak MB | merge-stage peak MB "
+          "| combines | combine ms |")
+    print("|---|---:|---:|---:|---:|---:|---:|")
+    for r in rows:
+        print(f"| {r['image']} | {r['width']} | {r['pixels']} | {r['extract_peak_mb']:.1f} "
+              f"| {r['merge_peak_mb']:.1f} | {r['combines']} | {r['combine_ms']:.1f} |")
+    print(f"\ntotal combine ms: {sum(r['combine_ms'] for r in rows):.0f}; "
+          f"max merge-stage peak MB: {max(r['merge_peak_mb'] for r in rows):.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,8 @@ SchemeStealer Configuration
 All magic numbers, thresholds, and settings in one place
 """
 
+import os
+
 # ============================================================================
 # APP CONFIGURATION
 # ============================================================================
@@ -26,6 +28,15 @@ class ColorDetection:
     """
     # Image processing — analysis resolution (used by schemestealer_engine).
     RESIZE_WIDTH = 300
+    # Analysis-budget mode: when > 0 the crop is scaled so the miniature's
+    # foreground covers about this many pixels, whatever its aspect ratio
+    # (never upscaled), instead of to RESIZE_WIDTH. Set per deployment tier
+    # with ANALYSIS_PIXEL_BUDGET; 0 keeps the fixed width.
+    ANALYSIS_PIXEL_BUDGET = int(os.environ.get("ANALYSIS_PIXEL_BUDGET", "0"))
+    # Inspiration scans (no mask) find the palette at half resolution and
+    # refine boundaries and lost detail at full resolution — see
+    # SmartColorExtractor.extract_colors(pyramid=True). INSPIRATION_PYRAMID=1.
+    INSPIRATION_PYRAMID = os.environ.get("INSPIRATION_PYRAMID", "").strip().lower() in ("1", "true", "yes")
 
 
 # ============================================================================
@@ -0,0 +1,242 @@
+"""
+CIEDE2000 colour difference — the dedicated kernel for the hot paths.
+
+skimage.color.deltaE_ciede2000 is an image-space routine: callers reshape
+single colours to (1, 1, 3), tile a target to the candidate count, and every
+call pays input validation and axis shuffling that dwarf the arithmetic on
+the three-to-fifty colours the matcher and classifier actually compare. This
+module computes the same formula — skimage's own formulation, including its
+hue-mean conventions, so the two agree to float rounding (pinned to 1e-9 by
+tests/test_ciede2000.py) — with entry points shaped for those callers:
+
+  * ciede2000_scalar(lab1, lab2)            one pair → float (pure Python)
+  * ciede2000(lab1, lab2)                   row-wise pairs, NumPy broadcasting
+  * ciede2000_one_to_many(target, cands)    one target → (N,)
+  * ciede2000_matrix(targets, cands)        M targets → (M, N)
+
+A candidate set compared many times (the paint DB, the family exemplars) can
+be prepared once with precompute(). Only L*, a*, b* and C*ab are properties
+of one colour: a', C' and h' go through G, which depends on the PAIR's mean
+chroma, and SL, SC, SH and T on the pair's mean lightness, chroma and hue —
+so the prepared block holds those four and every other term is per pair.
+Everything runs in float64 unless dtype=np.float32 is asked for.
+"""
+
+import math
+from typing import Tuple, Union
+
+import numpy as np
+
+_TWO_PI = 2 * math.pi
+_25_POW_7 = 25 ** 7
+# Constants as Python floats, so float32 inputs are not promoted.
+_DEG30 = math.radians(30)
+_DEG6 = math.radians(6)
+_DEG63 = math.radians(63)
+_RAD_TO_DEG = 180.0 / math.pi
+
+# Rows per block of ciede2000_matrix: bounds the kernel's temporaries (about
+# twenty arrays of block × N) to a few MB whatever M is.
+_MATRIX_BLOCK_ELEMENTS = 1 << 16
+
+
+class Ciede2000Terms:
+    """A prepared colour set: the per-colour terms L*, a*, b* and C*ab as the
+    rows of one contiguous (4, N) block, so selecting candidates is a single
+    gather (take) and the rows unpack straight into the kernel."""
+
+    __slots__ = ('block',)
+
+    def __init__(self, block: np.ndarray):
+        self.block = block
+
+    @property
+    def L(self) -> np.ndarray:
+        return self.block[0]
+
+    @property
+    def a(self) -> np.ndarray:
+        return self.block[1]
+
+    @property
+    def b(self) -> np.ndarray:
+        return self.block[2]
+
+    @property
+    def C(self) -> np.ndarray:
+        return self.block[3]
+
+    def take(self, indices) -> 'Ciede2000Terms':
+        return Ciede2000Terms(self.block[:, indices])
+
+    def __len__(self) -> int:
+        return self.block.shape[1]
+
+
+Colours = Union[np.ndarray, Ciede2000Terms]
+
+
+def precompute(labs, dtype=np.float64) -> Ciede2000Terms:
+    """Prepare an (N, 3) LAB array for repeated comparison."""
+    arr = np.asarray(labs, dtype=dtype).reshape(-1, 3)
+    block = np.empty((4, len(arr)), dtype=dtype)
+    block[:3] = arr.T
+    np.hypot(block[1], block[2], out=block[3])
+    return Ciede2000Terms(block)
+
+
+def _terms(colours: Colours, dtype) -> Tuple[np.ndarray, ...]:
+    """(L, a, b, C*ab) of prepared or raw (..., 3) colours."""
+    if isinstance(colours, Ciede2000Terms):
+        return tuple(colours.block)
+    arr = np.asarray(colours, dtype=dtype)
+    L, a, b = arr[..., 0], arr[..., 1], arr[..., 2]
+    return L, a, b, np.hypot(a, b)
+
+
+def _polar_2pi(x, y):
+    """(r, θ) with θ in [0, 2π) — the hue-angle convention of the formula."""
+    r, t = np.hypot(x, y), np.arctan2(y, x)
+    t += np.where(t < 0.0, _TWO_PI, 0)
+    return r, t
+
+
+def _kernel(L1, a1, b1, Cab1, L2, a2, b2, Cab2):
+    """CIEDE2000 (kL = kC = kH = 1) over broadcastable term arrays."""
+    # Distort a* by the mean chroma, then work in the primed L*C'h' space.
+    Cbar = 0.5 * (Cab1 + Cab2)
+    c7 = Cbar ** 7
+    G = 0.5 * (1 - np.sqrt(c7 / (c7 + _25_POW_7)))
+    scale = 1 + G
+    C1, h1 = _polar_2pi(a1 * scale, b1)
+    C2, h2 = _polar_2pi(a2 * scale, b2)
+
+    # Lightness term
+    Lbar = 0.5 * (L1 + L2)
+    tmp = (Lbar - 50) ** 2
+    SL = 1 + 0.015 * tmp / np.sqrt(20 + tmp)
+    L_term = (L2 - L1) / SL
+
+    # Chroma term
+    Cbar = 0.5 * (C1 + C2)
+    SC = 1 + 0.045 * Cbar
+    C_term = (C2 - C1) / SC
+
+    # Hue term; an achromatic colour (C' = 0) has no hue difference.
+    h_diff = h2 - h1
+    h_sum = h1 + h2
+    CC = C1 * C2
+    achromatic = CC == 0.0
+    dH = np.where(h_diff > math.pi, h_diff - _TWO_PI,
+                  np.where(h_diff < -math.pi, h_diff + _TWO_PI, h_diff))
+    dH = np.where(achromatic, 0.0, dH)
+    dH_term = 2 * np.sqrt(CC) * np.sin(dH / 2)
+
+    wrap = ~achromatic & (np.abs(h_diff) > math.pi)
+    Hbar = np.where(wrap & (h_sum < _TWO_PI), h_sum + _TWO_PI,
+                    np.where(wrap & (h_sum >= _TWO_PI), h_sum - _TWO_PI, h_sum))
+    Hbar = np.where(achromatic, Hbar * 2, Hbar)
+    Hbar = Hbar * 0.5
+
+    T = (1
+         - 0.17 * np.cos(Hbar - _DEG30)
+         + 0.24 * np.cos(2 * Hbar)
+         + 0.32 * np.cos(3 * Hbar + _DEG6)
+         - 0.20 * np.cos(4 * Hbar - _DEG63))
+    SH = 1 + 0.015 * Cbar * T
+    H_term = dH_term / SH
+
+    # Hue rotation (the blue-region correction)
+    c7 = Cbar ** 7
+    Rc = 2 * np.sqrt(c7 / (c7 + _25_POW_7))
+    dtheta = _DEG30 * np.exp(-(((Hbar * _RAD_TO_DEG - 275) / 25) ** 2))
+    R_term = -np.sin(2 * dtheta) * Rc * C_term * H_term
+
+    dE2 = L_term ** 2
+    dE2 = dE2 + C_term ** 2
+    dE2 = dE2 + H_term ** 2
+    dE2 = dE2 + R_term
+    return np.sqrt(np.maximum(dE2, 0))
+
+
+def ciede2000(lab1, lab2, dtype=np.float64) -> np.ndarray:
+    """Row-wise CIEDE2000 of two (..., 3) LAB arrays (NumPy broadcasting)."""
+    t1, t2 = _terms(lab1, dtype), _terms(lab2, dtype)
+    return _kernel(*t1, *t2)
+
+
+def ciede2000_one_to_many(target, candidates: Colours, dtype=np.float64) -> np.ndarray:
+    """CIEDE2000 of one LAB triple against N candidates → (N,)."""
+    t = _terms(np.asarray(target, dtype=dtype).reshape(3), dtype)
+    return _kernel(*t, *_terms(candidates, dtype))
+
+
+def ciede2000_matrix(targets, candidates: Colours, dtype=np.float64) -> np.ndarray:
+    """CIEDE2000 of M targets against N candidates → (M, N), computed in
+    row blocks so the temporaries stay small for large M × N."""
+    targets = np.asarray(targets, dtype=dtype).reshape(-1, 3)
+    c = _terms(candidates, dtype)
+    n = c[0].shape[-1]
+    out = np.empty((len(targets), n), dtype=dtype)
+    block = max(1, _MATRIX_BLOCK_ELEMENTS // max(n, 1))
+    for start in range(0, len(targets), block):
+        t = _terms(targets[start:start + block, None, :], dtype)
+        out[start:start + block] = _kernel(*t, *c)
+    return out
+
+
+def ciede2000_scalar(lab1, lab2) -> float:
+    """CIEDE2000 of one pair of LAB triples, in plain float arithmetic — for
+    the callers that compare two colours at a time, where array set-up would
+    cost more than the formula."""
+    L1, a1, b1 = (float(v) for v in lab1)
+    L2, a2, b2 = (float(v) for v in lab2)
+    Cbar = 0.5 * (math.hypot(a1, b1) + math.hypot(a2, b2))
+    c7 = Cbar ** 7
+    scale = 1 + 0.5 * (1 - math.sqrt(c7 / (c7 + _25_POW_7)))
+    C1, h1 = math.hypot(a1 * scale, b1), math.atan2(b1, a1 * scale)
+    C2, h2 = math.hypot(a2 * scale, b2), math.atan2(b2, a2 * scale)
+    if h1 < 0.0:
+        h1 += _TWO_PI
+    if h2 < 0.0:
+        h2 += _TWO_PI
+
+    Lbar = 0.5 * (L1 + L2)
+    tmp = (Lbar - 50) ** 2
+    L_term = (L2 - L1) / (1 + 0.015 * tmp / math.sqrt(20 + tmp))
+
+    Cbar = 0.5 * (C1 + C2)
+    C_term = (C2 - C1) / (1 + 0.045 * Cbar)
+
+    h_diff = h2 - h1
+    h_sum = h1 + h2
+    CC = C1 * C2
+    if CC == 0.0:
+        dH = 0.0
+        Hbar = h_sum * 2 * 0.5
+    else:
+        dH = h_diff
+        Hbar = h_sum
+        if h_diff > math.pi:
+            dH -= _TWO_PI
+        elif h_diff < -math.pi:
+            dH += _TWO_PI
+        if abs(h_diff) > math.pi:
+            Hbar += _TWO_PI if h_sum < _TWO_PI else -_TWO_PI
+        Hbar *= 0.5
+    dH_term = 2 * math.sqrt(CC) * math.sin(dH / 2)
+
+    T = (1
+         - 0.17 * math.cos(Hbar - _DEG30)
+         + 0.24 * math.cos(2 * Hbar)
+         + 0.32 * math.cos(3 * Hbar + _DEG6)
+         - 0.20 * math.cos(4 * Hbar - _DEG63))
+    H_term = dH_term / (1 + 0.015 * Cbar * T)
+
+    c7 = Cbar ** 7
+    Rc = 2 * math.sqrt(c7 / (c7 + _25_POW_7))
+    dtheta = _DEG30 * math.exp(-(((Hbar * _RAD_TO_DEG - 275) / 25) ** 2))
+    R_term = -math.sin(2 * dtheta) * Rc * C_term * H_term
+
+    dE2 = L_term ** 2 + C_term ** 2 + H_term ** 2 + R_term
+    return math.sqrt(max(dE2, 0.0))
@@ -0,0 +1,96 @@
+"""
+Pairwise distances between one scan's clusters, computed once.
+
+After k-means every step of SmartColorExtractor compares cluster medians
+pairwise: the perceptual merge and the same-family dedup group by the ramp
+metric (OKLab), the shadow test and the detail-uniqueness test threshold
+CIEDE2000. A ClusterGraph holds each cluster's OKLab coordinates and both
+pairwise matrices for the whole scan; the steps query submatrices of it,
+and clusters produced by a merge join with one batch of rows against the
+existing nodes rather than a rebuild. Merged-away clusters keep their
+nodes — the graph only grows, by at most one node per merge.
+
+The ramp matrix is dense: every grouping reads all of it. CIEDE2000 is
+filled on demand — the shadow and uniqueness tests only ever ask about a
+few small clusters — and each entry is computed once.
+
+Nodes are keyed by identity (the cluster dicts hold NumPy arrays, so they
+cannot be compared or hashed by value); the graph keeps a reference to
+every cluster it has seen so an id is never reused while it lives.
+"""
+
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+from core.ciede2000 import ciede2000_scalar
+from core.colour_maths import lab_to_oklab
+
+# (n, 3) OKLab × (m, 3) OKLab → (n, m) distances; must be symmetric.
+RampDistance = Callable[[np.ndarray, np.ndarray], np.ndarray]
+
+
+class ClusterGraph:
+    """OKLab coordinates and pairwise ramp / CIEDE2000 distances of a
+    scan's clusters, extended incrementally as clusters merge."""
+
+    def __init__(self, clusters: Sequence[Dict], ramp_distance: RampDistance):
+        self._ramp_distance = ramp_distance
+        self._clusters: List[Dict] = []
+        self._index: Dict[int, int] = {}
+        self._lab = np.empty((0, 3))
+        self._oklab = np.empty((0, 3))
+        self._ramp = np.empty((0, 0))
+        self._delta_e = np.empty((0, 0))
+        self.add(clusters)
+
+    def __len__(self) -> int:
+        return len(self._clusters)
+
+    def add(self, clusters: Sequence[Dict]) -> None:
+        """Add clusters the graph has not seen (typically merge results):
+        their rows of each matrix are computed in one batch."""
+        new = list({id(c): c for c in clusters if id(c) not in self._index}.values())
+        if not new:
+            return
+        n = len(self._clusters)
+        lab = np.array([c['median_lab'] for c in new], dtype=float).reshape(-1, 3)
+        oklab = lab_to_oklab(lab)
+        for i, c in enumerate(new):
+            self._index[id(c)] = n + i
+        self._clusters.extend(new)
+        self._lab = np.vstack([self._lab, lab])
+        self._oklab = np.vstack([self._oklab, oklab])
+        self._ramp = self._grow(self._ramp, self._ramp_distance(oklab, self._oklab))
+        self._delta_e = self._grow(self._delta_e,
+                                   np.full((len(new), len(self._clusters)), np.nan))
+
+    @staticmethod
+    def _grow(matrix: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """matrix bordered by the new nodes' rows (and, by symmetry, columns)."""
+        n = matrix.shape[0]
+        grown = np.empty((rows.shape[1], rows.shape[1]))
+        grown[:n, :n] = matrix
+        grown[n:] = rows
+        grown[:, n:] = rows.T
+        return grown
+
+    def nodes(self, clusters: Sequence[Dict]) -> np.ndarray:
+        """Node indices of clusters, adding any the graph has not seen."""
+        self.add(clusters)
+        return np.array([self._index[id(c)] for c in clusters], dtype=np.intp)
+
+    def ramp_matrix(self, clusters: Sequence[Dict]) -> np.ndarray:
+        """(n, n) ramp distances among clusters."""
+        idx = self.nodes(clusters)
+        return self._ramp[np.ix_(idx, idx)]
+
+    def delta_e(self, cluster: Dict, others: Sequence[Dict]) -> np.ndarray:
+        """(n,) CIEDE2000 from cluster's median to each of others'."""
+        idx = self.nodes([cluster, *others])
+        i, js = idx[0], idx[1:]
+        # A handful of pairs per query: the scalar kernel beats array set-up.
+        for j in js[np.isnan(self._delta_e[i, js])]:
+            self._delta_e[i, j] = self._delta_e[j, i] = ciede2000_scalar(
+                self._lab[i], self._lab[j])
+        return self._delta_e[i, js]
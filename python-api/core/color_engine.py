@@ -15,13 +15,15 @@ import colorsys
 import json
 import os
 from skimage import color
-from skimage.color import deltaE_ciede2000
+from scipy.spatial import cKDTree
 from typing import List, Dict, Tuple, Optional
 from dataclasses import dataclass, field
 
 from config import ColorDetection, Visualization, ShadeRules, Matching
 from utils.logging_config import logger
-from core.recipe_geometry import allowed_families
+from core.ciede2000 import ciede2000, ciede2000_one_to_many
+from core.ciede2000 import precompute as precompute_ciede2000
+from core.recipe_geometry import FAMILY_ADJACENCY, allowed_families
 
 
 def annotate_ownership(candidates: List[Tuple['Paint', float]], owned_ids: set) -> Dict[str, Optional[Tuple['Paint', float]]]:
@@ -192,8 +194,9 @@ _ANCHORS = None
 
 
 def _load_anchors():
-    """Load + cache color_anchors.json, pre-stacking each group into one (N,3)
-    LAB array with an aligned family list for vectorised nearest-exemplar."""
+    """Load + cache color_anchors.json, pre-stacking each group into one set of
+    prepared CIEDE2000 terms with an aligned family list for vectorised
+    nearest-exemplar."""
     global _ANCHORS
     if _ANCHORS is None:
         with open(_ANCHORS_PATH, encoding='utf-8') as f:
@@ -205,7 +208,9 @@ def _load_anchors():
                 for lab in labs:
                     pts.append(lab)
                     fams.append(fam)
-            return np.asarray(pts, dtype=float), fams
+            terms = precompute_ciede2000(pts)
+            terms.block.flags.writeable = False
+            return terms, fams
 
         fam_items = list(raw['families'].items())
         metal_items = list(raw['metallic'].items())
@@ -237,9 +242,7 @@ def _nearest_family_margin(group, L, a, b):
     runner-up family is at least twice as far.
     """
     pts, fams = group
-    target = np.array([[[L, a, b]]])
-    candidates = pts.reshape(-1, 1, 3)
-    dists = deltaE_ciede2000(target, candidates).flatten()
+    dists = ciede2000_one_to_many((L, a, b), pts)
     order = np.argsort(dists)
     win_fam = fams[int(order[0])]
     d1 = max(float(dists[order[0]]), 1e-6)
@@ -416,8 +419,10 @@ BASE_MATCH_DELTA_E_CEILING: float = 30.0
 # essentially tie or beat the best grey on true colour distance.
 METALLIC_WIN_TOLERANCE = {"gold": 4.0, "bronze": 4.0, "silver": 1.5}
 _METALLIC_WIN_DEFAULT: float = 1.5
+_METAL_FAMILIES = frozenset({'gold', 'silver', 'bronze'})
 
 from core.colour_maths import ciede2000_single as _ciede2000_single
+from core.delta_e_matrix import PaintDistanceMatrix
 from core.colour_maths import lab_to_oklab as _lab_to_oklab
 
 # Two-stage retrieval: candidates are first shortlisted by OKLab Euclidean
@@ -427,6 +432,13 @@ from core.colour_maths import lab_to_oklab as _lab_to_oklab
 # for any realistic brand pool.
 _RETRIEVAL_SHORTLIST: int = 48
 
+# Pools at least this large are shortlisted through a per-pool cKDTree in
+# OKLab instead of a full distance scan. The crossover measured on
+# the matcher's own arrays is ~300 candidates (a scan costs ~40 µs at 1k and
+# grows linearly; a k=48 tree query stays ~20 µs); every per-brand pool in
+# today's DB (the largest is 309) still takes the scan.
+_KDTREE_MIN_POOL: int = 512
+
 
 def flagged_metallic_for(role: str, context: Optional[dict]) -> bool:
     """Is the scan's metallic flag set for this role?
@@ -450,7 +462,8 @@ def flagged_metallic_for(role: str, context: Optional[dict]) -> bool:
 class PaintMatcher:
     """Match colours to paint database — OKLab retrieval + CIEDE2000 ranking."""
 
-    def __init__(self, paint_db: List[Paint]):
+    def __init__(self, paint_db: List[Paint],
+                 distances: Optional[PaintDistanceMatrix] = None):
         # Exclude non-matchable paints from the search index.
         matchable = [p for p in paint_db if p.matchable]
         self.paint_db = matchable
@@ -458,6 +471,9 @@ class PaintMatcher:
         self.lab_matrix = np.array([p.lab for p in matchable], dtype=float)   # (N, 3)
         self.oklab_matrix = (_lab_to_oklab(self.lab_matrix)
                              if matchable else np.zeros((0, 3)))               # (N, 3)
+        # The per-paint CIEDE2000 terms (L*, a*, b*, C*ab) as one (4, N) block;
+        # everything else in the formula depends on the pair.
+        self.ciede_terms = precompute_ciede2000(self.lab_matrix)
         self.brands_arr = np.array([p.brand for p in matchable])               # (N,)
         self.types_arr  = np.array([p.type.lower() for p in matchable])        # (N,) lowercase
         self.finish_arr = np.array([p.finish.lower() for p in matchable])      # (N,) sheen only
@@ -468,6 +484,26 @@ class PaintMatcher:
                                     for p in matchable])                        # (N,)
         self.transp_arr = np.array([p.transparency for p in matchable],
                                    dtype=float)                                 # (N,)
+        # (brand, role, allowed families, exclude metallics) → candidate
+        # indices; see _pool.
+        self._index: Dict[tuple, np.ndarray] = {}
+        self._build_candidate_index()
+        # _pool key → cKDTree over that pool's OKLab rows, built on first use
+        # by _retrieval_shortlist for pools of _KDTREE_MIN_POOL or more.
+        self._trees: Dict[tuple, cKDTree] = {}
+        # Rows of the build-time paint-to-paint ΔE matrix for each matchable
+        # paint (core.delta_e_matrix), or None to compute pairs with the kernel.
+        self._distances = distances
+        self._distance_rows = (distances.rows(p.paint_id for p in matchable)
+                               if distances is not None else None)
+        # Everything above is immutable once built. Read-only buffers make that
+        # enforced rather than assumed — a preloaded engine's arrays are shared
+        # copy-on-write by every forked worker (services/preload.py).
+        for arr in (self.lab_matrix, self.oklab_matrix, self.ciede_terms.block,
+                    self.brands_arr, self.types_arr, self.finish_arr, self.metallic_arr,
+                    self.family_arr, self.transp_arr, self._distance_rows):
+            if arr is not None:
+                arr.flags.writeable = False
         logger.info(f"Paint matcher initialised: {len(matchable)}/{len(paint_db)} "
                     "matchable paints (OKLab retrieval + CIEDE2000 ranking)")
 
@@ -475,106 +511,131 @@ class PaintMatcher:
     # Internal helpers
     # ------------------------------------------------------------------
 
-    def _candidates_mask(self, brand: str, role: str) -> np.ndarray:
-        cats = ROLE_CATEGORIES.get(role.lower(), {role.lower()})
-        return (self.brands_arr == brand) & np.isin(self.types_arr, list(cats))
+    def _candidates_mask(self, brand: Optional[str], role: Optional[str]) -> np.ndarray:
+        mask = np.ones(len(self.paint_db), dtype=bool)
+        if brand is not None:
+            mask &= self.brands_arr == brand
+        if role is not None:
+            cats = ROLE_CATEGORIES.get(role.lower(), {role.lower()})
+            mask &= np.isin(self.types_arr, list(cats))
+        return mask
+
+    def _build_candidate_index(self) -> None:
+        """Precompute the candidate pool of every (brand, role, allowed
+        families, metallic policy) the matchers can ask for: each DB brand ×
+        role × detected family's gate (with and without the metal families a
+        flagged target reaches) × metallics kept or excluded. Lookups are then
+        one dict hit instead of three scans of the whole DB."""
+        gates = {None}
+        for family in FAMILY_ADJACENCY:
+            allowed = frozenset(allowed_families(family))
+            gates.add(allowed)
+            gates.add(allowed | _METAL_FAMILIES)
+        gate_masks = {g: np.isin(self.family_arr, list(g)) for g in gates if g is not None}
+        for brand in set(self.brands_arr.tolist()):
+            for role in ROLE_CATEGORIES:
+                base = self._candidates_mask(brand, role)
+                for allowed in gates:
+                    mask = base if allowed is None else base & gate_masks[allowed]
+                    for exclude_metallic in (False, True):
+                        pool_mask = mask & ~self.metallic_arr if exclude_metallic else mask
+                        self._index[(brand, role, allowed, exclude_metallic)] = \
+                            self._freeze(np.flatnonzero(pool_mask))
+
+    def _paint_distance(self, i: int, j: int) -> float:
+        """CIEDE2000 between matchable paints i and j (paint_db rows): a
+        lookup in the prebuilt matrix when there is one, else the kernel."""
+        if self._distance_rows is not None:
+            return float(self._distances.matrix[self._distance_rows[i], self._distance_rows[j]])
+        return _ciede2000_single(self.paint_db[i].lab, self.paint_db[j].lab)
 
     @staticmethod
-    def _ciede2000_vs_matrix(target_lab: np.ndarray,
-                              candidate_labs: np.ndarray) -> np.ndarray:
-        """Vectorised CIEDE2000 of one target against N candidates — returns (N,) array."""
-        n = len(candidate_labs)
-        t = np.tile(target_lab, (n, 1)).reshape(n, 1, 3)
-        c = candidate_labs.reshape(n, 1, 3)
-        return deltaE_ciede2000(t, c).flatten()
-
-    def _retrieval_shortlist(self, target_lab: np.ndarray,
+    def _freeze(indices: np.ndarray) -> np.ndarray:
+        indices = indices.astype(np.int32)
+        indices.flags.writeable = False
+        return indices
+
+    def _pool(self, brand: Optional[str], role: Optional[str],
+              allowed: Optional[frozenset], exclude_metallic: bool) -> np.ndarray:
+        """Indices (int32, read-only) of the paints of `brand` in `role`'s
+        categories whose family is in `allowed`, minus the metallic paints when
+        `exclude_metallic`. None for brand, role or allowed means unfiltered.
+        Combinations outside the prebuilt index (a brand absent from the DB,
+        an unlisted role) are built on first use and kept."""
+        key = (brand, role, allowed, exclude_metallic)
+        pool = self._index.get(key)
+        if pool is None:
+            mask = self._candidates_mask(brand, role)
+            if allowed is not None:
+                mask &= np.isin(self.family_arr, list(allowed))
+            if exclude_metallic:
+                mask &= ~self.metallic_arr
+            pool = self._index[key] = self._freeze(np.flatnonzero(mask))
+        return pool
+
+    def _ciede2000_vs_matrix(self, target_lab: np.ndarray,
                              candidate_indices: np.ndarray) -> np.ndarray:
+        """Vectorised CIEDE2000 of one target against the candidate paints —
+        returns (N,) array."""
+        return ciede2000_one_to_many(target_lab, self.ciede_terms.take(candidate_indices))
+
+    def _retrieval_shortlist(self, target_ok: np.ndarray, candidate_indices: np.ndarray,
+                             key: Optional[tuple] = None) -> np.ndarray:
         """Stage 1 of the two-stage match: prune candidates to the
-        _RETRIEVAL_SHORTLIST nearest by OKLab Euclidean distance. CIEDE2000
-        then ranks only the shortlist — inside its validity regime."""
+        _RETRIEVAL_SHORTLIST nearest to `target_ok` (the target in OKLab) by
+        Euclidean distance. CIEDE2000 then ranks only the shortlist — inside
+        its validity regime.
+
+        When `candidate_indices` is the indexed pool `key` and holds at least
+        _KDTREE_MIN_POOL paints, the search goes through that pool's k-d tree
+        instead of a full distance scan (same set, up to exact distance ties)."""
         if len(candidate_indices) <= _RETRIEVAL_SHORTLIST:
             return candidate_indices
-        target_ok = _lab_to_oklab(np.asarray(target_lab, dtype=float))
+        if key is not None and len(candidate_indices) >= _KDTREE_MIN_POOL:
+            tree = self._trees.get(key)
+            if tree is None:
+                tree = self._trees[key] = cKDTree(self.oklab_matrix[candidate_indices])
+            _, local = tree.query(target_ok, k=_RETRIEVAL_SHORTLIST)
+            return candidate_indices[np.sort(local)]
         d_ok = np.linalg.norm(self.oklab_matrix[candidate_indices] - target_ok,
                               axis=1)
         keep = np.argpartition(d_ok, _RETRIEVAL_SHORTLIST)[:_RETRIEVAL_SHORTLIST]
         return candidate_indices[keep]
 
-    # ------------------------------------------------------------------
-    # Public API
-    # ------------------------------------------------------------------
-
-    def match_color(self, target_rgb: np.ndarray, brand: str,
-                    role: str = 'dominant',
-                    context: Dict = None,
-                    paint_type: str = None,
-                    target_family: str = None,
-                    target_lab: np.ndarray = None) -> Optional[Paint]:
-        """Return the best-matching paint for the target in the given brand/role.
-
-        paint_type is accepted for backward compatibility and mapped to role.
-
-        target_lab, when given, is used directly as the CIEDE2000 target — the
-        caller's cluster representative is authoritative and is NOT re-derived
-        from target_rgb (F3 fix: one colour per cluster). Without it, the LAB
-        is derived from target_rgb as before.
-
-        target_family (the detected colour's canonical family) gates base/highlight
-        candidates to that family + its adjacent families and applies a ΔE ceiling,
-        so a brand with no in-family paint returns None ("No match found") rather
-        than a far-off cross-family paint (Prompt 8, Issue 1). When omitted, no
-        family gate is applied (preserves legacy callers/tests).
-        """
-        if paint_type is not None:
-            role = _TYPE_TO_ROLE.get(paint_type.lower(), paint_type.lower())
-
-        if target_lab is None:
-            target_rgb_norm = target_rgb / 255.0 if target_rgb.max() > 1 else target_rgb
-            target_lab = color.rgb2lab(np.array([[target_rgb_norm]]))[0][0]
-        else:
-            target_lab = np.asarray(target_lab, dtype=float)
-
-        mask = self._candidates_mask(brand, role)
-
-        flagged_metallic = flagged_metallic_for(role, context)
-
+    def _candidate_key(self, brand: str, role: str, target_family: Optional[str],
+                       flagged_metallic: bool) -> tuple:
+        """The _pool key of the paints match_color may return for this brand,
+        role, family and metallic flag."""
         # ── Colour-family gate (base/highlight only) ─────────────────────────
         # Restrict to the detected family + adjacent families (shared adjacency
-        # with the recipe graph). If the gated pool is empty, return None so the
-        # slot honestly shows "No match found" instead of a cross-family paint.
-        # A metallic-flagged target also reaches the metal families — a gold
-        # trim classifies into a warm family whose adjacency contains no
-        # metals, and it must still be able to WIN a gold paint (see the
-        # metallic competition below).
+        # with the recipe graph). If the gated pool is empty, the match is None
+        # so the slot honestly shows "No match found" instead of a
+        # cross-family paint. A metallic-flagged target also reaches the metal
+        # families — a gold trim classifies into a warm family whose adjacency
+        # contains no metals, and it must still be able to WIN a gold paint
+        # (see the metallic competition in _select).
+        allowed = None
         if target_family and role.lower() in FAMILY_GATED_ROLES:
             allowed = allowed_families(target_family)
             if allowed is not None:
+                allowed = frozenset(allowed)
                 if flagged_metallic:
-                    allowed = set(allowed) | {'gold', 'silver', 'bronze'}
-                family_mask = mask & np.isin(self.family_arr, list(allowed))
-                if not family_mask.any():
-                    return None
-                mask = family_mask
+                    allowed = allowed | _METAL_FAMILIES
 
         # ── Metallic paints in the pool ────────────────────────────────────
         # NOT flagged → metallics are excluded outright (a matte surface can
         # never want a metallic paint). Flagged → metallics ENTER the pool but
-        # must win a ΔE competition against the best matte (below): the
+        # must win a ΔE competition against the best matte (in _select): the
         # scan-side flag is too noisy on edge-dense minis to hard-gate, and
         # the DB knows the answer — Abaddon Black crushes any gunmetal on a
         # black armour cluster, while Leadbelcher wins a true silver blade.
-        if role not in ('shade', 'wash') and not flagged_metallic:
-            mask = mask & ~self.metallic_arr
-
-        candidate_indices = np.where(mask)[0]
-        if len(candidate_indices) == 0:
-            return None
-
-        candidate_indices = self._retrieval_shortlist(target_lab, candidate_indices)
-        candidate_labs = self.lab_matrix[candidate_indices]
-        raw_distances = self._ciede2000_vs_matrix(target_lab, candidate_labs)
+        exclude_metallic = role not in ('shade', 'wash') and not flagged_metallic
+        return brand, role, allowed, exclude_metallic
 
+    def _select(self, candidate_indices: np.ndarray, raw_distances: np.ndarray,
+                role: str, flagged_metallic: bool) -> Optional[Paint]:
+        """Stage 2 of the match: pick the winner from a ranked shortlist
+        given its CIEDE2000 distances to the target."""
         # ── ΔE ceiling (base/highlight only) — gate BEFORE ranking ────────
         # The ceiling is a candidacy condition on true colour distance, so it
         # must remove candidates before penalties reorder them (F4 fix: a
@@ -610,6 +671,104 @@ class PaintMatcher:
         best_local = int(np.argmin(distances))
         return self.paint_db[candidate_indices[best_local]]
 
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def match_color(self, target_rgb: np.ndarray, brand: str,
+                    role: str = 'dominant',
+                    context: Dict = None,
+                    paint_type: str = None,
+                    target_family: str = None,
+                    target_lab: np.ndarray = None) -> Optional[Paint]:
+        """Return the best-matching paint for the target in the given brand/role.
+
+        paint_type is accepted for backward compatibility and mapped to role.
+
+        target_lab, when given, is used directly as the CIEDE2000 target — the
+        caller's cluster representative is authoritative and is NOT re-derived
+        from target_rgb (F3 fix: one colour per cluster). Without it, the LAB
+        is derived from target_rgb as before.
+
+        target_family (the detected colour's canonical family) gates base/highlight
+        candidates to that family + its adjacent families and applies a ΔE ceiling,
+        so a brand with no in-family paint returns None ("No match found") rather
+        than a far-off cross-family paint (Prompt 8, Issue 1). When omitted, no
+        family gate is applied (preserves legacy callers/tests).
+        """
+        if paint_type is not None:
+            role = _TYPE_TO_ROLE.get(paint_type.lower(), paint_type.lower())
+
+        if target_lab is None:
+            target_rgb_norm = target_rgb / 255.0 if target_rgb.max() > 1 else target_rgb
+            target_lab = color.rgb2lab(np.array([[target_rgb_norm]]))[0][0]
+        else:
+            target_lab = np.asarray(target_lab, dtype=float)
+
+        flagged_metallic = flagged_metallic_for(role, context)
+        key = self._candidate_key(brand, role, target_family, flagged_metallic)
+        candidate_indices = self._pool(*key)
+        if len(candidate_indices) == 0:
+            return None
+
+        candidate_indices = self._retrieval_shortlist(
+            _lab_to_oklab(target_lab), candidate_indices, key)
+        raw_distances = self._ciede2000_vs_matrix(target_lab, candidate_indices)
+        return self._select(candidate_indices, raw_distances, role, flagged_metallic)
+
+    def match_many(self, target_labs, brands: List[str],
+                   roles='dominant', families=None,
+                   contexts=None) -> List[List[Optional[Paint]]]:
+        """match_color for every target × brand at once.
+
+        target_labs is a sequence of LAB triples (the authoritative cluster
+        representatives, as match_color's target_lab). roles, families and
+        contexts are per target; roles may be a single role for all of them.
+        Returns result[i][j] — exactly what
+        match_color(..., brands[j], role=roles[i], context=contexts[i],
+        target_family=families[i], target_lab=target_labs[i]) returns.
+
+        Every row's shortlist is gathered first and CIEDE2000 runs once over
+        all (target, candidate) pairs; the per-row steps are match_color's own
+        (_candidate_key, _retrieval_shortlist, _select), so the results are
+        identical.
+        """
+        labs = [np.asarray(t, dtype=float) for t in target_labs]
+        n = len(labs)
+        if isinstance(roles, str):
+            roles = [roles] * n
+        families = list(families) if families is not None else [None] * n
+        contexts = list(contexts) if contexts is not None else [None] * n
+
+        rows = []                      # (i, j, flagged, shortlist)
+        for i, lab in enumerate(labs):
+            role = roles[i]
+            flagged = flagged_metallic_for(role, contexts[i])
+            target_ok = _lab_to_oklab(lab)
+            for j, brand in enumerate(brands):
+                key = self._candidate_key(brand, role, families[i], flagged)
+                pool = self._pool(*key)
+                if len(pool) == 0:
+                    continue
+                pool = self._retrieval_shortlist(target_ok, pool, key)
+                rows.append((i, j, flagged, pool))
+
+        results: List[List[Optional[Paint]]] = [[None] * len(brands) for _ in labs]
+        if not rows:
+            return results
+
+        sizes = [len(pool) for *_, pool in rows]
+        targets = np.repeat(np.array([labs[i] for i, *_ in rows]), sizes, axis=0)
+        candidates = self.ciede_terms.take(np.concatenate([pool for *_, pool in rows]))
+        raw_all = ciede2000(targets, candidates)
+
+        start = 0
+        for (i, j, flagged, pool), size in zip(rows, sizes):
+            raw = raw_all[start:start + size]
+            start += size
+            results[i][j] = self._select(pool, raw, roles[i], flagged)
+        return results
+
     def match_top_n(self, target_lab: np.ndarray, brand: str = None,
                     role: str = None, n: int = 5,
                     paint_type: str = None,
@@ -625,55 +784,46 @@ class PaintMatcher:
         if paint_type is not None and role is None:
             role = _TYPE_TO_ROLE.get(paint_type.lower(), paint_type.lower())
 
-        if brand is not None and role is not None:
-            mask = self._candidates_mask(brand, role)
-        elif brand is not None:
-            mask = self.brands_arr == brand
-        elif role is not None:
-            cats = ROLE_CATEGORIES.get(role.lower(), {role.lower()})
-            mask = np.isin(self.types_arr, list(cats))
-        else:
-            mask = np.ones(len(self.paint_db), dtype=bool)
+        key = (brand, role, None, False)
+        candidate_indices = self._pool(*key)
 
         # Colour-family gate (base/highlight only), shared with match_color.
         if target_family and role and role.lower() in FAMILY_GATED_ROLES:
             allowed = allowed_families(target_family)
             if allowed is not None:
-                family_mask = mask & np.isin(self.family_arr, list(allowed))
-                if family_mask.any():
-                    mask = family_mask
+                gated_key = (brand, role, frozenset(allowed), False)
+                gated = self._pool(*gated_key)
+                if len(gated):
+                    key, candidate_indices = gated_key, gated
 
-        candidate_indices = np.where(mask)[0]
         if len(candidate_indices) == 0:
             return []
 
         candidate_indices = self._retrieval_shortlist(
-            np.asarray(target_lab, dtype=float), candidate_indices)
-        candidate_labs = self.lab_matrix[candidate_indices]
+            _lab_to_oklab(np.asarray(target_lab, dtype=float)), candidate_indices, key)
         distances = self._ciede2000_vs_matrix(
-            np.asarray(target_lab, dtype=float), candidate_labs
-        )
+            np.asarray(target_lab, dtype=float), candidate_indices)
 
         # Deduplicate: skip same-brand candidates within ΔE 2.0 of an already-
         # included paint to avoid returning near-identical colours.
         results: List[Tuple[Paint, float]] = []
-        included: List[Paint] = []  # paints already in results
+        included: List[int] = []  # paint_db rows already in results
 
         for local_i in np.argsort(distances):
             if len(results) >= n:
                 break
-            global_i = candidate_indices[local_i]
+            global_i = int(candidate_indices[local_i])
             paint = self.paint_db[global_i]
             dist = float(distances[local_i])
 
             too_similar = any(
-                inc.brand == paint.brand
-                and _ciede2000_single(paint.lab, inc.lab) < _DEDUP_THRESHOLD
+                self.paint_db[inc].brand == paint.brand
+                and self._paint_distance(global_i, inc) < _DEDUP_THRESHOLD
                 for inc in included
             )
             if not too_similar:
                 results.append((paint, dist))
-                included.append(paint)
+                included.append(global_i)
 
         return results
 
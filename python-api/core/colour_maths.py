@@ -11,19 +11,19 @@ Metric policy (Phase 2 of the colour-science overhaul):
 """
 
 import numpy as np
-from typing import List
-from skimage.color import deltaE_ciede2000, lab2rgb, lab2xyz, rgb2lab, xyz2lab
+from typing import List, Tuple
+from skimage.color import lab2rgb, lab2xyz, rgb2lab, xyz2lab
+
+from core.ciede2000 import ciede2000_scalar
 
 
 def ciede2000_single(lab1, lab2) -> float:
     """CIEDE2000 distance between two LAB triples.
 
-    Accepts any array-like of length 3.  Uses the (1, 1, 3) image-shaped
-    broadcasting that skimage.color.deltaE_ciede2000 expects.
+    Accepts any array-like of length 3. Computed by the scalar kernel in
+    core.ciede2000 (skimage's formula, without its image-shaped set-up).
     """
-    a = np.asarray(lab1, dtype=float).reshape(1, 1, 3)
-    b = np.asarray(lab2, dtype=float).reshape(1, 1, 3)
-    return float(deltaE_ciede2000(a, b)[0, 0])
+    return ciede2000_scalar(lab1, lab2)
 
 
 def rgb_to_lab(rgb) -> List[float]:
@@ -61,15 +61,19 @@ _LMS_TO_OKLAB = np.array([
 ])
 
 
+def _xyz_to_oklab(xyz: np.ndarray) -> np.ndarray:
+    """XYZ (D65, Y=1) (N, 3) → OKLab (N, 3)."""
+    lms = xyz @ _XYZ_TO_LMS.T.astype(xyz.dtype)
+    lms_p = np.cbrt(lms)          # sign-preserving cube root
+    return lms_p @ _LMS_TO_OKLAB.T.astype(xyz.dtype)
+
+
 def lab_to_oklab(lab: np.ndarray) -> np.ndarray:
     """CIELAB (D65) → OKLab. Accepts a single (3,) triple or an (N, 3) array;
     returns the same shape. OKLab L is in [0, 1]."""
     arr = np.asarray(lab, dtype=float)
     single = arr.ndim == 1
-    xyz = lab2xyz(arr.reshape(1, -1, 3)).reshape(-1, 3)
-    lms = xyz @ _XYZ_TO_LMS.T
-    lms_p = np.cbrt(lms)          # sign-preserving cube root
-    ok = lms_p @ _LMS_TO_OKLAB.T
+    ok = _xyz_to_oklab(lab2xyz(arr.reshape(1, -1, 3)).reshape(-1, 3))
     return ok[0] if single else ok
 
 
@@ -95,6 +99,63 @@ def rgb_to_oklab(rgb) -> np.ndarray:
     return ok[0] if single else ok
 
 
+# skimage's rgb2lab constants (sRGB D65 primaries, the 2° D65 white), so the
+# uint8 kernel below computes the same numbers as rgb_to_lab.
+_XYZ_FROM_SRGB = np.array([
+    [0.412453, 0.357580, 0.180423],
+    [0.212671, 0.715160, 0.072169],
+    [0.019334, 0.119193, 0.950227],
+])
+_D65_WHITE = np.array([0.95047, 1.0, 1.08883])
+
+
+def _srgb_linearisation_lut() -> np.ndarray:
+    """Linear-light value of each 8-bit sRGB code, by skimage's formula."""
+    v = np.arange(256) / 255.0
+    return np.where(v > 0.04045, np.power((v + 0.055) / 1.055, 2.4), v / 12.92)
+
+
+_SRGB_LINEAR_LUT = _srgb_linearisation_lut()
+_PIXEL_CHUNK = 1 << 16
+
+
+def pixels_to_lab_oklab(rgb: np.ndarray, dtype=np.float64) -> Tuple[np.ndarray, np.ndarray]:
+    """uint8 sRGB pixels (N, 3) → (CIELAB, OKLab), both (N, 3) of `dtype`.
+
+    The pixel-array form of rgb_to_lab and rgb_to_oklab for scan-sized
+    inputs: linearisation is a 256-entry table lookup instead of a power per
+    channel, both spaces come out of one XYZ pass (OKLab directly from XYZ,
+    not back through LAB), and the work runs in cache-sized chunks so the
+    only full-size buffers are the two outputs. In float64 the LAB equals
+    skimage's rgb2lab; float32 halves the outputs for callers that can take
+    the rounding.
+    """
+    rgb = np.asarray(rgb)
+    if rgb.dtype != np.uint8:
+        raise TypeError(f"pixels_to_lab_oklab expects uint8 sRGB, got {rgb.dtype}")
+    rgb = rgb.reshape(-1, 3)
+    lut = _SRGB_LINEAR_LUT.astype(dtype)
+    to_xyz = _XYZ_FROM_SRGB.T.astype(dtype)
+    white = _D65_WHITE.astype(dtype)
+    lab = np.empty(rgb.shape, dtype=dtype)
+    oklab = np.empty(rgb.shape, dtype=dtype)
+    for start in range(0, len(rgb), _PIXEL_CHUNK):
+        chunk = slice(start, start + _PIXEL_CHUNK)
+        # (n, 1, 3) @ (3, 3), the shape skimage multiplies in: a plain (n, 3)
+        # product rounds differently in the last bit.
+        xyz = (lut[rgb[chunk]][:, np.newaxis, :] @ to_xyz)[:, 0, :]
+        oklab[chunk] = _xyz_to_oklab(xyz)
+        # skimage's xyz2lab: cube root above the CIE ε, linear segment below
+        f = xyz / white
+        linear = f <= 0.008856
+        f[~linear] = np.cbrt(f[~linear])
+        f[linear] = 7.787 * f[linear] + 16.0 / 116.0
+        lab[chunk, 0] = 116.0 * f[:, 1] - 16.0
+        lab[chunk, 1] = 500.0 * (f[:, 0] - f[:, 1])
+        lab[chunk, 2] = 200.0 * (f[:, 1] - f[:, 2])
+    return lab, oklab
+
+
 def oklab_distance(ok1: np.ndarray, ok2: np.ndarray) -> np.ndarray:
     """Euclidean distance in OKLab — the geometry metric. Broadcasts:
     (3,) vs (3,) → scalar; (3,) vs (N,3) → (N,)."""
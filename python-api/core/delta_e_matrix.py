@@ -0,0 +1,133 @@
+"""
+The paint-to-paint CIEDE2000 matrix, built once and memory-mapped.
+
+Every pairwise paint distance the backend asks for — match_top_n's near-
+duplicate check, the forge's coverage and greedy k-centre loop, the offline
+scripts' nearest-alternative searches — is a pure function of two DB paints,
+so it is computed at build time (scripts/build_delta_e_matrix.py) into an
+N × N float32 .npy ordered by paint_id, with a JSON sidecar holding the ids
+and a digest of every (paint_id, lab) the matrix was built from. Runtime
+loads it with np.load(mmap_mode='r'): pages come from the OS page cache, so
+every worker process shares one copy and start-up reads nothing it does not
+touch. Row i is lab1, column j lab2 — M[i, j] = ciede2000(lab_i, lab_j),
+the kernel's own orientation.
+
+A matrix whose digest does not match the DB being served is stale and is
+not used; load() returns None and callers fall back to the kernel, so a
+missing or outdated build step costs speed, never correctness.
+"""
+
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.ciede2000 import ciede2000_matrix, precompute
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MATRIX_PATH = Path(__file__).parent.parent / "data" / "paint_delta_e.npy"
+
+
+def _records(paints: Iterable[dict]) -> List[Tuple[str, Tuple[float, float, float]]]:
+    """(paint_id, lab) of every raw DB record that has both, sorted by id."""
+    out = {}
+    for p in paints:
+        pid, lab = p.get('paint_id'), p.get('lab')
+        if pid and lab is not None:
+            out[pid] = tuple(float(v) for v in lab)
+    return sorted(out.items())
+
+
+def db_digest(paints: Iterable[dict]) -> str:
+    """Digest of the (paint_id, lab) pairs a matrix is built from."""
+    h = hashlib.blake2b(digest_size=16)
+    for pid, lab in _records(paints):
+        h.update(pid.encode('utf-8'))
+        h.update(np.asarray(lab, dtype='<f8').tobytes())
+    return h.hexdigest()
+
+
+def _sidecar(path: Path) -> Path:
+    return path.with_suffix('.json')
+
+
+class PaintDistanceMatrix:
+    """Pairwise CIEDE2000 between DB paints, addressed by paint_id."""
+
+    __slots__ = ('ids', 'index', 'matrix')
+
+    def __init__(self, ids: Sequence[str], matrix: np.ndarray):
+        self.ids = list(ids)
+        self.index: Dict[str, int] = {pid: i for i, pid in enumerate(self.ids)}
+        self.matrix = matrix
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, paint_id) -> bool:
+        return paint_id in self.index
+
+    def rows(self, paint_ids: Iterable[str]) -> Optional[np.ndarray]:
+        """Matrix rows of `paint_ids`, or None if any is not in the matrix."""
+        try:
+            return np.fromiter((self.index[pid] for pid in paint_ids), dtype=np.intp)
+        except KeyError:
+            return None
+
+    def distance(self, id1: str, id2: str) -> float:
+        return float(self.matrix[self.index[id1], self.index[id2]])
+
+
+def build(paints: Iterable[dict], dtype=np.float32) -> Tuple[PaintDistanceMatrix, str]:
+    """Compute the matrix of the raw DB records `paints` in memory; returns
+    it with the digest of the records it covers."""
+    paints = list(paints)
+    records = _records(paints)
+    labs = np.array([lab for _, lab in records], dtype=float).reshape(-1, 3)
+    matrix = ciede2000_matrix(labs, precompute(labs)).astype(dtype)
+    return PaintDistanceMatrix([pid for pid, _ in records], matrix), db_digest(paints)
+
+
+def write(paints: Iterable[dict], path=DEFAULT_MATRIX_PATH, dtype=np.float32) -> Path:
+    """Build the matrix of `paints` and write it to `path` (.npy) plus its
+    sidecar (.json: ids, digest, dtype)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    distances, digest = build(paints, dtype=dtype)
+    np.save(path, distances.matrix)
+    _sidecar(path).write_text(json.dumps({
+        'digest': digest,
+        'dtype': np.dtype(dtype).name,
+        'ids': distances.ids,
+    }), encoding='utf-8')
+    return path
+
+
+def load(paints: Optional[Iterable[dict]] = None, path=DEFAULT_MATRIX_PATH,
+         digest: Optional[str] = None) -> Optional[PaintDistanceMatrix]:
+    """Memory-map the matrix at `path` if it was built from exactly the raw
+    DB records `paints` (or the records whose db_digest is `digest`); None if
+    it is missing, unreadable or stale."""
+    path = Path(path)
+    if not path.exists() or not _sidecar(path).exists():
+        logger.info(f"No paint ΔE matrix at {path}; pairwise distances use the kernel")
+        return None
+    try:
+        meta = json.loads(_sidecar(path).read_text(encoding='utf-8'))
+        matrix = np.load(path, mmap_mode='r')
+    except (OSError, ValueError) as e:
+        logger.warning(f"Paint ΔE matrix at {path} unreadable ({e}); using the kernel")
+        return None
+    n = len(meta.get('ids', ()))
+    if digest is None:
+        digest = db_digest(paints)
+    if meta.get('digest') != digest or matrix.shape != (n, n):
+        logger.warning(f"Paint ΔE matrix at {path} does not match the paint DB "
+                       "(rebuild with scripts/build_delta_e_matrix.py); using the kernel")
+        return None
+    logger.info(f"Memory-mapped {n}×{n} paint ΔE matrix from {path}")
+    return PaintDistanceMatrix(meta['ids'], matrix)
@@ -0,0 +1,169 @@
+"""
+The engine snapshot: SchemeStealerEngine's derived paint and recipe state,
+precompiled into one .npz so start-up skips the JSON path.
+
+Building the engine from JSON parses paints_groundtruth.json and
+recipes.json, computes every paint's colour properties, re-derives every
+color_family with the CIEDE2000 anchor classifier and validates every
+recipe edge against the DB. None of that depends on anything but the input
+files and the code that derives from them, so scripts/build_engine_snapshot.py
+does it once and writes the result as a struct of arrays: one column per
+Paint field (the colour properties as (N, 3) float64 blocks, exactly as
+compute_properties left them), one per RecipeEdge field, and the few
+optional/list fields as a single JSON column. No pickles — np.load runs with
+allow_pickle=False.
+
+The snapshot is keyed by a digest of its inputs — the paint DB, recipes.json,
+color_anchors.json, the deriving modules' source and SNAPSHOT_VERSION — so a
+change to any of them makes it stale. load() then returns None and the
+engine takes the JSON path: the snapshot is a cache, never a second source
+of truth.
+"""
+
+import hashlib
+import json
+import logging
+import zipfile
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+from core.color_engine import Paint
+from core.recipe_graph import RecipeEdge, RecipeGraph, _DEFAULT_RECIPES
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+_API_ROOT = Path(__file__).parent.parent
+DEFAULT_SNAPSHOT_PATH = _API_ROOT / "data" / "engine_snapshot.npz"
+
+# Besides the paint DB and recipes.json, the files the snapshot is derived
+# from: the anchors and the code that turns records into engine state —
+# including every core module color_engine and recipe_graph import, since
+# color_family comes from the CIEDE2000 anchor classifier and the edges from
+# recipe_geometry's scoring.
+_DERIVING_INPUTS = (
+    _API_ROOT / "color_anchors.json",
+    _API_ROOT / "core" / "color_engine.py",
+    _API_ROOT / "core" / "recipe_graph.py",
+    _API_ROOT / "core" / "schemestealer_engine.py",
+    _API_ROOT / "core" / "ciede2000.py",
+    _API_ROOT / "core" / "colour_maths.py",
+    _API_ROOT / "core" / "recipe_geometry.py",
+    _API_ROOT / "core" / "delta_e_matrix.py",
+    Path(__file__),
+)
+
+_PAINT_STR_FIELDS = ('name', 'brand', 'hex', 'type', 'color_family', 'category', 'finish',
+                     'paint_id', 'range', 'hex_source', 'measured_hex', 'color_source')
+_PAINT_BOOL_FIELDS = ('metallic', 'matchable', 'discontinued')
+# Optional or list-valued: stored as one JSON column, values as loaded.
+_PAINT_JSON_FIELDS = ('aliases', 'citadel_equiv', 'measured_lab', 'opacity', 'vibrancy')
+_EDGE_STR_FIELDS = ('from_id', 'to_id', 'rel', 'source', 'from_name', 'to_name')
+
+
+def inputs_digest(paint_db_path, recipes_path=_DEFAULT_RECIPES) -> str:
+    """Digest of every input the snapshot is derived from."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(SNAPSHOT_VERSION).encode('ascii'))
+    for path in (Path(paint_db_path), Path(recipes_path), *_DERIVING_INPUTS):
+        try:
+            h.update(path.read_bytes())
+        except OSError:
+            h.update(b'\0missing')
+    return h.hexdigest()
+
+
+class EngineSnapshot:
+    """The state the engine's JSON path derives: Paint objects in DB order,
+    the validated recipe edges, and the ΔE matrix digest of the raw records
+    (core/delta_e_matrix.py) so the matrix can be checked without them."""
+
+    __slots__ = ('paints', 'edges', 'delta_e_digest')
+
+    def __init__(self, paints: List[Paint], edges: List[RecipeEdge], delta_e_digest: str):
+        self.paints = paints
+        self.edges = edges
+        self.delta_e_digest = delta_e_digest
+
+
+def write(paints: List[Paint], recipe_graph: RecipeGraph, delta_e_digest: str,
+          digest: str, path=DEFAULT_SNAPSHOT_PATH) -> Path:
+    """Write the derived state to `path` under the inputs `digest`."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    edges = list(recipe_graph.edges())
+    columns = {
+        'version': np.array(SNAPSHOT_VERSION),
+        'digest': np.array(digest),
+        'delta_e_digest': np.array(delta_e_digest),
+        'rgb': np.array([p.rgb for p in paints], dtype=float).reshape(-1, 3),
+        'lab': np.array([p.lab for p in paints], dtype=float).reshape(-1, 3),
+        'hsv': np.array([p.hsv for p in paints], dtype=float).reshape(-1, 3),
+        'transparency': np.array([p.transparency for p in paints], dtype=float),
+        'paint_json': np.array(json.dumps([[getattr(p, f) for f in _PAINT_JSON_FIELDS]
+                                           for p in paints])),
+        'edge_confidence': np.array([e.confidence for e in edges], dtype=float),
+    }
+    for f in _PAINT_STR_FIELDS:
+        columns[f'paint_{f}'] = np.array([getattr(p, f) or '' for p in paints], dtype=str)
+    for f in _PAINT_BOOL_FIELDS:
+        columns[f'paint_{f}'] = np.array([bool(getattr(p, f)) for p in paints], dtype=bool)
+    for f in _EDGE_STR_FIELDS:
+        columns[f'edge_{f}'] = np.array([getattr(e, f) for e in edges], dtype=str)
+    with open(path, 'wb') as fh:
+        np.savez(fh, **columns)
+    return path
+
+
+def _restore_paints(z) -> List[Paint]:
+    strs = {f: z[f'paint_{f}'].tolist() for f in _PAINT_STR_FIELDS}
+    bools = {f: z[f'paint_{f}'].tolist() for f in _PAINT_BOOL_FIELDS}
+    extras = json.loads(z['paint_json'].item())
+    transparency = z['transparency'].tolist()
+    rgb, lab, hsv = z['rgb'], z['lab'], z['hsv']
+    paints = []
+    for i, extra in enumerate(extras):
+        fields = {f: col[i] for f, col in strs.items()}
+        fields.update({f: col[i] for f, col in bools.items()})
+        fields.update(zip(_PAINT_JSON_FIELDS, extra))
+        paint = Paint(transparency=transparency[i], **fields)
+        # compute_properties' results, as it left them.
+        paint.rgb, paint.lab, paint.hsv = rgb[i].copy(), lab[i].copy(), hsv[i].copy()
+        paint.saturation, paint.brightness = paint.hsv[1], paint.hsv[2]
+        paint.chroma = np.sqrt(paint.lab[1]**2 + paint.lab[2]**2)
+        paints.append(paint)
+    return paints
+
+
+def _restore_edges(z) -> List[RecipeEdge]:
+    cols = [z[f'edge_{f}'].tolist() for f in _EDGE_STR_FIELDS]
+    return [RecipeEdge(**dict(zip(_EDGE_STR_FIELDS, row)), confidence=conf)
+            for *row, conf in zip(*cols, z['edge_confidence'].tolist())]
+
+
+def load(paint_db_path, path=DEFAULT_SNAPSHOT_PATH,
+         recipes_path=_DEFAULT_RECIPES) -> Optional[EngineSnapshot]:
+    """The snapshot at `path` if it was built from exactly the current
+    inputs; None if it is missing, unreadable or stale."""
+    path = Path(path)
+    if not path.exists():
+        logger.info(f"No engine snapshot at {path}; building engine state from JSON")
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as z:
+            if (int(z['version']) != SNAPSHOT_VERSION
+                    or str(z['digest']) != inputs_digest(paint_db_path, recipes_path)):
+                logger.info(f"Engine snapshot at {path} is stale (rebuild with "
+                            "scripts/build_engine_snapshot.py); building from JSON")
+                return None
+            snapshot = EngineSnapshot(_restore_paints(z), _restore_edges(z),
+                                      str(z['delta_e_digest']))
+    except (OSError, ValueError, KeyError, TypeError, zipfile.BadZipFile) as e:
+        logger.warning(f"Engine snapshot at {path} unreadable ({e}); building from JSON")
+        return None
+    logger.info(f"Loaded engine snapshot from {path} ({len(snapshot.paints)} paints, "
+                f"{len(snapshot.edges)} recipe edges)")
+    return snapshot
@@ -0,0 +1,95 @@
+"""
+Mergeable per-channel order statistics of a cluster's LAB pixels.
+
+A merged cluster's colour is the per-channel median of the union of its
+members' pixels. Computing it by concatenating the members' indices and
+gathering pixels_lab over them materialises the union on every merge — and
+the merge and the family dedup merge the same large neutral regions twice.
+A LabSketch instead keeps each member's L*, a* and b* values sorted (one
+sort per initial cluster, in place of the partition np.median would do);
+merging sketches only joins their lists of parts, and a union median is a
+k-th-smallest selection across the parts' sorted columns, found with a few
+binary searches per part. The extractor sorts each cluster's columns in
+place inside the one cluster-ordered copy of the scan's LAB pixels it
+already makes, so the sketches add no pixel storage of their own.
+
+The medians are exact — the same values np.median(union, axis=0) returns,
+including the mean of the two middle values for an even count — so merged
+clusters classify and match exactly as before. Only the darker-half median
+(dark neutral merges) still gathers rows, and only the darker half's.
+"""
+
+from typing import List, Sequence
+
+import numpy as np
+
+
+def _select(columns: Sequence[np.ndarray], k: int) -> float:
+    """k-th smallest (0-based) value of the union of sorted 1-D arrays."""
+    if len(columns) == 1:
+        return float(columns[0][k])
+    lo = np.zeros(len(columns), dtype=np.intp)
+    hi = np.array([len(c) for c in columns], dtype=np.intp)
+    while True:
+        # Pivot on the middle of the largest remaining window: whichever
+        # side the k-th value is on, that window at least halves.
+        i = int(np.argmax(hi - lo))
+        pivot = columns[i][(lo[i] + hi[i]) // 2]
+        below = np.array([np.searchsorted(c, pivot, 'left') for c in columns])
+        n_below = int(below.sum())
+        if k < n_below:
+            np.minimum(hi, below, out=hi)
+            continue
+        through = np.array([np.searchsorted(c, pivot, 'right') for c in columns])
+        if k < int(through.sum()):
+            return float(pivot)
+        np.maximum(lo, through, out=lo)
+
+
+class LabSketch:
+    """Sorted L*, a*, b* columns of a pixel set, kept as the parts it was
+    merged from, with each part's pixel indices for the darker half."""
+
+    __slots__ = ('_sorted', '_indices')
+
+    def __init__(self, sorted_parts: List[np.ndarray], index_parts: List[np.ndarray]):
+        self._sorted = sorted_parts
+        self._indices = index_parts
+
+    @classmethod
+    def in_place(cls, columns: np.ndarray, indices: np.ndarray) -> 'LabSketch':
+        """Sketch over a (3, n) view of a cluster's LAB columns, sorted in
+        place, for the pixels_lab rows `indices` (kept by reference)."""
+        columns.sort(axis=1)
+        return cls([columns], [indices])
+
+    @classmethod
+    def of(cls, pixels_lab: np.ndarray, indices: np.ndarray) -> 'LabSketch':
+        """Sketch of pixels_lab[indices], on a sorted copy."""
+        return cls.in_place(np.ascontiguousarray(pixels_lab[indices].T, dtype=float), indices)
+
+    @classmethod
+    def merge(cls, sketches: Sequence['LabSketch']) -> 'LabSketch':
+        return cls([p for s in sketches for p in s._sorted],
+                   [i for s in sketches for i in s._indices])
+
+    def __len__(self) -> int:
+        return sum(p.shape[1] for p in self._sorted)
+
+    def median(self) -> np.ndarray:
+        """Per-channel median of the union, as np.median(rows, axis=0)."""
+        n = len(self)
+        out = np.empty(3)
+        for ch in range(3):
+            columns = [p[ch] for p in self._sorted]
+            if n % 2:
+                out[ch] = _select(columns, n // 2)
+            else:
+                out[ch] = (_select(columns, n // 2 - 1) + _select(columns, n // 2)) / 2
+        return out
+
+    def darker_half(self, pixels_lab: np.ndarray, l_median: float) -> np.ndarray:
+        """The (m, 3) pixels_lab rows with L* ≤ l_median, gathered part by
+        part (only the L* column of each part is read to select them)."""
+        darker = [pixels_lab[i[pixels_lab[i, 0] <= l_median]] for i in self._indices]
+        return np.concatenate(darker) if len(darker) > 1 else darker[0]
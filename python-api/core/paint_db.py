@@ -0,0 +1,33 @@
+"""
+Location of the paint database.
+
+Kept apart from core.schemestealer_engine so the routes that only read the
+DB (forge, /api/paints) can resolve it without importing the engine and,
+through it, skimage, scipy and cv2.
+"""
+
+import os
+
+from utils.logging_config import logger
+
+CANONICAL_PAINT_DB = 'paints_groundtruth.json'
+
+
+def resolve_paint_db_path(path: str = CANONICAL_PAINT_DB) -> str:
+    """Resolve the single source-of-truth paint DB: ``paints_groundtruth.json``.
+
+    There are no fallbacks any more (the old ``paints_measured.json`` /
+    ``paints.json`` chain is gone). A legacy caller still passing the old default
+    ``'paints.json'`` is transparently redirected to the canonical DB; any other
+    explicit path is honoured (test fixtures). If the resolved file is missing we
+    raise ``FileNotFoundError`` rather than silently loading a stale DB.
+    """
+    candidate = CANONICAL_PAINT_DB if path in ('paints.json', CANONICAL_PAINT_DB) else path
+    if not os.path.exists(candidate):
+        raise FileNotFoundError(
+            f"Paint DB not found: {candidate!r}. The canonical database is "
+            f"'{CANONICAL_PAINT_DB}' in python-api/ — run from there or pass an "
+            "explicit existing path."
+        )
+    logger.info(f"Loading ground-truth paint DB: {candidate}")
+    return candidate
@@ -10,7 +10,7 @@ import json
 import os
 import logging
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -52,10 +52,17 @@ class RecipeEdge:
 class RecipeGraph:
     """Indexed lookup of recipe edges keyed on paint_id."""
 
-    def __init__(self, paints_by_id: Dict[str, object], recipes_path: str = _DEFAULT_RECIPES):
+    def __init__(self, paints_by_id: Dict[str, object], recipes_path: str = _DEFAULT_RECIPES,
+                 edges: Optional[Iterable[RecipeEdge]] = None):
+        """Load and validate `recipes_path`, or — when `edges` is given (the
+        already-validated edges of an engine snapshot) — index those instead."""
         self._paints = paints_by_id  # paint_id -> Paint
         self._index: Dict[Tuple[str, str], List[RecipeEdge]] = {}
-        self._load(recipes_path)
+        if edges is not None:
+            for edge in edges:
+                self._index.setdefault((edge.from_id, edge.rel), []).append(edge)
+        else:
+            self._load(recipes_path)
 
     def _load(self, path: str) -> None:
         if not os.path.exists(path):
@@ -145,3 +152,8 @@ class RecipeGraph:
 
     def edge_count(self) -> int:
         return sum(len(v) for v in self._index.values())
+
+    def edges(self) -> Iterator[RecipeEdge]:
+        """Every loaded edge, in load order within each (from_id, rel) key."""
+        for key_edges in self._index.values():
+            yield from key_edges
@@ -3,27 +3,36 @@ SchemeStealer Main Engine - ENHANCED FOR ML
 Extracts comprehensive features for machine learning training
 """
 
+import colorsys
+import math
 import cv2
 import numpy as np
 import json
 import re
+import threading
 import unicodedata
 from PIL import Image
-from typing import List, Dict, Tuple, Optional
+from dataclasses import dataclass, field
+from typing import List, Dict, Tuple, Optional, Union
 from skimage import color as sk_color
 
-from config import ColorDetection, Affiliate
+from config import ColorDetection, Affiliate, BaseDetection
 from core.photo_processor import PhotoProcessor
 from core.base_detector import BaseDetector
 from core.color_engine import (
     Paint, ShadeTypeAnalyser,
     PaintMatcher, VisualizationEngine
 )
+from core.colour_maths import lab_to_rgb
+# Re-exported: the DB path helpers predate core.paint_db and are imported from here.
+from core.paint_db import CANONICAL_PAINT_DB, resolve_paint_db_path  # noqa: F401
+from core import delta_e_matrix, engine_snapshot
 from core.smart_color_system import SmartColorExtractor
 from core.recipe_graph import RecipeGraph
 from core.recipe_geometry import PaintNode, derive_partner, CANDIDATE_CATEGORIES
-from utils.helpers import apply_white_balance
+from utils.helpers import apply_white_balance_crop
 from utils.logging_config import logger
+from utils.metrics import stage
 
 
 def _slugify(*parts) -> str:
@@ -34,30 +43,6 @@ def _slugify(*parts) -> str:
     raw = re.sub(r'[^A-Za-z0-9]+', '-', raw).strip('-').lower()
     return raw or 'paint'
 
-CANONICAL_PAINT_DB = 'paints_groundtruth.json'
-
-
-def resolve_paint_db_path(path: str = CANONICAL_PAINT_DB) -> str:
-    """Resolve the single source-of-truth paint DB: ``paints_groundtruth.json``.
-
-    There are no fallbacks any more (the old ``paints_measured.json`` /
-    ``paints.json`` chain is gone). A legacy caller still passing the old default
-    ``'paints.json'`` is transparently redirected to the canonical DB; any other
-    explicit path is honoured (test fixtures). If the resolved file is missing we
-    raise ``FileNotFoundError`` rather than silently loading a stale DB.
-    """
-    import os
-    candidate = CANONICAL_PAINT_DB if path in ('paints.json', CANONICAL_PAINT_DB) else path
-    if not os.path.exists(candidate):
-        raise FileNotFoundError(
-            f"Paint DB not found: {candidate!r}. The canonical database is "
-            f"'{CANONICAL_PAINT_DB}' in python-api/ — run from there or pass an "
-            "explicit existing path."
-        )
-    logger.info(f"Loading ground-truth paint DB: {candidate}")
-    return candidate
-
-
 # Display-label bands per neutral family, ordered dark → light. Used by the
 # subdivision in _build_recipes_with_ml_features and the distinctness
 # tie-break below.
@@ -102,12 +87,32 @@ def _dedupe_neutral_display_labels(recipes: List[dict]) -> None:
             r['family'] = ordered[band_i]
 
 
+@dataclass(frozen=True)
+class ScanArtefact:
+    """The inventory-independent result of one scan (SchemeStealerEngine.extract).
+
+    Frozen, and treated as immutable throughout: phase two copies whatever it
+    annotates, so one artefact can be cached and re-annotated for any number
+    of inventories."""
+    recipes: Tuple[dict, ...]
+    quality_report: Dict = field(default_factory=dict)
+
+
+# Distinct (paint, slot) substitute lists kept by _substitute_candidates: a
+# few MB at most, and larger than a typical instance ever sees.
+_SUBSTITUTE_MEMO_SIZE = 8192
+
+# Recipe slot -> the matcher role its owned alternative is searched under.
+_OWNERSHIP_SLOTS = (('base', 'dominant'), ('highlight', 'highlight'),
+                    ('shade', 'shade'), ('wash', 'wash'))
+
+
 def reproject_to_frame(col: float, row: float,
                        analysis_w: int, analysis_h: int,
                        crop_rect: Tuple[int, int, int, int],
                        frame_shape: Tuple[int, int]) -> Tuple[float, float]:
     """Map an analysis-space pixel (col, row) — a point on the alpha-bbox-
-    cropped, RESIZE_WIDTH-wide analysis image — to normalised (x, y) on the
+    cropped, resized analysis image — to normalised (x, y) on the
     FULL uploaded frame, which is the image the frontend composites onto.
 
     ``col`` maps to x and ``row`` to y, always: the production marker bug was
@@ -120,66 +125,101 @@ def reproject_to_frame(col: float, row: float,
     return float(np.clip(fx, 0.0, 1.0)), float(np.clip(fy, 0.0, 1.0))
 
 
+def analysis_size(width: int, height: int, foreground_px: int,
+                  budget: Optional[int] = None) -> Tuple[int, int]:
+    """Working (width, height) for a width×height crop.
+
+    Fixed mode (budget 0) scales to RESIZE_WIDTH wide, so a tall thin mini
+    gets several times the pixels of a squat one. Budget mode scales both
+    sides by √(budget / foreground_px), so the foreground — the pixels the
+    extractor actually works on — comes out at about `budget` pixels and
+    per-scan cost stops depending on the crop's shape. Never upscales.
+    """
+    if budget is None:
+        budget = ColorDetection.ANALYSIS_PIXEL_BUDGET
+    if budget <= 0 or foreground_px <= 0:
+        new_w = ColorDetection.RESIZE_WIDTH
+        return new_w, int(new_w * (height / width))
+    scale = min(math.sqrt(budget / foreground_px), 1.0)
+    return max(int(round(width * scale)), 1), max(int(round(height * scale)), 1)
+
+
+def load_paint_db(paint_data: List[dict]) -> List[Paint]:
+    """The raw ground-truth records as Paint objects, colour properties
+    computed and color_family re-derived: the engine's JSON path, and the
+    state scripts/build_engine_snapshot.py snapshots."""
+    paints = []
+    for p in paint_data:
+        # paint_id is always present in the ground-truth DB; derive from
+        # name as a defensive fallback.
+        paint_id = p.get('paint_id') or _slugify(p.get('brand', ''), p.get('name', ''))
+        # The stored `lab` IS the applied-colour LAB, so it becomes the
+        # CIEDE2000 matching target (measured_lab) for every record.
+        # PROVENANCE IS NOT THE SAME QUESTION and is preserved, not asserted:
+        # 1,216 records are 'swatch-median' and 96 washes/inks are 'assumed'
+        # — their LAB was never measured at all (O-E1). A record with no
+        # color_source falls to the WEAKEST claim, never the strongest;
+        # unreachable on the current DB, where all 1,312 carry one.
+        paint = Paint(
+            name=p['name'],
+            brand=p['brand'],
+            hex=p['hex'],
+            type=p.get('type', p.get('category', 'base')),
+            color_family=p.get('color_family', ''),
+            category=p.get('category', 'base'),
+            finish=p.get('finish', 'matte'),                       # sheen, not metallic
+            # Transparency penalty input derived from measured opacity:
+            # opacity_rating 0 (translucent) → 1.0; 3 (opaque) → 0.0.
+            transparency=1.0 - (float(p.get('opacity_rating', 3)) / 3.0),
+            metallic=bool(p.get('metallic', False)),
+            matchable=bool(p.get('matchable', True)),
+            discontinued=bool(p.get('discontinued', False)),
+            paint_id=paint_id,
+            range=p.get('range', ''),
+            aliases=list(p.get('aliases', []) or []),
+            measured_lab=p.get('lab'),
+            color_source=p.get('color_source') or 'assumed',
+            opacity=p.get('opacity_rating'),
+            vibrancy=p.get('vibrancy'),
+        )
+        paint.compute_properties()
+        paints.append(paint)
+
+    # Family is DERIVED, not trusted: the stored color_family drifted from
+    # the canonical classifier for ~100 paints (F8), which corrupts the
+    # matcher's family gate and the recipe pools. The single classifier
+    # applied to the paint's own matching LAB is authoritative — the same
+    # invariant the scan side already obeys.
+    from core.color_engine import classify_family
+    overridden = 0
+    for paint in paints:
+        derived = classify_family(paint.lab, paint.chroma, paint.metallic)
+        if derived != (paint.color_family or '').lower():
+            overridden += 1
+        paint.color_family = derived
+    if overridden:
+        logger.info(f"Recomputed color_family from matching LAB for "
+                    f"{overridden} paints (stored value had drifted)")
+    return paints
+
+
 class SchemeStealerEngine:
     def __init__(self, paint_db_path: str = CANONICAL_PAINT_DB):
         logger.info(f"Initializing SchemeStealer Engine v2.6 (ML-Enhanced)")
         paint_db_path = resolve_paint_db_path(paint_db_path)
 
-        with open(paint_db_path, 'r') as f:
-            paint_data = json.load(f)
-        
-        self.paint_db = []
-        for p in paint_data:
-            # paint_id is always present in the ground-truth DB; derive from
-            # name as a defensive fallback.
-            paint_id = p.get('paint_id') or _slugify(p.get('brand', ''), p.get('name', ''))
-            # The stored `lab` IS the applied-colour LAB, so it becomes the
-            # CIEDE2000 matching target (measured_lab) for every record.
-            # PROVENANCE IS NOT THE SAME QUESTION and is preserved, not asserted:
-            # 1,216 records are 'swatch-median' and 96 washes/inks are 'assumed'
-            # — their LAB was never measured at all (O-E1). A record with no
-            # color_source falls to the WEAKEST claim, never the strongest;
-            # unreachable on the current DB, where all 1,312 carry one.
-            paint = Paint(
-                name=p['name'],
-                brand=p['brand'],
-                hex=p['hex'],
-                type=p.get('type', p.get('category', 'base')),
-                color_family=p.get('color_family', ''),
-                category=p.get('category', 'base'),
-                finish=p.get('finish', 'matte'),                       # sheen, not metallic
-                # Transparency penalty input derived from measured opacity:
-                # opacity_rating 0 (translucent) → 1.0; 3 (opaque) → 0.0.
-                transparency=1.0 - (float(p.get('opacity_rating', 3)) / 3.0),
-                metallic=bool(p.get('metallic', False)),
-                matchable=bool(p.get('matchable', True)),
-                discontinued=bool(p.get('discontinued', False)),
-                paint_id=paint_id,
-                range=p.get('range', ''),
-                aliases=list(p.get('aliases', []) or []),
-                measured_lab=p.get('lab'),
-                color_source=p.get('color_source') or 'assumed',
-                opacity=p.get('opacity_rating'),
-                vibrancy=p.get('vibrancy'),
-            )
-            paint.compute_properties()
-            self.paint_db.append(paint)
-
-        # Family is DERIVED, not trusted: the stored color_family drifted from
-        # the canonical classifier for ~100 paints (F8), which corrupts the
-        # matcher's family gate and the recipe pools. The single classifier
-        # applied to the paint's own matching LAB is authoritative — the same
-        # invariant the scan side already obeys.
-        from core.color_engine import classify_family
-        overridden = 0
-        for paint in self.paint_db:
-            derived = classify_family(paint.lab, paint.chroma, paint.metallic)
-            if derived != (paint.color_family or '').lower():
-                overridden += 1
-            paint.color_family = derived
-        if overridden:
-            logger.info(f"Recomputed color_family from matching LAB for "
-                        f"{overridden} paints (stored value had drifted)")
+        # Derived paint and recipe state comes from the engine snapshot when
+        # one was built from exactly these inputs (core/engine_snapshot.py),
+        # else from the JSON — the snapshot is a cache, never a second source.
+        snapshot = engine_snapshot.load(paint_db_path)
+        if snapshot is not None:
+            self.paint_db = snapshot.paints
+            delta_e_digest = snapshot.delta_e_digest
+        else:
+            with open(paint_db_path, 'r') as f:
+                paint_data = json.load(f)
+            self.paint_db = load_paint_db(paint_data)
+            delta_e_digest = delta_e_matrix.db_digest(paint_data)
 
         matchable_count = sum(1 for p in self.paint_db if p.matchable)
         logger.info(f"Loaded {len(self.paint_db)} paints from {paint_db_path} "
@@ -188,13 +228,17 @@ class SchemeStealerEngine:
         self.photo_processor = PhotoProcessor()
         self.base_detector = BaseDetector()
         self.smart_extractor = SmartColorExtractor()
-        self.matcher = PaintMatcher(self.paint_db)
+        # Build-time paint-to-paint ΔE matrix, memory-mapped (None when absent
+        # or built from a different DB — pairwise distances then use the kernel).
+        self.paint_distances = delta_e_matrix.load(digest=delta_e_digest)
+        self.matcher = PaintMatcher(self.paint_db, distances=self.paint_distances)
         self.viz_engine = VisualizationEngine()
 
         # Recipe relationship graph (curated + algorithmic edges) keyed on paint_id,
         # plus per-brand PaintNode pools for the live LAB-geometry fallback.
         self._paints_by_id = {p.paint_id: p for p in self.paint_db if p.paint_id}
-        self.recipe_graph = RecipeGraph(self._paints_by_id)
+        self.recipe_graph = RecipeGraph(self._paints_by_id,
+                                        edges=snapshot.edges if snapshot is not None else None)
         self._recipe_nodes = {}
         self._recipe_pools = {}
         for p in self.paint_db:
@@ -211,15 +255,37 @@ class SchemeStealerEngine:
             if node.matchable and not node.discontinued and node.category in CANDIDATE_CATEGORIES:
                 self._recipe_pools.setdefault(p.brand, []).append(node)
 
+        # (paint_id, brand, role, family) -> match_top_n result; see
+        # _substitute_candidates. Insertion-ordered, oldest dropped first.
+        # Guarded: the thread backend runs several scans on one engine.
+        self._substitute_memo = {}
+        self._substitute_memo_lock = threading.Lock()
+
         logger.info("Engine initialization complete - ML features enabled "
                     f"({self.recipe_graph.edge_count()} recipe edges)")
 
+    def extract(self, img_np: np.ndarray, mode: str = "mini", **kwargs) -> 'ScanArtefact':
+        """Phase one of a scan: everything that depends only on the pixels.
+
+        Takes analyze_miniature's arguments except `inventory`. Ownership is
+        phase two — annotate_inventory(artefact, inventory) — which can be
+        re-run for any inventory without touching the image again. With
+        match=False the recipes are unmatched clusters, for merge_views."""
+        recipes, _, quality_report = self.analyze_miniature(img_np, mode=mode, **kwargs)
+        return ScanArtefact(
+            recipes=tuple(recipes),
+            # The enhanced frame is a full-resolution array nothing after
+            # analysis reads; an artefact is meant to be cheap to keep.
+            quality_report={k: v for k, v in quality_report.items() if k != 'enhanced_image'},
+        )
+
     def analyze_miniature(self, img_np: np.ndarray, mode: str = "mini",
                          remove_base: bool = True, use_awb: bool = True,
                          detect_details: bool = True,
                          brands: List[str] = None,
                          precomputed_rgba: np.ndarray = None,
-                         inventory: set = None) -> Tuple[List[dict], np.ndarray, Dict]:
+                         inventory: set = None,
+                         match: bool = True) -> Tuple[List[dict], np.ndarray, Dict]:
 
         if brands is None:
             brands = Affiliate.SUPPORTED_BRANDS
@@ -229,64 +295,80 @@ class SchemeStealerEngine:
         #    must be measured from the un-enhanced photograph, or every
         #    cluster's L* inherits the local contrast redistribution and no
         #    longer matches the measured paint DB (dual-image invariant, F1).
-        quality_report = self.photo_processor.process_and_assess(img_np)
+        with stage("quality_check"):
+            quality_report = self.photo_processor.process_and_assess(img_np)
         if not quality_report.can_process:
             return [], None, quality_report.__dict__
 
-        # 2. Preprocessing — pass alpha mask when available so the illuminant
-        #    estimate is computed only over non-transparent foreground pixels.
-        if use_awb:
-            alpha_for_awb = None
-            if (precomputed_rgba is not None
-                    and precomputed_rgba.shape[:2] == img_np.shape[:2]):
-                alpha_for_awb = precomputed_rgba[:, :, 3]
-            img_np = apply_white_balance(img_np, alpha_mask=alpha_for_awb)
-        
-        # 3. Background Removal
+        # 2. Background Removal. Everything below works on views of the
+        #    caller's frame (which may be a read-only shared-memory block) —
+        #    crops are slices, and no full-frame RGBA copy is built.
         if mode == "mini":
             if precomputed_rgba is None:
                 raise ValueError("precomputed_rgba is required — background must be removed client-side")
             img_rgba = precomputed_rgba
             alpha = img_rgba[:, :, 3]
-            coords = cv2.findNonZero(alpha)
-            if coords is None: return [], None, quality_report.__dict__
-            
-            x, y, w, h = cv2.boundingRect(coords)
+            with stage("crop"):
+                coords = cv2.findNonZero(alpha)
+                if coords is None: return [], None, quality_report.__dict__
+                x, y, w, h = cv2.boundingRect(coords)
             cropped_rgba = img_rgba[y:y+h, x:x+w]
-            cropped_original = img_np[y:y+h, x:x+w]
             # The frontend composites masks/markers onto the UNCROPPED
             # uploaded image — record where the analysed crop sits in it.
             crop_rect = (x, y, w, h)
             frame_shape = img_rgba.shape[:2]
         else:
             h, w = img_np.shape[:2]
-            alpha = np.ones((h, w), dtype=np.uint8) * 255
-            cropped_rgba = np.dstack([img_np, alpha])
-            cropped_original = img_np
+            cropped_rgba = None
             crop_rect = (0, 0, w, h)
             frame_shape = (h, w)
 
+        # 3. Preprocessing — the illuminant is estimated only over
+        #    non-transparent foreground pixels, all of which lie inside the
+        #    crop, so only the crop is white-balanced.
+        if use_awb:
+            alpha_for_awb = None
+            if (precomputed_rgba is not None
+                    and precomputed_rgba.shape[:2] == img_np.shape[:2]):
+                alpha_for_awb = precomputed_rgba[:, :, 3]
+            with stage("white_balance"):
+                cropped_original = apply_white_balance_crop(img_np, alpha_for_awb, crop_rect)
+        else:
+            x, y, w, h = crop_rect
+            cropped_original = img_np[y:y+h, x:x+w]
+
         # 4. Resize for analysis
-        height, width = cropped_rgba.shape[:2]
-        new_w = ColorDetection.RESIZE_WIDTH
-        new_h = int(new_w * (height / width))
-        resized_rgba = cv2.resize(cropped_rgba, (new_w, new_h))
-        resized_original = cv2.resize(cropped_original, (new_w, new_h))
+        height, width = cropped_original.shape[:2]
+        if ColorDetection.ANALYSIS_PIXEL_BUDGET > 0 and cropped_rgba is not None:
+            foreground_px = int(np.count_nonzero(
+                cropped_rgba[:, :, 3] > BaseDetection.ALPHA_THRESHOLD))
+        else:
+            foreground_px = width * height
+        new_w, new_h = analysis_size(width, height, foreground_px)
+        with stage("resize"):
+            resized_original = cv2.resize(cropped_original, (new_w, new_h))
 
         # 5. Base Detection
         if mode == "mini" and remove_base:
-            mini_mask = self.base_detector.detect_base_region(resized_rgba)
+            with stage("base_detection"):
+                resized_rgba = cv2.resize(cropped_rgba, (new_w, new_h))
+                mini_mask = self.base_detector.detect_base_region(resized_rgba)
         else:
             mini_mask = np.ones((new_h, new_w), dtype=bool)
 
         # 6. Smart Color Extraction
-        colors = self.smart_extractor.extract_colors(resized_original, mini_mask)
-        
+        with stage("extract_colors"):
+            colors = self.smart_extractor.extract_colors(
+                resized_original, mini_mask,
+                pyramid=mode != "mini" and ColorDetection.INSPIRATION_PYRAMID)
+
         # 7. Build Recipes with FULL ML FEATURES
-        recipes = self._build_recipes_with_ml_features(
-            colors, resized_original, mini_mask, brands, new_w, new_h,
-            crop_rect=crop_rect, frame_shape=frame_shape, inventory=inventory
-        )
+        with stage("build_recipes"):
+            recipes = self._build_recipes_with_ml_features(
+                colors, resized_original, mini_mask, brands, new_w, new_h,
+                crop_rect=crop_rect, frame_shape=frame_shape, inventory=inventory,
+                match=match,
+            )
         recipes.sort(key=lambda x: (x.get('is_detail', False), -x['dominance']))
         
         return recipes, cropped_rgba, quality_report.__dict__
@@ -296,7 +378,7 @@ class SchemeStealerEngine:
                       width: int, height: int,
                       crop_rect: Tuple[int, int, int, int] = None,
                       frame_shape: Tuple[int, int] = None,
-                      inventory: set = None) -> List[dict]:
+                      inventory: set = None, match: bool = True) -> List[dict]:
         """
         Build recipes with comprehensive ML features
         
@@ -310,86 +392,181 @@ class SchemeStealerEngine:
         frame; reticle_x/reticle_y are emitted in full-frame normalised
         coordinates (the space the frontend composites in). position_x/y
         stay in analysis space — they are logged ML features.
+
+        match=False stops at the cluster recipes (_cluster_recipe): no paint
+        matches, and 'family' is still the detected family. A multi-angle
+        batch merges those across photographs and matches once
+        (merge_views, match_recipes).
         """
         if crop_rect is None:
             crop_rect = (0, 0, width, height)
         if frame_shape is None:
             frame_shape = (height, width)
-        recipes = []
-        
+        recipes = [self._cluster_recipe(color_data, img_rgb, mini_mask, width, height,
+                                        crop_rect, frame_shape)
+                   for color_data in colors]
+        if not match:
+            return recipes
+        self.match_recipes(recipes, brands)
+        # Ownership is the only inventory-dependent part of a recipe, so it is
+        # a separate pass over the finished recipes (see annotate_inventory).
+        if inventory:
+            recipes = self.annotate_inventory(recipes, inventory)
+        return recipes
+
+    def _cluster_recipe(self, color_data: Dict, img_rgb: np.ndarray,
+                        mini_mask: np.ndarray, width: int, height: int,
+                        crop_rect: Tuple[int, int, int, int],
+                        frame_shape: Tuple[int, int]) -> dict:
+        """One cluster's recipe without paint matches: colour, texture and
+        spatial features, mask and reticle."""
+        family = color_data.get('family', 'Unknown')
+
+        # Extract base color features
+        median_rgb = color_data['median_rgb']
+        median_hsv = color_data.get('median_hsv', np.array([0, 0, 0]))
+
+        # Compute LAB if not already present
+        median_lab = color_data.get('median_lab', None)
+        if median_lab is None:
+            # Convert RGB to LAB
+            rgb_norm = median_rgb / 255.0
+            median_lab = sk_color.rgb2lab(np.array([[rgb_norm]]))[0][0]
+
+        # Compute chroma (saturation in LAB space)
+        if isinstance(median_lab, np.ndarray):
+            chroma = np.sqrt(median_lab[1]**2 + median_lab[2]**2)
+        else:
+            chroma = color_data.get('chroma', 0)
+
+        shade_type = ShadeTypeAnalyser.determine_shade_type(
+            color_data, color_data.get('brightness_std', 30), family
+        )
+
+        # Metallic flag from the specular-variance detector run during
+        # classification (is_metallic_surface), NOT a family-string match.
+        # The old "Gold" in family / _is_gold_in_lab heuristic is gone.
+        is_metallic = bool(color_data.get('is_metallic', False))
+
+        # Calculate spatial features
+        spatial_mask = np.zeros(img_rgb.shape[:2], dtype=bool)
+        indices = color_data.get('pixel_indices')
+        if indices is not None:
+            mask_flat = mini_mask.flatten()
+            valid_coords = np.argwhere(mask_flat).flatten()
+            if len(indices) > 0 and len(valid_coords) > 0:
+                actual_indices = valid_coords[indices]
+                spatial_mask.ravel()[actual_indices] = True
+
+        # Calculate position (normalized 0-1)
+        y_coords, x_coords = np.where(spatial_mask)
+        if len(y_coords) > 0:
+            position_y = float(np.mean(y_coords) / height)
+            position_x = float(np.mean(x_coords) / width)
+        else:
+            position_y = 0.5
+            position_x = 0.5
+
+        # Find optimal reticle position (for numbered chip placement).
+        # find_optimal_reticle_position returns (x=col, y=row); reproject
+        # into FULL-FRAME normalised coords for the frontend.
+        reticle_pos = self.viz_engine.find_optimal_reticle_position(spatial_mask)
+        if reticle_pos:
+            reticle_x, reticle_y = reproject_to_frame(
+                reticle_pos[0], reticle_pos[1], width, height,
+                crop_rect, frame_shape)
+        else:
+            reticle_x, reticle_y = reproject_to_frame(
+                position_x * width, position_y * height, width, height,
+                crop_rect, frame_shape)
+
+        # Build comprehensive recipe with ML features
+        return {
+            # UI/Display data
+            'family': family,                   # display family (match_recipes may refine it)
+            'heuristic_family': family,         # detected colour's canonical hue_family
+            'dominance': color_data['coverage'],
+            'shade_type': shade_type,
+            'spatial_mask': spatial_mask,   # raw boolean mask for client-side compositing
+            'analysis_shape': (height, width),  # analysis resolution for mask alignment
+            'crop_rect': crop_rect,         # (x, y, w, h) of the analysed crop in the full frame
+            'frame_shape': frame_shape,     # (h, w) of the full uploaded frame
+            'rgb_preview': median_rgb.astype(int),
+            'is_detail': color_data.get('is_detail', False),
+
+            # ML FEATURES (for logging to Google Sheets)
+            # Color spaces (9 features)
+            'rgb': median_rgb.tolist() if isinstance(median_rgb, np.ndarray) else median_rgb,
+            'lab': median_lab.tolist() if isinstance(median_lab, np.ndarray) else median_lab,
+            'hsv': median_hsv.tolist() if isinstance(median_hsv, np.ndarray) else median_hsv,
+
+            # Texture features (3 features)
+            'chroma': float(chroma),
+            'brightness_std': float(color_data.get('brightness_std', 0)),
+
+            # Spatial features (2 features)
+            'position_x': position_x,
+            'position_y': position_y,
+
+            # Visual reticle positioning — FULL-FRAME normalised (0-1)
+            'reticle_x': reticle_x,
+            'reticle_y': reticle_y,
+
+            # Context features (2 features)
+            'is_metallic': is_metallic
+            # is_detail already included above
+        }
+
+    def match_recipes(self, recipes: List[dict], brands: List[str] = None) -> List[dict]:
+        """Add paint matches to cluster recipes, in place: base, highlight,
+        shade and wash per brand, and the display family those matches
+        decide. Returns `recipes`."""
+        if brands is None:
+            brands = Affiliate.SUPPORTED_BRANDS
+
         neutral_counts = {}
-        for c in colors:
-            fam = c.get('family', 'Unknown')
+        for r in recipes:
+            fam = r.get('heuristic_family', 'Unknown')
             if fam in ('Grey', 'White'):
                 neutral_counts[fam] = neutral_counts.get(fam, 0) + 1
-        
-        for color_data in colors:
-            family = color_data.get('family', 'Unknown')
-            
-            # Extract base color features
-            median_rgb = color_data['median_rgb']
-            median_hsv = color_data.get('median_hsv', np.array([0, 0, 0]))
-            
-            # Compute LAB if not already present
-            median_lab = color_data.get('median_lab', None)
-            if median_lab is None:
-                # Convert RGB to LAB
-                rgb_norm = median_rgb / 255.0
-                median_lab = sk_color.rgb2lab(np.array([[rgb_norm]]))[0][0]
-            
-            # Compute chroma (saturation in LAB space)
-            if isinstance(median_lab, np.ndarray):
-                chroma = np.sqrt(median_lab[1]**2 + median_lab[2]**2)
-            else:
-                chroma = color_data.get('chroma', 0)
-            
-            shade_type = ShadeTypeAnalyser.determine_shade_type(
-                color_data, color_data.get('brightness_std', 30), family
-            )
 
-            # Metallic flag from the specular-variance detector run during
-            # classification (is_metallic_surface), NOT a family-string match.
-            # The old "Gold" in family / _is_gold_in_lab heuristic is gone.
-            is_metallic = bool(color_data.get('is_metallic', False))
-
-            context = {
-                'is_metallic': is_metallic,
-                'is_saturated': median_hsv[1] > 0.5 if len(median_hsv) > 1 else False,
-                'high_chroma': chroma > 30
-            }
-
-            # Recipe assembly: base = the dominant-role colour match; highlight,
-            # shade and wash come from the recipe graph (curated edges first, then
-            # a live LAB-geometry fallback) — no synthetic-colour maths.
+        contexts = [{
+            'is_metallic': r['is_metallic'],
+            'is_saturated': r['hsv'][1] > 0.5 if len(r['hsv']) > 1 else False,
+            'high_chroma': r['chroma'] > 30
+        } for r in recipes]
+        # Base = the dominant-role colour match, for every cluster × brand in
+        # one matcher pass. The cluster's LAB representative is authoritative
+        # (F3): it is passed directly so the matcher never re-derives a second
+        # colour from the RGB view of the same cluster. Gating on the detected
+        # colour's canonical family (+ adjacent families) makes a brand with
+        # no in-family measured paint return an honest "No match found"
+        # rather than a far-off cross-family paint (Prompt 8).
+        base_paints = self.matcher.match_many(
+            [r['lab'] for r in recipes], brands, roles='dominant',
+            families=[(r.get('heuristic_family', 'Unknown') or '').lower() for r in recipes],
+            contexts=contexts)
+
+        for recipe, row in zip(recipes, base_paints):
+            family = recipe.get('heuristic_family', 'Unknown')
+            median_lab = np.asarray(recipe['lab'], dtype=float)
+            is_metallic = recipe['is_metallic']
+
+            # Recipe assembly: highlight, shade and wash come from the recipe
+            # graph (curated edges first, then a live LAB-geometry fallback)
+            # — no synthetic-colour maths.
             base_matches, highlight_matches, shade_matches, wash_matches = {}, {}, {}, {}
-            # Gate base matches to the detected colour's canonical family (+ adjacent
-            # families) so a brand with no in-family measured paint returns an honest
-            # "No match found" rather than a far-off cross-family paint (Prompt 8).
-            target_family = (family or '').lower()
-            for b in brands:
-                # The cluster's LAB representative is authoritative (F3): pass
-                # it directly so the matcher never re-derives a second colour
-                # from the RGB view of the same cluster.
-                base_paint = self.matcher.match_color(median_rgb, b, role='dominant',
-                                                      context=context,
-                                                      target_family=target_family,
-                                                      target_lab=median_lab)
-                                                      
-                base_alt = self._find_owned_alt(base_paint, b, 'dominant', target_family, inventory, context)
-                base_matches[b] = self._format_paint(base_paint, owned_alt=base_alt)
+            for b, base_paint in zip(brands, row):
+                base_matches[b] = self._format_paint(base_paint)
                 
                 if base_paint is not None:
                     hp, hs = self._recipe_partner(base_paint, 'highlight', b)
                     sp, ss = self._recipe_partner(base_paint, 'shade', b)
                     wp, ws = self._recipe_wash(base_paint)
                     
-                    hp_alt = self._find_owned_alt(hp, b, 'highlight', target_family, inventory, context)
-                    sp_alt = self._find_owned_alt(sp, b, 'shade', target_family, inventory, context)
-                    wp_alt = self._find_owned_alt(wp, b, 'wash', target_family, inventory, context)
-                    
-                    highlight_matches[b] = self._format_paint(hp, hs, owned_alt=hp_alt)
-                    shade_matches[b] = self._format_paint(sp, ss, owned_alt=sp_alt)
-                    wash_matches[b] = self._format_paint(wp, ws, is_wash=True, owned_alt=wp_alt)
+                    highlight_matches[b] = self._format_paint(hp, hs)
+                    shade_matches[b] = self._format_paint(sp, ss)
+                    wash_matches[b] = self._format_paint(wp, ws, is_wash=True)
                 else:
                     highlight_matches[b] = shade_matches[b] = wash_matches[b] = None
 
@@ -449,85 +626,131 @@ class SchemeStealerEngine:
                     else:
                         display_family = 'White'
 
-            # Calculate spatial features
-            spatial_mask = np.zeros(img_rgb.shape[:2], dtype=bool)
-            indices = color_data.get('pixel_indices')
-            if indices is not None:
-                mask_flat = mini_mask.flatten()
-                valid_coords = np.argwhere(mask_flat).flatten()
-                if len(indices) > 0 and len(valid_coords) > 0:
-                    actual_indices = valid_coords[indices]
-                    spatial_mask.ravel()[actual_indices] = True
-
-            # Calculate position (normalized 0-1)
-            y_coords, x_coords = np.where(spatial_mask)
-            if len(y_coords) > 0:
-                position_y = float(np.mean(y_coords) / height)
-                position_x = float(np.mean(x_coords) / width)
-            else:
-                position_y = 0.5
-                position_x = 0.5
-
-            # Find optimal reticle position (for numbered chip placement).
-            # find_optimal_reticle_position returns (x=col, y=row); reproject
-            # into FULL-FRAME normalised coords for the frontend.
-            reticle_pos = self.viz_engine.find_optimal_reticle_position(spatial_mask)
-            if reticle_pos:
-                reticle_x, reticle_y = reproject_to_frame(
-                    reticle_pos[0], reticle_pos[1], width, height,
-                    crop_rect, frame_shape)
-            else:
-                reticle_x, reticle_y = reproject_to_frame(
-                    position_x * width, position_y * height, width, height,
-                    crop_rect, frame_shape)
-
-            # Build comprehensive recipe with ML features
-            recipe = {
-                # UI/Display data
-                'family': display_family,          # detected colour's canonical hue_family
-                'heuristic_family': family,         # same value, kept for internal callers
-                'dominance': color_data['coverage'],
+            recipe.update({
+                'family': display_family,
                 'base': base_matches,
                 'highlight': highlight_matches,
                 'shade': shade_matches,
                 'wash': wash_matches,          # graph-driven wash (None -> scanner fallback)
-                'shade_type': shade_type,
-                'spatial_mask': spatial_mask,   # raw boolean mask for client-side compositing
-                'analysis_shape': (height, width),  # analysis resolution for mask alignment
-                'crop_rect': crop_rect,         # (x, y, w, h) of the analysed crop in the full frame
-                'frame_shape': frame_shape,     # (h, w) of the full uploaded frame
-                'rgb_preview': median_rgb.astype(int),
-                'is_detail': color_data.get('is_detail', False),
-                
-                # ML FEATURES (for logging to Google Sheets)
-                # Color spaces (9 features)
-                'rgb': median_rgb.tolist() if isinstance(median_rgb, np.ndarray) else median_rgb,
-                'lab': median_lab.tolist() if isinstance(median_lab, np.ndarray) else median_lab,
-                'hsv': median_hsv.tolist() if isinstance(median_hsv, np.ndarray) else median_hsv,
-                
-                # Texture features (3 features)
-                'chroma': float(chroma),
-                'brightness_std': float(color_data.get('brightness_std', 0)),
-                
-                # Spatial features (2 features)
-                'position_x': position_x,
-                'position_y': position_y,
-                
-                # Visual reticle positioning — FULL-FRAME normalised (0-1)
-                'reticle_x': reticle_x,
-                'reticle_y': reticle_y,
-                
-                # Context features (2 features)
-                'is_metallic': is_metallic
-                # is_detail already included above
-            }
-            
-            recipes.append(recipe)
+            })
 
         # Same-family neutral cards must never display identical labels.
         _dedupe_neutral_display_labels(recipes)
         return recipes
 
+    def merge_views(self, views: List[Tuple[dict, ...]]) -> Tuple[List[dict], List[List[int]]]:
+        """Merge the cluster recipes of several photographs of one miniature
+        (extract(..., match=False) per photograph) into one palette.
+
+        Returns (palette, assignment): palette holds unmatched recipes, ready
+        for match_recipes; assignment[v][j] is the palette index of view v's
+        cluster j. A merged colour is the coverage-weighted LAB blend of its
+        members (no view keeps its pixels, so there is no union median) and
+        its coverage is the mean over ALL views, so a surface only one angle
+        shows counts for less than one every angle shows.
+        """
+        pooled = [(v, j, r) for v, recipes in enumerate(views) for j, r in enumerate(recipes)]
+        assignment: List[List[int]] = [[-1] * len(recipes) for recipes in views]
+        if not pooled:
+            return [], assignment
+        labels = self.smart_extractor.group_across_views([
+            {'median_lab': np.asarray(r['lab'], dtype=float), 'family': r['heuristic_family']}
+            for _, _, r in pooled])
+        groups: Dict[int, list] = {}
+        for member, label in zip(pooled, labels):
+            groups.setdefault(int(label), []).append(member)
+
+        palette = [self._combine_view_recipes([r for _, _, r in members], len(views))
+                   for members in groups.values()]
+        order = sorted(range(len(palette)),
+                       key=lambda k: (palette[k]['is_detail'], -palette[k]['dominance']))
+        rank = {k: i for i, k in enumerate(order)}
+        for k, members in enumerate(groups.values()):
+            for v, j, _ in members:
+                assignment[v][j] = rank[k]
+        return [palette[k] for k in order], assignment
+
+    @staticmethod
+    def _combine_view_recipes(members: List[dict], n_views: int) -> dict:
+        """One palette recipe from the same surface's clusters across views."""
+        weights = np.array([float(r['dominance']) for r in members])
+        weights = weights / weights.sum() if weights.sum() > 0 else np.full(len(members), 1 / len(members))
+        lab = np.average([np.asarray(r['lab'], dtype=float) for r in members], axis=0, weights=weights)
+        rgb = lab_to_rgb(lab)
+        hsv = np.array(colorsys.rgb_to_hsv(*(rgb / 255.0)))
+        family = members[0]['heuristic_family']
+        is_metallic = bool(sum(w for r, w in zip(members, weights) if r['is_metallic']) >= 0.5)
+        brightness_std = float(np.dot(weights, [r['brightness_std'] for r in members]))
+        cluster = {'median_hsv': hsv, 'is_metallic': is_metallic}
+        return {
+            'family': family,
+            'heuristic_family': family,
+            'dominance': sum(float(r['dominance']) for r in members) / n_views,
+            'shade_type': ShadeTypeAnalyser.determine_shade_type(cluster, brightness_std, family),
+            'rgb_preview': rgb.astype(int),
+            'is_detail': all(r.get('is_detail', False) for r in members),
+            'rgb': rgb.tolist(),
+            'lab': lab.tolist(),
+            'hsv': hsv.tolist(),
+            'chroma': float(np.hypot(lab[1], lab[2])),
+            'brightness_std': brightness_std,
+            'is_metallic': is_metallic,
+        }
+
+    def ownership_annotations(self, recipes: List[dict],
+                              inventory: set) -> Dict[Tuple[int, str, str], dict]:
+        """The owned-alternative for every matched slot the user does not
+        own, keyed (recipe index, slot, brand).
+
+        Reads only what the inventory-independent recipe already carries —
+        each slot's paint_id, the cluster's heuristic_family (the family
+        gate) and its is_metallic flag (the metallic exclusion) — so a
+        cached recipe can be re-annotated for any inventory without
+        re-running extraction or matching."""
+        annotations = {}
+        if not inventory:
+            return annotations
+        for i, recipe in enumerate(recipes):
+            target_family = (recipe.get('heuristic_family') or '').lower()
+            context = {'is_metallic': bool(recipe.get('is_metallic', False))}
+            for slot, role in _OWNERSHIP_SLOTS:
+                for brand, match in (recipe.get(slot) or {}).items():
+                    paint = self._paints_by_id.get(match.get('paint_id')) if match else None
+                    alt = self._find_owned_alt(paint, brand, role, target_family, inventory, context)
+                    if alt:
+                        annotations[(i, slot, brand)] = alt
+        return annotations
+
+    @staticmethod
+    def apply_ownership(recipes: List[dict],
+                        annotations: Dict[Tuple[int, str, str], dict]) -> List[dict]:
+        """Recipes with `owned_alternative` merged into the annotated slots.
+        Returns copies wherever something changed; the inputs are never
+        mutated, so cached recipes stay inventory-free."""
+        if not annotations:
+            return list(recipes)
+        out = []
+        for i, recipe in enumerate(recipes):
+            copied = dict(recipe)
+            for slot, _role in _OWNERSHIP_SLOTS:
+                matches = recipe.get(slot)
+                if not matches or not any((i, slot, b) in annotations for b in matches):
+                    continue
+                copied[slot] = {
+                    b: (dict(m, owned_alternative=annotations[(i, slot, b)])
+                        if (i, slot, b) in annotations else m)
+                    for b, m in matches.items()
+                }
+            out.append(copied)
+        return out
+
+    def annotate_inventory(self, artefact: Union['ScanArtefact', List[dict]],
+                           inventory: set) -> List[dict]:
+        """Phase two of a scan: a ScanArtefact (or its inventory-free
+        recipes) -> recipes carrying owned alternatives for `inventory`."""
+        recipes = artefact.recipes if isinstance(artefact, ScanArtefact) else artefact
+        return self.apply_ownership(recipes, self.ownership_annotations(recipes, inventory))
+
     def _find_owned_alt(self, paint: 'Paint', brand: str, role: str, target_family: str,
                         inventory: set, context: dict = None) -> Optional[dict]:
         if not paint or not inventory:
@@ -535,7 +758,7 @@ class SchemeStealerEngine:
         if paint.paint_id in inventory:
             return None
 
-        candidates = self.matcher.match_top_n(paint.lab, brand, role=role, target_family=target_family, n=20)
+        candidates = self._substitute_candidates(paint, brand, role, target_family)
 
         # A matte target must not be offered a metallic substitute (DEC-5 /
         # O-D4). `match_color` already refuses to SERVE one — metallics are
@@ -571,11 +794,37 @@ class SchemeStealerEngine:
             return alt_dict
         return None
 
+    def _substitute_candidates(self, paint: 'Paint', brand: str, role: str,
+                               target_family: str) -> List[Tuple['Paint', float]]:
+        """match_top_n(n=20) for an owned-alternative lookup, memoised.
+
+        The ranked candidates depend on the paint and slot, never on the
+        inventory, and match_top_n's dedup is the whole cost of an ownership
+        pass — so re-annotating a cached scan for a changed inventory, or any
+        scan recommending an already-seen paint, skips it."""
+        key = (paint.paint_id, brand, role, target_family)
+        with self._substitute_memo_lock:
+            candidates = self._substitute_memo.get(key)
+        if candidates is None:
+            # Computed outside the lock: two scans racing on one key both
+            # compute the same list, which is cheaper than serialising them.
+            candidates = self.matcher.match_top_n(paint.lab, brand, role=role,
+                                                  target_family=target_family, n=20)
+            with self._substitute_memo_lock:
+                if (key not in self._substitute_memo
+                        and len(self._substitute_memo) >= _SUBSTITUTE_MEMO_SIZE):
+                    self._substitute_memo.pop(next(iter(self._substitute_memo)))
+                self._substitute_memo[key] = candidates
+        return candidates
+
     def _format_paint(self, paint, source: str = None, is_wash: bool = False, owned_alt: dict = None):
         """Format a Paint for the recipe dict (incl. optional relationship source)."""
         if paint is None:
             return None
         out = {
+            # Internal handle for the ownership pass; format_paint_match does
+            # not copy it into the API payload.
+            'paint_id': paint.paint_id,
             'name': paint.name,
             'hex': paint.hex,
             'type': 'wash' if is_wash else paint.type,
@@ -4,13 +4,14 @@ No more HSV threshold hell - uses perceptual science instead
 """
 import numpy as np
 import cv2
-from sklearn.cluster import DBSCAN, KMeans
-from sklearn.preprocessing import StandardScaler
 from skimage import color
-from scipy.spatial.distance import cdist
 from typing import List, Dict, Tuple, Optional
 import colorsys
-from core.colour_maths import lab_to_oklab, lab_to_rgb
+from core.cluster_graph import ClusterGraph
+from core.colour_maths import lab_to_oklab, lab_to_rgb, pixels_to_lab_oklab
+from core.lab_sketch import LabSketch
+from core.superpixels import get_backend
+from core.weighted_kmeans import weighted_kmeans
 from utils.logging_config import logger
 
 
@@ -27,7 +28,8 @@ class SmartColorExtractor:
     _SPECULAR_L_LOW = 2
     _MIN_PIXELS_AFTER_FILTER = 5000
 
-    def __init__(self):
+    def __init__(self, superpixel_backend: Optional[str] = None):
+        self.superpixel_backend = get_backend(superpixel_backend)
         self.min_cluster_size = 0.03
         self.detail_threshold = 0.05
 
@@ -36,8 +38,15 @@ class SmartColorExtractor:
         self.GOLD_CHROMA_THRESHOLD = 22
         self.DETAIL_BASE_THRESHOLD = 3.0
     
-    def extract_colors(self, img_rgb: np.ndarray, mask: np.ndarray) -> List[Dict]:
-        """Main extraction pipeline - fully adaptive"""
+    def extract_colors(self, img_rgb: np.ndarray, mask: np.ndarray,
+                       pyramid: bool = False) -> List[Dict]:
+        """Main extraction pipeline - fully adaptive
+
+        pyramid=True finds the palette at half resolution and only settles
+        cluster boundaries and lost high-chroma detail at full resolution
+        (see _refine_labels) — far cheaper on a frame with no mask to shrink
+        the superpixel pass.
+        """
         logger.info("Starting smart color extraction (FINAL VERSION)")
         
         # Get valid pixels
@@ -48,10 +57,16 @@ class SmartColorExtractor:
             logger.warning("Too few pixels to analyze")
             return []
         
-        # Convert to LAB (perceptually uniform)
-        pixels_lab = color.rgb2lab(
-            pixels_rgb.reshape(-1, 1, 3) / 255.0
-        ).reshape(-1, 3)
+        # Convert to LAB (perceptually uniform) and OKLab (the clustering
+        # space) together: uint8 input takes the LUT kernel, one XYZ pass
+        # for both and no full-size temporaries.
+        if pixels_rgb.dtype == np.uint8:
+            pixels_lab, pixels_oklab = pixels_to_lab_oklab(pixels_rgb)
+        else:
+            pixels_lab = color.rgb2lab(
+                pixels_rgb.reshape(-1, 1, 3) / 255.0
+            ).reshape(-1, 3)
+            pixels_oklab = lab_to_oklab(pixels_lab)
 
         # Filter specular highlights (gloss varnish, flash) and deep shadows
         # before clustering so they don't form phantom clusters or drag medians.
@@ -72,6 +87,7 @@ class SmartColorExtractor:
             surviving_indices = np.where(keep)[0]
             pixels_rgb = pixels_rgb[keep]
             pixels_lab = pixels_lab[keep]
+            pixels_oklab = pixels_oklab[keep]
             n_pixels = len(pixels_rgb)
             logger.debug(f"Specular filter: kept {n_pixels} pixels "
                          f"(L* {p_lo:.1f}–{p_hi:.1f})")
@@ -90,8 +106,10 @@ class SmartColorExtractor:
         # perceptual distance — deliberately over-segmented (K=20); the
         # complete-linkage merge consolidates. Cluster statistics stay in
         # CIELAB for the classifier and matcher downstream.
-        pixels_oklab = lab_to_oklab(pixels_lab)
-        seg_flat = self._superpixel_labels(img_rgb, mask, surviving_indices)
+        if pyramid:
+            seg_flat = self._coarse_superpixel_labels(img_rgb, mask, surviving_indices)
+        else:
+            seg_flat = self._superpixel_labels(img_rgb, mask, surviving_indices)
 
         uniq, inv = np.unique(seg_flat, return_inverse=True)
         counts = np.bincount(inv).astype(float)
@@ -103,9 +121,11 @@ class SmartColorExtractor:
         logger.info(f"Clustering {len(uniq)} superpixels into "
                     f"{n_initial_clusters} clusters (OKLab)...")
 
-        kmeans = KMeans(n_clusters=n_initial_clusters, n_init=10, random_state=42)
-        kmeans.fit(sp_means, sample_weight=counts)
-        labels = kmeans.labels_[inv]
+        sp_labels, centres = weighted_kmeans(sp_means, counts, n_initial_clusters)
+        labels = sp_labels[inv]
+        if pyramid:
+            labels, n_initial_clusters = self._refine_labels(
+                labels, centres, mask, surviving_indices, pixels_lab, pixels_oklab)
 
         # Per-superpixel brightness std — the LOCAL variance signal for the
         # metallic detector. Metallic flake sparkles WITHIN a superpixel-sized
@@ -119,40 +139,68 @@ class SmartColorExtractor:
         seg_meansq = np.bincount(inv, weights=brightness_all ** 2) / counts
         seg_std = np.sqrt(np.maximum(seg_meansq - seg_mean ** 2, 0.0))
 
+        # Per-cluster statistics in one sweep: a stable sort by label makes
+        # every cluster a contiguous segment of the pixel arrays (in original
+        # pixel order), so sums come from one reduceat per array and each
+        # median sorts only its own segment — cost is independent of K. LAB
+        # is gathered channel-major: each cluster's columns are then sorted
+        # in place for its LabSketch, and this is the only copy.
+        order = np.argsort(labels, kind='stable')
+        sizes = np.bincount(labels, minlength=n_initial_clusters)
+        starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+        present = np.flatnonzero(sizes)
+        sorted_columns = np.empty((3, len(order)))
+        for ch in range(3):
+            np.take(pixels_lab[:, ch], order, out=sorted_columns[ch])
+        sorted_lab = sorted_columns.T
+        sorted_brightness = brightness_all[order]
+        sorted_labels = labels[order]
+
+        def segment_means(values: np.ndarray) -> np.ndarray:
+            means = np.zeros((n_initial_clusters,) + values.shape[1:])
+            sums = np.add.reduceat(values, starts[present], axis=0)
+            means[present] = sums / sizes[present].reshape((-1,) + (1,) * (values.ndim - 1))
+            return means
+
+        mean_labs = segment_means(sorted_lab)
+        std_labs = np.sqrt(segment_means((sorted_lab - mean_labs[sorted_labels]) ** 2))
+        mean_brightness = segment_means(sorted_brightness)
+        brightness_stds = np.sqrt(segment_means(
+            (sorted_brightness - mean_brightness[sorted_labels]) ** 2))
+
+        # A cluster's local variance is the pixel-weighted mean of its
+        # superpixels' stds (the size-weighted mean when, without pyramid
+        # refinement, clusters are unions of whole superpixels).
+        local_brightness_stds = np.bincount(labels, weights=seg_std[inv],
+                                            minlength=n_initial_clusters)
+        np.divide(local_brightness_stds, sizes, out=local_brightness_stds,
+                  where=sizes > 0)
+
         initial_clusters = []
         for i in range(n_initial_clusters):
-            cluster_mask = labels == i
-            size = np.sum(cluster_mask)
+            size = sizes[i]
             coverage = (size / n_pixels) * 100
 
             if size < 10:
                 continue
 
-            cluster_pixels_rgb = pixels_rgb[cluster_mask]
-            cluster_pixels_lab = pixels_lab[cluster_mask]
+            segment = slice(starts[i], starts[i] + size)
 
             # ONE colour representative per cluster: the LAB median. RGB, HSV
             # and chroma are DERIVED from it so every statistic describes the
             # same colour (F3 fix) — the classifier and the matcher can no
-            # longer see two different colours for one cluster.
-            median_lab = np.median(cluster_pixels_lab, axis=0)
+            # longer see two different colours for one cluster. The sketch
+            # keeps the sorted channels so merges find union medians without
+            # gathering the union.
+            local_indices = order[segment]
+            lab_sketch = LabSketch.in_place(sorted_columns[:, segment], local_indices)
+            median_lab = lab_sketch.median()
             median_rgb = lab_to_rgb(median_lab)
-            mean_lab = np.mean(cluster_pixels_lab, axis=0)
-            std_lab = np.std(cluster_pixels_lab, axis=0)
-            brightness = cluster_pixels_rgb.mean(axis=1)
-            brightness_std = np.std(brightness)
             chroma = np.sqrt(median_lab[1]**2 + median_lab[2]**2)
             median_hsv = np.array(colorsys.rgb_to_hsv(*(median_rgb / 255.0)))
 
-            # Clusters are unions of whole superpixels, so the cluster's local
-            # variance is the size-weighted mean of its superpixels' stds.
-            seg_in_cluster = kmeans.labels_ == i
-            local_brightness_std = float(np.average(
-                seg_std[seg_in_cluster], weights=counts[seg_in_cluster]))
-
             # Remap local (post-filter) indices back to original pixel positions
             # so that spatial-mask reconstruction in the engine works correctly.
-            local_indices = np.where(cluster_mask)[0]
             original_indices = surviving_indices[local_indices]
 
             initial_clusters.append({
@@ -160,22 +208,27 @@ class SmartColorExtractor:
                 'coverage': coverage,
                 'median_rgb': median_rgb,
                 'median_lab': median_lab,
-                'mean_lab': mean_lab,
-                'std_lab': std_lab,
+                'mean_lab': mean_labs[i],
+                'std_lab': std_labs[i],
                 'chroma': chroma,
-                'brightness_std': brightness_std,
-                'local_brightness_std': local_brightness_std,
+                'brightness_std': brightness_stds[i],
+                'local_brightness_std': float(local_brightness_stds[i]),
                 'median_hsv': median_hsv,
                 'pixel_indices': original_indices,
                 'local_indices': local_indices,
+                'lab_sketch': lab_sketch,
             })
         
+        # Every step from here compares cluster medians pairwise; the graph
+        # holds those distances once for the scan and grows as clusters merge.
+        graph = ClusterGraph(initial_clusters, self._ramp_distance)
+
         # STEP 2: Perceptual merging
-        merged_clusters = self._merge_perceptually_similar(initial_clusters, pixels_lab)
+        merged_clusters = self._merge_perceptually_similar(initial_clusters, pixels_lab, graph)
         
         # STEP 3: Classify Families WITH spatial shadow detection
         for cluster in merged_clusters:
-            if self._is_likely_shadow(cluster, merged_clusters):
+            if self._is_likely_shadow(cluster, merged_clusters, graph):
                 cluster['family'] = "Shadow"
                 cluster['confidence'] = 0.30
                 logger.info(f"Cluster marked as shadow: coverage={cluster['coverage']:.1f}%")
@@ -189,7 +242,7 @@ class SmartColorExtractor:
         logger.info(f"After shadow filtering: {len(merged_clusters)} clusters remain")
         
         # STEP 4: Deduplicate Families
-        deduplicated_clusters = self._deduplicate_by_family(merged_clusters, pixels_lab)
+        deduplicated_clusters = self._deduplicate_by_family(merged_clusters, pixels_lab, graph)
         
         # STEP 5: Classify Major vs Detail WITH confidence filtering
         major_colors = []
@@ -222,7 +275,8 @@ class SmartColorExtractor:
                 major_colors.append(cluster)
             elif coverage >= 0.2:
                 cluster['is_detail'] = True
-                is_unique, conflicting_major = self._is_unique_from_majors(cluster, major_colors)
+                is_unique, conflicting_major = self._is_unique_from_majors(cluster, major_colors,
+                                                                           graph)
                 if is_unique:
                     detail_colors.append(cluster)
                 elif conflicting_major is not None:
@@ -245,13 +299,13 @@ class SmartColorExtractor:
 
     def _superpixel_labels(self, img_rgb: np.ndarray, mask: np.ndarray,
                            surviving_indices: np.ndarray) -> np.ndarray:
-        """SLIC superpixel id for each surviving (masked, filtered) pixel.
+        """Superpixel id for each surviving (masked, filtered) pixel, from the
+        configured backend (core/superpixels.py).
 
-        Falls back to one-pixel-one-segment if SLIC cannot run (degenerate
-        mask shapes) — clustering then behaves exactly like pixel K-means.
+        Falls back to one-pixel-one-segment if the backend cannot run
+        (degenerate mask shapes) — clustering then behaves exactly like pixel
+        K-means.
         """
-        from skimage.segmentation import slic
-
         n_masked = int(mask.sum())
         # ~40 px per superpixel (≈6×6 patches at analysis scale): fine enough
         # that painted detail (stripes, trim, panel lines) is not blended into
@@ -260,15 +314,99 @@ class SmartColorExtractor:
         # statistic downstream.
         n_segments = int(np.clip(n_masked // 40, 128, 1600))
         try:
-            seg2d = slic(img_rgb, n_segments=min(n_segments, max(n_masked // 4, 1)),
-                         compactness=10.0, mask=mask, start_label=1,
-                         enforce_connectivity=True)
+            seg2d = self.superpixel_backend(img_rgb, mask,
+                                            min(n_segments, max(n_masked // 4, 1)))
             return seg2d[mask][surviving_indices]
         except (ValueError, TypeError) as e:
-            logger.warning(f"SLIC failed ({e}) — falling back to per-pixel clustering")
+            logger.warning(f"Superpixels failed ({e}) — falling back to per-pixel clustering")
             return np.arange(len(surviving_indices))
+
+    # Pyramid refinement: a pixel further than this (OKLab) from its coarse
+    # cluster's centre is re-assigned at full resolution; a high-chroma one
+    # further than this from EVERY centre is detail the 2×2 averaging lost.
+    _PYRAMID_REFINE_DISTANCE = 0.05
+    _PYRAMID_DETAIL_CHROMA = 40
+    _PYRAMID_DETAIL_K = 3
+
+    def _coarse_superpixel_labels(self, img_rgb: np.ndarray, mask: np.ndarray,
+                                  surviving_indices: np.ndarray) -> np.ndarray:
+        """_superpixel_labels from a half-resolution pass: the backend runs on
+        the 2×2 block means of the masked pixels, and each surviving pixel
+        takes the superpixel of its block. A masked-SLIC call costs roughly
+        pixels × segments, so this is the step the pyramid exists to shrink.
+        """
+        h, w = mask.shape
+        pad = ((0, h % 2), (0, w % 2))
+        blocks = np.pad(mask, pad, mode='edge')
+        hc, wc = blocks.shape[0] // 2, blocks.shape[1] // 2
+        blocks = blocks.reshape(hc, 2, wc, 2)
+        n_block = blocks.sum(axis=(1, 3))
+        coarse_mask = n_block > 0
+        sums = (np.pad(img_rgb, pad + ((0, 0),), mode='edge').astype(float)
+                .reshape(hc, 2, wc, 2, 3) * blocks[..., np.newaxis]).sum(axis=(1, 3))
+        coarse = sums / np.maximum(n_block, 1)[..., np.newaxis]
+        if img_rgb.dtype == np.uint8:
+            coarse = np.rint(coarse).astype(np.uint8)
+
+        coarse_seg = np.zeros((hc, wc), dtype=np.intp)
+        coarse_seg[coarse_mask] = self._superpixel_labels(
+            coarse, coarse_mask, np.arange(int(coarse_mask.sum()))) + 1
+        ys, xs = np.nonzero(mask)
+        return coarse_seg[ys // 2, xs // 2][surviving_indices]
+
+    def _refine_labels(self, labels: np.ndarray, centres: np.ndarray, mask: np.ndarray,
+                       surviving_indices: np.ndarray, pixels_lab: np.ndarray,
+                       pixels_oklab: np.ndarray) -> Tuple[np.ndarray, int]:
+        """Full-resolution pass over a coarse labelling; returns (labels, K).
+
+        Only two kinds of pixel are revisited, each re-assigned to its nearest
+        centre: pixels within two pixels of a cluster boundary (which the
+        coarse pass drew in 2×2 steps), and pixels far from their own
+        cluster's centre. Revisited high-chroma pixels that no centre
+        explains — trim and gems averaged into their surroundings at half
+        resolution — are clustered into up to _PYRAMID_DETAIL_K extra
+        clusters if there are enough of them to be a detail (0.2% coverage).
+        """
+        n_clusters = len(centres)
+        ys, xs = np.nonzero(mask)
+        ys, xs = ys[surviving_indices], xs[surviving_indices]
+        label_img = np.full(mask.shape, -1, dtype=np.intp)
+        label_img[ys, xs] = labels
+
+        h, w = mask.shape
+        edge = np.zeros(mask.shape, dtype=bool)
+        padded = np.pad(label_img, 1, constant_values=-1)
+        for dy in (0, 1, 2):
+            for dx in (0, 1, 2):
+                other = padded[dy:dy + h, dx:dx + w]
+                edge |= (other >= 0) & (other != label_img)
+        edge &= label_img >= 0
+        padded = np.pad(edge, 1)
+        near_edge = np.zeros_like(edge)
+        for dy in (0, 1, 2):
+            for dx in (0, 1, 2):
+                near_edge |= padded[dy:dy + h, dx:dx + w]
+
+        limit = self._PYRAMID_REFINE_DISTANCE ** 2
+        own = ((pixels_oklab - centres[labels]) ** 2).sum(axis=1)
+        revisit = np.flatnonzero(near_edge[ys, xs] | (own > limit))
+        if len(revisit) == 0:
+            return labels, n_clusters
+        dist = ((pixels_oklab[revisit, np.newaxis, :] - centres[np.newaxis]) ** 2).sum(axis=2)
+        labels = labels.copy()
+        labels[revisit] = dist.argmin(axis=1)
+
+        chroma = np.hypot(pixels_lab[revisit, 1], pixels_lab[revisit, 2])
+        lost = revisit[(dist.min(axis=1) > limit) & (chroma > self._PYRAMID_DETAIL_CHROMA)]
+        if len(lost) >= max(0.002 * len(labels), 10):
+            k = min(self._PYRAMID_DETAIL_K, len(lost))
+            detail_labels, _ = weighted_kmeans(pixels_oklab[lost], np.ones(len(lost)), k)
+            labels[lost] = n_clusters + detail_labels
+            n_clusters += k
+        return labels, n_clusters
     
-    def _deduplicate_by_family(self, clusters: List[Dict], pixels_lab: np.ndarray) -> List[Dict]:
+    def _deduplicate_by_family(self, clusters: List[Dict], pixels_lab: np.ndarray,
+                               graph: Optional[ClusterGraph] = None) -> List[Dict]:
         """Consolidate clusters that share a family name — ramp-aware.
 
         Within a family the hue is already agreed, so members are grouped by
@@ -293,7 +431,7 @@ class SmartColorExtractor:
                 final_clusters.append(group[0])
                 continue
 
-            sub_labels = self._ramp_groups(group, self._RAMP_FAMILY_THRESHOLD)
+            sub_labels = self._ramp_groups(group, self._RAMP_FAMILY_THRESHOLD, graph)
             subs: Dict[int, List[Dict]] = {}
             for cluster, s in zip(group, sub_labels):
                 subs.setdefault(int(s), []).append(cluster)
@@ -315,6 +453,32 @@ class SmartColorExtractor:
         final_clusters.sort(key=lambda x: x['coverage'], reverse=True)
         return final_clusters
 
+    def group_across_views(self, clusters: List[Dict]) -> np.ndarray:
+        """Group labels for clusters pooled from several photographs of ONE
+        miniature (a multi-angle batch).
+
+        The same rule as _deduplicate_by_family: clusters group only within a
+        family, by the ramp metric at its generous threshold. A surface seen
+        from another angle is mostly re-lit, and that is a lightness shift,
+        which the ramp metric discounts. Labels are unique across families.
+        """
+        graph = ClusterGraph(clusters, self._ramp_distance)
+        labels = np.zeros(len(clusters), dtype=int)
+        by_family: Dict[str, List[int]] = {}
+        for i, c in enumerate(clusters):
+            by_family.setdefault(c['family'], []).append(i)
+        next_label = 1
+        for members in by_family.values():
+            if len(members) == 1:
+                sub = np.array([1])
+            else:
+                sub = self._ramp_groups([clusters[i] for i in members],
+                                        self._RAMP_FAMILY_THRESHOLD, graph)
+            for i, s in zip(members, sub):
+                labels[i] = next_label + int(s) - 1
+            next_label += int(sub.max())
+        return labels
+
     # Small high-chroma trim protection thresholds (Prompt 1.3, Module 3).
     _TRIM_SMALL_COVERAGE = 8.0    # percent — "small" region
     _TRIM_HIGH_CHROMA = 30.0      # trim must be genuinely saturated to be protected
@@ -365,32 +529,42 @@ class SmartColorExtractor:
     _RAMP_FAMILY_THRESHOLD = 0.16
     _RAMP_MAX_L_SPAN = 0.5
 
-    def _ramp_groups(self, clusters: List[Dict], threshold: float) -> np.ndarray:
+    def _ramp_distance(self, oks1: np.ndarray, oks2: np.ndarray) -> np.ndarray:
+        """(n, m) ramp-metric distances between two sets of OKLab colours,
+        ΔL-capped pairs at an effectively infinite 1e6."""
+        chroma1 = np.hypot(oks1[:, 1], oks1[:, 2])
+        chroma2 = np.hypot(oks2[:, 1], oks2[:, 2])
+        pair_c = np.minimum(chroma1[:, None], chroma2[None, :])
+        t = np.clip(pair_c / self._RAMP_CHROMA_REF, 0.0, 1.0)
+        w_l = (self._RAMP_L_WEIGHT_NEUTRAL
+               + t * (self._RAMP_L_WEIGHT_CHROMA - self._RAMP_L_WEIGHT_NEUTRAL))
+
+        diff = oks1[:, None, :] - oks2[None, :, :]
+        d = np.sqrt(w_l * diff[..., 0] ** 2
+                    + diff[..., 1] ** 2 + diff[..., 2] ** 2)
+        d[np.abs(diff[..., 0]) > self._RAMP_MAX_L_SPAN] = 1e6
+        return d
+
+    def _ramp_groups(self, clusters: List[Dict], threshold: float,
+                     graph: Optional[ClusterGraph] = None) -> np.ndarray:
         """Group labels from capped complete-linkage over the ramp metric.
 
         Complete linkage keeps the grouping order-independent and, combined
         with the pairwise ΔL cap (blocked pairs get an effectively infinite
-        distance), bounds every group's lightness span.
+        distance), bounds every group's lightness span. Distances come from
+        the scan's ClusterGraph when one is given.
         """
         from scipy.cluster.hierarchy import fcluster, linkage
         from scipy.spatial.distance import squareform
 
-        oks = lab_to_oklab(np.array([c['median_lab'] for c in clusters]))
-        chroma_ok = np.hypot(oks[:, 1], oks[:, 2])
-        pair_c = np.minimum(chroma_ok[:, None], chroma_ok[None, :])
-        t = np.clip(pair_c / self._RAMP_CHROMA_REF, 0.0, 1.0)
-        w_l = (self._RAMP_L_WEIGHT_NEUTRAL
-               + t * (self._RAMP_L_WEIGHT_CHROMA - self._RAMP_L_WEIGHT_NEUTRAL))
-
-        diff = oks[:, None, :] - oks[None, :, :]
-        d = np.sqrt(w_l * diff[..., 0] ** 2
-                    + diff[..., 1] ** 2 + diff[..., 2] ** 2)
-        d[np.abs(diff[..., 0]) > self._RAMP_MAX_L_SPAN] = 1e6
-        condensed = squareform(d, checks=False)
+        if graph is None:
+            graph = ClusterGraph(clusters, self._ramp_distance)
+        condensed = squareform(graph.ramp_matrix(clusters), checks=False)
         return fcluster(linkage(condensed, method='complete'),
                         t=threshold, criterion='distance')
 
-    def _merge_perceptually_similar(self, clusters: List[Dict], pixels_lab: np.ndarray) -> List[Dict]:
+    def _merge_perceptually_similar(self, clusters: List[Dict], pixels_lab: np.ndarray,
+                                    graph: Optional[ClusterGraph] = None) -> List[Dict]:
         """Merge perceptually similar clusters — order-independent.
 
         Capped complete-linkage over the ramp metric: two clusters end up
@@ -401,7 +575,7 @@ class SmartColorExtractor:
         if len(clusters) <= 1:
             return clusters
 
-        groups = self._ramp_groups(clusters, self._RAMP_MERGE_THRESHOLD)
+        groups = self._ramp_groups(clusters, self._RAMP_MERGE_THRESHOLD, graph)
 
         by_group: Dict[int, List[Dict]] = {}
         for cluster, g in zip(clusters, groups):
@@ -440,11 +614,14 @@ class SmartColorExtractor:
         weights = weights / weights.sum()
 
         all_indices = np.concatenate([c['pixel_indices'] for c in clusters])
-        all_local_indices = np.concatenate([c['local_indices'] for c in clusters])
 
-        # 1a. Union-median
-        union_lab = pixels_lab[all_local_indices]
-        median_lab = np.median(union_lab, axis=0)
+        # 1a. Union-median, merged from the members' sketches (a cluster
+        # built without one — a hand-made fixture — is sketched from its
+        # local_indices).
+        union = LabSketch.merge([
+            c['lab_sketch'] if 'lab_sketch' in c
+            else LabSketch.of(pixels_lab, c['local_indices']) for c in clusters])
+        median_lab = union.median()
 
         # 1b. Darker-half bias for dark NEUTRAL clusters only.
         #
@@ -478,9 +655,7 @@ class SmartColorExtractor:
             union_family = classify_family(
                 median_lab, float(np.hypot(median_lab[1], median_lab[2])), False)
             if union_family in ('grey', 'black', 'white'):
-                l_vals = union_lab[:, 0]
-                darker_half_mask = l_vals <= np.median(l_vals)
-                darker_pixels = union_lab[darker_half_mask]
+                darker_pixels = union.darker_half(pixels_lab, median_lab[0])
                 if len(darker_pixels) > 0:
                     biased_lab = np.median(darker_pixels, axis=0)
                     biased_family = classify_family(
@@ -503,7 +678,7 @@ class SmartColorExtractor:
                 for c, w in zip(clusters, weights))),
             'median_hsv': np.array(colorsys.rgb_to_hsv(*(median_rgb / 255.0))),
             'pixel_indices': all_indices,
-            'local_indices': all_local_indices
+            'lab_sketch': union,
         }
         # Preserve the metallic decision through merges (coverage-weighted
         # majority) — previously the flag was silently dropped, so merged
@@ -513,18 +688,16 @@ class SmartColorExtractor:
                 w for c, w in zip(clusters, weights) if c['is_metallic']) >= 0.5)
         return combined
     
-    def _is_unique_from_majors(self, detail: Dict, majors: List[Dict]) -> Tuple[bool, Optional[Dict]]:
+    def _is_unique_from_majors(self, detail: Dict, majors: List[Dict],
+                               graph: Optional[ClusterGraph] = None) -> Tuple[bool, Optional[Dict]]:
         """Chroma-aware uniqueness checking. Returns (is_unique, conflicting_major)"""
         if not majors: return True, None
-        detail_lab = detail['median_lab']
         detail_chroma = detail.get('chroma', 0)
+        if graph is None:
+            graph = ClusterGraph([detail] + majors, self._ramp_distance)
+        distances = graph.delta_e(detail, majors)
         
-        for major in majors:
-            major_lab = major['median_lab']
-            dist = color.deltaE_ciede2000(
-                np.array([[detail_lab]]), 
-                np.array([[major_lab]])
-            )[0][0]
+        for major, dist in zip(majors, distances):
             
             # Chroma-aware threshold
             if detail_chroma > 40:
@@ -541,7 +714,8 @@ class SmartColorExtractor:
                 return False, major
         return True, None
     
-    def _is_likely_shadow(self, cluster: Dict, all_clusters: List[Dict]) -> bool:
+    def _is_likely_shadow(self, cluster: Dict, all_clusters: List[Dict],
+                          graph: Optional[ClusterGraph] = None) -> bool:
         """Detect if a dark cluster is likely a shadow"""
         coverage = cluster['coverage']
         hsv = cluster['median_hsv']
@@ -553,25 +727,20 @@ class SmartColorExtractor:
         if v > 0.20 or v < 0.05:
             return False
         
-        cluster_lab = cluster['median_lab']
+        # Identity, not equality: these dicts hold NumPy arrays, so `==`
+        # reaches `bool(array == array)` and raises whenever two DIFFERENT
+        # merged clusters compare equal up to their first array-valued key
+        # (merged clusters lead with `coverage`, so an exact coverage
+        # collision is enough). Audit O-C14b.
+        others = [other for other in all_clusters if other is not cluster]
+        if not others:
+            return False
+        if graph is None:
+            graph = ClusterGraph([cluster] + others, self._ramp_distance)
         
-        for other in all_clusters:
-            # Identity, not equality: these dicts hold NumPy arrays, so `==`
-            # reaches `bool(array == array)` and raises whenever two DIFFERENT
-            # merged clusters compare equal up to their first array-valued key
-            # (merged clusters lead with `coverage`, so an exact coverage
-            # collision is enough). Audit O-C14b.
-            if other is cluster:
-                continue
-            
-            other_lab = other['median_lab']
+        for other, deltaE in zip(others, graph.delta_e(cluster, others)):
             other_v = other['median_hsv'][2]
             
-            deltaE = color.deltaE_ciede2000(
-                np.array([[cluster_lab]]), 
-                np.array([[other_lab]])
-            )[0][0]
-            
             if deltaE < 15.0 and other_v > v + 0.20:
                 logger.info(f"Shadow detected: similar to {other.get('family', 'unknown')}")
                 return True
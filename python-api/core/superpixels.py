@@ -0,0 +1,135 @@
+"""
+Superpixel backends for the extractor's over-segmentation.
+
+A backend maps (img_rgb, mask, n_segments) to a label image: one id ≥ 1 per
+superpixel on masked pixels, 0 elsewhere. SmartColorExtractor only uses the
+labels to pool pixels before k-means (per-superpixel OKLab means, sizes and
+brightness stds), so a backend is interchangeable as long as its segments
+are small, compact and colour-coherent.
+
+  skimage  skimage.segmentation.slic with connectivity enforcement — the
+           reference. Masked SLIC seeds its centres by clustering the mask's
+           coordinates and iterates ten times over 2S×2S windows, which makes
+           it the most expensive call in a scan.
+  grid     grid-seeded SLIC in NumPy with a fixed iteration budget: one seed
+           per S×S cell of the mask (at the cell's masked-pixel mean), each
+           pixel compared only with the seeds of the 3×3 cells around its own,
+           centres updated with bincount. No connectivity pass: a stray
+           fragment still pools pixels of its centre's colour, which is all
+           the extractor asks of a segment.
+
+Selected with SUPERPIXEL_BACKEND (default skimage); see
+benchmarks/superpixels.py for latency and card-family agreement.
+"""
+
+import os
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from core.colour_maths import pixels_to_lab_oklab
+
+SuperpixelBackend = Callable[[np.ndarray, np.ndarray, int], np.ndarray]
+
+COMPACTNESS = 10.0
+GRID_ITERATIONS = 4
+
+
+def skimage_slic(img_rgb: np.ndarray, mask: np.ndarray, n_segments: int) -> np.ndarray:
+    """Reference backend: skimage's masked SLIC."""
+    from skimage.segmentation import slic
+    return slic(img_rgb, n_segments=n_segments, compactness=COMPACTNESS, mask=mask,
+                start_label=1, enforce_connectivity=True)
+
+
+def _pixel_lab(pixels: np.ndarray) -> np.ndarray:
+    if pixels.dtype == np.uint8:
+        return pixels_to_lab_oklab(pixels)[0]
+    from skimage.color import rgb2lab
+    return rgb2lab(pixels.reshape(-1, 1, 3) / 255.0).reshape(-1, 3)
+
+
+def _segment_means(values: np.ndarray, labels: np.ndarray, counts: np.ndarray,
+                   out: np.ndarray) -> None:
+    """Per-label means of (n, d) values into out (rows with no pixels kept)."""
+    filled = counts > 0
+    for d in range(values.shape[1]):
+        sums = np.bincount(labels, weights=values[:, d], minlength=len(counts))
+        out[filled, d] = sums[filled] / counts[filled]
+
+
+def grid_slic(img_rgb: np.ndarray, mask: np.ndarray, n_segments: int,
+              n_iter: int = GRID_ITERATIONS) -> np.ndarray:
+    """Fast backend: grid-seeded SLIC over the masked pixels only."""
+    ys, xs = np.nonzero(mask)
+    if len(ys) == 0 or n_segments < 1:
+        raise ValueError("grid SLIC needs a non-empty mask and n_segments ≥ 1")
+    lab = _pixel_lab(img_rgb[ys, xs])
+
+    # S×S cells over the mask's bounding box, S from the masked area so the
+    # segment count tracks n_segments however much of the frame is masked.
+    step = max(np.sqrt(len(ys) / n_segments), 1.0)
+    cy = ((ys - ys.min()) / step).astype(np.intp)
+    cx = ((xs - xs.min()) / step).astype(np.intp)
+    grid_h, grid_w = int(cy.max()) + 2, int(cx.max()) + 2
+    occupied, home = np.unique(cy * grid_w + cx, return_inverse=True)
+    n_centres = len(occupied)
+    cell_centre = np.full(grid_h * grid_w, -1, dtype=np.intp)
+    cell_centre[occupied] = np.arange(n_centres)
+
+    # Candidate centres: the seeds of the 3×3 cells around each pixel's cell
+    # (-1 where the cell is off the grid or holds no masked pixel).
+    candidates = []
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            ny, nx = cy + dy, cx + dx
+            on_grid = (ny >= 0) & (nx >= 0)
+            cand = cell_centre[np.where(on_grid, ny * grid_w + nx, 0)]
+            candidates.append(np.where(on_grid, cand, -1))
+
+    # SLIC's distance, d_lab² + (m/S)²·d_xy², as one squared euclidean
+    # distance: position is scaled by m/S into the feature vector.
+    spatial_scale = COMPACTNESS / step
+    features = np.column_stack([lab, ys * spatial_scale, xs * spatial_scale])
+    counts = np.bincount(home, minlength=n_centres).astype(float)
+    centres = np.zeros((n_centres, features.shape[1]))
+    _segment_means(features, home, counts, centres)
+
+    labels = home
+    for _ in range(n_iter):
+        best = np.full(len(ys), np.inf)
+        new_labels = labels.copy()
+        for cand in candidates:
+            valid = cand >= 0
+            c = np.where(valid, cand, 0)
+            diff = centres.take(c, axis=0)
+            diff -= features
+            dist = np.einsum('ij,ij->i', diff, diff)
+            closer = valid & (dist < best)
+            np.copyto(best, dist, where=closer)
+            np.copyto(new_labels, c, where=closer)
+        labels = new_labels
+        counts = np.bincount(labels, minlength=n_centres).astype(float)
+        _segment_means(features, labels, counts, centres)
+
+    seg = np.zeros(mask.shape, dtype=np.intp)
+    # Consecutive ids from 1, dropping centres that ended with no pixels.
+    seg[ys, xs] = np.unique(labels, return_inverse=True)[1] + 1
+    return seg
+
+
+BACKENDS: Dict[str, SuperpixelBackend] = {
+    'skimage': skimage_slic,
+    'grid': grid_slic,
+}
+
+
+def get_backend(name: Optional[str] = None) -> SuperpixelBackend:
+    """The named backend, else SUPERPIXEL_BACKEND's, else the reference."""
+    if name is None:
+        name = os.environ.get("SUPERPIXEL_BACKEND", "skimage")
+    name = name.strip().lower()
+    if name not in BACKENDS:
+        raise ValueError(f"unknown superpixel backend {name!r} "
+                         f"(expected one of {', '.join(BACKENDS)})")
+    return BACKENDS[name]
@@ -0,0 +1,188 @@
+"""
+Weighted k-means for the extractor's superpixel clustering.
+
+A NumPy port of what SmartColorExtractor used to run through sklearn —
+KMeans(n_clusters=k, n_init=10, random_state=42).fit(X, sample_weight=w),
+Lloyd's algorithm — kept step-for-step faithful so the clusters (and their
+numbering, which the merge and the cluster ids inherit) do not move:
+
+  * X is centred on its mean before anything else, tol is scaled by the
+    mean per-feature variance, and iteration stops at 300, at an unchanged
+    labelling, or once the summed squared centre shift is within tol;
+  * the n_init k-means++ seedings draw from ONE RandomState in sequence
+    (2 + ln k local trials per centre, weights folded into the potential);
+  * distances are ||c||² − 2x·c, ties go to the lowest centre, empty
+    clusters are relocated to the points farthest from their centres;
+  * the winning run is the first with the lowest inertia, and a later run
+    only displaces it if it is a different partition, not a relabelling.
+
+What changes is the shape of the work. At the extractor's scale (≤1600
+superpixel means, K=20, 3 features) sklearn's per-fit overhead — parameter
+validation, threadpool probing, ten sequential Cython runs — is much of the
+cost; here the ten restarts run as one batch, each Lloyd step one matmul
+over every still-running restart, and a restart drops out of the batch as
+soon as it converges. It also keeps sklearn (and the scipy it drags in)
+off the scan engine's import path.
+"""
+
+from typing import Tuple
+
+import numpy as np
+
+
+def _sq_distances(A: np.ndarray, X: np.ndarray, x_sq_norms: np.ndarray) -> np.ndarray:
+    """Squared euclidean distances, rows of A to rows of X (clipped at 0)."""
+    d = -2 * (A @ X.T)
+    d += np.einsum('ij,ij->i', A, A)[:, np.newaxis]
+    d += x_sq_norms[np.newaxis, :]
+    np.maximum(d, 0, out=d)
+    return d
+
+
+def kmeans_plusplus(X: np.ndarray, n_clusters: int, x_sq_norms: np.ndarray,
+                    sample_weight: np.ndarray, rng: np.random.RandomState) -> np.ndarray:
+    """Greedy weighted k-means++ seeding; returns (n_clusters, n_features) centres."""
+    n_samples = X.shape[0]
+    n_local_trials = 2 + int(np.log(n_clusters))
+    centers = np.empty((n_clusters, X.shape[1]), dtype=X.dtype)
+
+    center_id = rng.choice(n_samples, p=sample_weight / sample_weight.sum())
+    centers[0] = X[center_id]
+    closest_dist_sq = _sq_distances(centers[0, np.newaxis], X, x_sq_norms)
+    current_pot = closest_dist_sq @ sample_weight
+
+    for c in range(1, n_clusters):
+        rand_vals = rng.uniform(size=n_local_trials) * current_pot
+        candidate_ids = np.searchsorted(np.cumsum(sample_weight * closest_dist_sq), rand_vals)
+        np.clip(candidate_ids, None, n_samples - 1, out=candidate_ids)
+        dist = _sq_distances(X[candidate_ids], X, x_sq_norms)
+        np.minimum(closest_dist_sq, dist, out=dist)
+        candidates_pot = dist @ sample_weight.reshape(-1, 1)
+        best = np.argmin(candidates_pot)
+        current_pot = candidates_pot[best]
+        closest_dist_sq = dist[best]
+        centers[c] = X[candidate_ids[best]]
+    return centers
+
+
+def _assign(X: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    """Nearest-centre labels for a batch of centre sets, (R, k, d) → (R, n)."""
+    n_runs, k, n_features = centers.shape
+    # One (n, R·k) product rather than R batched ones: with 3 features a
+    # batched matmul is all loop overhead.
+    flat = centers.reshape(n_runs * k, n_features)
+    dist = X @ flat.T
+    dist *= -2
+    dist += np.einsum('ij,ij->i', flat, flat)
+    return dist.reshape(len(X), n_runs, k).argmin(axis=2).T
+
+
+def _relocate_empty(X, sample_weight, centers_old, sums, weights, labels) -> None:
+    """Move empty clusters onto the points farthest from their centres (in place)."""
+    empty = np.flatnonzero(weights == 0)
+    if len(empty) == 0:
+        return
+    distances = ((X - centers_old[labels]) ** 2).sum(axis=1)
+    far = np.argpartition(distances, -len(empty))[:-len(empty) - 1:-1]
+    if distances.max() == 0:
+        return                       # fewer distinct points than clusters
+    for new_id, far_idx in zip(empty, far):
+        w = sample_weight[far_idx]
+        old_id = labels[far_idx]
+        sums[old_id] -= X[far_idx] * w
+        sums[new_id] = X[far_idx] * w
+        weights[new_id] = w
+        weights[old_id] -= w
+
+
+def _lloyd(X: np.ndarray, sample_weight: np.ndarray, centers: np.ndarray,
+           tol: float, max_iter: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Lloyd's algorithm on R restarts at once; returns (labels (R, n), centres)."""
+    n_runs, k, n_features = centers.shape
+    n = X.shape[0]
+    centers = centers.copy()
+    labels = np.full((n_runs, n), -1, dtype=np.intp)
+    strict = np.zeros(n_runs, dtype=bool)
+    active = np.arange(n_runs)
+    weighted_X = X * sample_weight[:, np.newaxis]
+    offsets = (np.arange(n_runs) * k)[:, np.newaxis]
+
+    for _ in range(max_iter):
+        if len(active) == 0:
+            break
+        old = centers[active]
+        new_labels = _assign(X, old)
+
+        # Per-cluster weight and weighted coordinate sums for every active
+        # restart in one bincount each: restart r's cluster j is bin r·k + j.
+        bins = (new_labels + offsets[:len(active)]).ravel()
+        size = len(active) * k
+        weights = np.bincount(bins, weights=np.tile(sample_weight, len(active)),
+                              minlength=size).reshape(len(active), k)
+        sums = np.stack([np.bincount(bins, weights=np.tile(weighted_X[:, f], len(active)),
+                                     minlength=size) for f in range(n_features)],
+                        axis=-1).reshape(len(active), k, n_features)
+
+        for r in np.flatnonzero((weights == 0).any(axis=1)):
+            _relocate_empty(X, sample_weight, old[r], sums[r], weights[r], new_labels[r])
+        nonempty = weights > 0
+        alpha = np.divide(1.0, weights, out=np.zeros_like(weights), where=nonempty)
+        new = sums * alpha[..., np.newaxis]
+        if not nonempty.all():
+            # An empty cluster that could not be relocated sits on the
+            # heaviest cluster rather than at the origin.
+            for r in np.flatnonzero(~nonempty.all(axis=1)):
+                new[r, ~nonempty[r]] = new[r, np.argmax(weights[r])]
+        shift_tot = ((new - old) ** 2).sum(axis=(1, 2))
+
+        unchanged = (new_labels == labels[active]).all(axis=1)
+        centers[active] = new
+        labels[active] = new_labels
+        strict[active[unchanged]] = True
+        active = active[~unchanged & (shift_tot > tol)]
+
+    # Runs that stopped on the shift tolerance (or max_iter) carry labels
+    # from their previous centres; one more assignment step settles them.
+    loose = np.flatnonzero(~strict)
+    if len(loose):
+        labels[loose] = _assign(X, centers[loose])
+    return labels, centers
+
+
+def _same_clustering(labels1: np.ndarray, labels2: np.ndarray, n_clusters: int) -> bool:
+    """True if the two labellings are one partition up to a renaming of labels."""
+    mapping = np.full(n_clusters, -1, dtype=np.intp)
+    first = np.unique(labels1, return_index=True)[1]
+    mapping[labels1[first]] = labels2[first]
+    return bool(np.array_equal(mapping[labels1], labels2))
+
+
+def weighted_kmeans(X, sample_weight, n_clusters: int, n_init: int = 10,
+                    random_state: int = 42, max_iter: int = 300,
+                    tol: float = 1e-4) -> Tuple[np.ndarray, np.ndarray]:
+    """Weighted k-means (best of n_init k-means++ restarts).
+
+    Returns (labels, centers): a cluster index per row of X and the
+    (n_clusters, n_features) centres.
+    """
+    X = np.array(X, dtype=np.float64)
+    sample_weight = np.asarray(sample_weight, dtype=np.float64)
+    tol = float(np.mean(np.var(X, axis=0)) * tol)
+    X_mean = X.mean(axis=0)
+    X -= X_mean
+    x_sq_norms = np.einsum('ij,ij->i', X, X)
+
+    rng = np.random.RandomState(random_state)
+    seeds = np.stack([kmeans_plusplus(X, n_clusters, x_sq_norms, sample_weight, rng)
+                      for _ in range(n_init)])
+    labels, centers = _lloyd(X, sample_weight, seeds, tol, max_iter)
+
+    best = 0
+    best_inertia = None
+    for r in range(n_init):
+        diff = X - centers[r][labels[r]]
+        inertia = np.einsum('ij,ij->i', diff, diff) @ sample_weight
+        if best_inertia is None or (inertia < best_inertia and
+                                    not _same_clustering(labels[r], labels[best], n_clusters)):
+            best, best_inertia = r, inertia
+    return labels[best], centers[best] + X_mean
@@ -15,7 +15,6 @@ os.environ.setdefault(
     "TensorrtExecutionProvider,CUDAExecutionProvider,MIGraphXExecutionProvider",
 )
 
-import gc
 import io
 import json
 import base64
@@ -26,13 +25,13 @@ from contextlib import asynccontextmanager
 from pathlib import Path
 from fastapi import FastAPI, File, UploadFile, HTTPException, Request, Form
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from PIL import Image, ImageOps, UnidentifiedImageError
 Image.MAX_IMAGE_PIXELS = 25_000_000  # Prevent Decompression Bomb OOM crashes (max ~25 megapixels)
 import numpy as np
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel, Field
 import logging
 
@@ -42,6 +41,13 @@ os.chdir(Path(__file__).parent)
 from routes.ml_data import router as ml_data_router
 from routes.analytics import router as analytics_router
 from routes.forge import router as forge_router
+from utils import metrics
+from services.memory_governor import (
+    DEFAULT_HIGH_WATER_BYTES, RENDER_BYTES, MemoryGovernor, instance_budget,
+    instance_memory_bytes, scan_cost, workers_that_fit,
+)
+from services.preload import preload_enabled, preload_scanners
+from services.result_cache import ScanResultCache
 
 # Configure logging
 logging.basicConfig(
@@ -61,16 +67,64 @@ _miniature_scanner = None
 _inspiration_scanner = None
 _scanner_ready = threading.Event()
 
-# Bound concurrent CPU-bound scans so simultaneous uploads can't stack large image
-# buffers and OOM the single ~512 MB Render worker (M-9). Default 1; override with
-# MAX_CONCURRENT_SCANS if the instance has more headroom.
-_MAX_CONCURRENT_SCANS = int(os.environ.get("MAX_CONCURRENT_SCANS", "1"))
-_scan_semaphore = asyncio.Semaphore(_MAX_CONCURRENT_SCANS)
+# Scan backend. 'thread' (default) runs scans on this process's default
+# executor, so every scan shares one GIL-bound core. 'process' dispatches them
+# to SCAN_WORKERS pre-started worker processes, each owning warm scanners
+# (services/scan_pool.py) — throughput then scales with cores. Each worker
+# holds its own ~150 MB engine, so SCAN_WORKERS defaults to the cores the
+# instance's memory can feed: one on a 512 MB instance.
+_SCAN_BACKEND = os.environ.get("SCAN_BACKEND", "thread").strip().lower()
+# Longest side of the frame handed to the scanners.
+_SCAN_MAX_SIDE = 1024
+_INSTANCE_MEMORY_BYTES = int(os.environ.get("INSTANCE_MEMORY_BYTES", 0)) or instance_memory_bytes()
+_SCAN_WORKERS = int(os.environ.get("SCAN_WORKERS", 0)) or min(
+    os.cpu_count() or 1,
+    workers_that_fit(_INSTANCE_MEMORY_BYTES, scan_cost(_SCAN_MAX_SIDE, _SCAN_MAX_SIDE)))
+_scan_pool = None
+
+# Admit scans against a memory budget rather than a fixed count, so
+# simultaneous uploads can't stack large working sets and OOM the single
+# ~512 MB Render worker (M-9) while small scans still run side by side
+# (services/memory_governor.py). The default budget is for the whole
+# instance (INSTANCE_MEMORY_BYTES, else its cgroup limit or physical
+# memory): what its memory leaves once every
+# scanning process's warm engine and result caches, and the artefact store,
+# are paid for — one scanning process on the thread backend, SCAN_WORKERS
+# plus the API process on the process backend. A full collection runs only
+# when RSS crosses MEMORY_HIGH_WATER_BYTES.
+_scan_budget = int(os.environ.get(
+    "SCAN_MEMORY_BUDGET_BYTES",
+    instance_budget(
+        scan_processes=_SCAN_WORKERS if _SCAN_BACKEND == "process" else 1,
+        separate_api_process=_SCAN_BACKEND == "process",
+        instance_bytes=_INSTANCE_MEMORY_BYTES)))
+if _scan_budget <= 0:
+    logger.warning(
+        f"No scan memory budget left on a {_INSTANCE_MEMORY_BYTES // (1024 * 1024)} MB "
+        f"instance with {_SCAN_BACKEND} backend ({_SCAN_WORKERS} workers): scans will "
+        "be admitted one at a time. Lower SCAN_WORKERS or raise the instance size.")
+_memory_governor = MemoryGovernor(
+    budget_bytes=_scan_budget,
+    high_water_bytes=int(os.environ.get("MEMORY_HIGH_WATER_BYTES", DEFAULT_HIGH_WATER_BYTES)),
+)
+
+# scanId -> (kind, ScanArtefact) for every recent scan, so a changed inventory
+# can be re-annotated (/api/scan/annotate) without a re-upload. Kept in THIS
+# process on either backend: any scan worker can annotate an artefact.
+_scan_artefacts = ScanResultCache()
 
 
 def _prewarm():
-    global _miniature_scanner, _inspiration_scanner
+    global _miniature_scanner, _inspiration_scanner, _scan_pool
     try:
+        if _SCAN_BACKEND == "process":
+            logger.info(f"Starting scan pool ({_SCAN_WORKERS} worker processes)...")
+            from services.scan_pool import ScanPool
+            pool = ScanPool(_SCAN_WORKERS)
+            pool.start()
+            _scan_pool = pool
+            return
+
         logger.info("Pre-warming miniature scanner...")
         from services.miniature_scanner import MiniatureScannerService
         _miniature_scanner = MiniatureScannerService()
@@ -86,6 +140,21 @@ def _prewarm():
         _scanner_ready.set()
 
 
+# Preload mode (PRELOAD_SCANNERS=1, run under `gunicorn --preload`): build the
+# scanners here, at import, so the master builds them once and every forked
+# worker inherits them warm (services/preload.py). Process-backend workers are
+# spawned, not forked, so they gain nothing from it.
+if preload_enabled():
+    if _SCAN_BACKEND == "process":
+        logger.warning("PRELOAD_SCANNERS ignored: SCAN_BACKEND=process workers "
+                       "build their own scanners")
+    else:
+        _preloaded = preload_scanners()
+        _miniature_scanner = _preloaded["miniature"]
+        _inspiration_scanner = _preloaded["inspiration"]
+        _scanner_ready.set()
+
+
 async def _await_scanner_ready(timeout: int = 250):
     """Yield to the event loop while waiting for the background init thread."""
     if not _scanner_ready.is_set():
@@ -94,6 +163,64 @@ async def _await_scanner_ready(timeout: int = 250):
         await loop.run_in_executor(None, _scanner_ready.wait, timeout)
 
 
+def _scanners_available(kind: str) -> bool:
+    if _scan_pool is not None:
+        return _scan_pool.ready
+    return (_miniature_scanner if kind == "miniature" else _inspiration_scanner) is not None
+
+
+async def _run_scan(kind: str, image: Image.Image, inventory: Optional[set]) -> dict:
+    """Run one scan on the configured backend. The process backend hands the
+    decoded frame to a worker through shared memory; the thread backend scans
+    in this process. The scan's inventory-free artefact is kept under the
+    response's scanId for /api/scan/annotate."""
+    with metrics.stage("scan_total"):
+        if _scan_pool is not None:
+            result, artefact = await asyncio.wrap_future(
+                _scan_pool.submit(kind, image, inventory))
+        else:
+            scanner = _miniature_scanner if kind == "miniature" else _inspiration_scanner
+            loop = asyncio.get_running_loop()
+            result, artefact = await loop.run_in_executor(
+                None, lambda: scanner.scan_array_with_artefact(np.asarray(image), inventory))
+    _scan_artefacts.put(result["scanId"], (kind, artefact))
+    return result
+
+
+async def _run_view(image: Image.Image) -> tuple:
+    """Phase one for one photograph of a miniature batch, admitted against
+    the memory budget on its own: (scan id, unmatched ScanArtefact)."""
+    async with _memory_governor.admit(scan_cost(*image.size)):
+        if _scan_pool is not None:
+            return await asyncio.wrap_future(_scan_pool.submit_view("miniature", image))
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, lambda: _miniature_scanner.extract_view(np.asarray(image)))
+
+
+async def _run_combine(views: list, inventory: Optional[set]) -> dict:
+    """Merge a miniature batch's views and build its recipes once."""
+    async with _memory_governor.admit(RENDER_BYTES):
+        if _scan_pool is not None:
+            return await asyncio.wrap_future(
+                _scan_pool.submit_combine("miniature", views, inventory))
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, _miniature_scanner.combine_views, views, inventory)
+
+
+async def _run_render(kind: str, scan_id: str, artefact, inventory: Optional[set]) -> dict:
+    """Phase two of a stored scan (re-annotation for an inventory) on the
+    configured backend."""
+    with metrics.stage("annotate_total"):
+        if _scan_pool is not None:
+            return await asyncio.wrap_future(
+                _scan_pool.submit_render(kind, scan_id, artefact, inventory))
+        scanner = _miniature_scanner if kind == "miniature" else _inspiration_scanner
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, scanner.render, scan_id, artefact, inventory)
+
+
 # ============================================================================
 # App
 # lifespan ensures the pre-warm thread starts inside the ASGI worker process,
@@ -106,9 +233,12 @@ async def _await_scanner_ready(timeout: int = 250):
 async def lifespan(app: FastAPI):
     from utils.supabase_client import log_persistence_mode
     log_persistence_mode()  # after logging is configured, so INFO is visible
-    t = threading.Thread(target=_prewarm, daemon=True, name="scanner-prewarm")
-    t.start()
+    if not _scanner_ready.is_set():  # set already when preloaded
+        t = threading.Thread(target=_prewarm, daemon=True, name="scanner-prewarm")
+        t.start()
     yield
+    if _scan_pool is not None:
+        _scan_pool.shutdown()
 
 
 from utils.limiter import limiter  # shared instance — routers throttle on the same one
@@ -160,18 +290,28 @@ async def health():
     return {"status": "ok"}
 
 
+@app.get("/api/metrics")
+async def stage_metrics():
+    """Per-stage scan latency (count, sum, p50/p95/p99) in Prometheus text
+    format. scan_total is the whole scan as the endpoint saw it, including
+    any hand-off to a worker process."""
+    return PlainTextResponse(metrics.REGISTRY.render_prometheus(),
+                             media_type="text/plain; version=0.0.4")
+
+
 @app.get("/api/ready")
 async def readiness():
     """
     Readiness probe for the frontend warm-up screen.
     Returns ready=true once both scanners have finished initialising.
     """
-    ready = _scanner_ready.is_set() and _miniature_scanner is not None
+    ready = _scanner_ready.is_set() and _scanners_available("miniature")
     from utils.supabase_client import supabase_enabled
     return {
         "ready": ready,
-        "miniature_scanner": _miniature_scanner is not None,
-        "inspiration_scanner": _inspiration_scanner is not None,
+        "miniature_scanner": _scanners_available("miniature"),
+        "inspiration_scanner": _scanners_available("inspiration"),
+        "backend": _SCAN_BACKEND,
         "message": "Scanners ready" if ready else "Warming up machine spirit, please wait...",
         "persistence": "supabase" if supabase_enabled() else "ephemeral_files",
     }
@@ -184,7 +324,7 @@ async def get_paints():
     global _paints_cache
     try:
         if _paints_cache is None:
-            from core.schemestealer_engine import resolve_paint_db_path
+            from core.paint_db import resolve_paint_db_path
             with open(resolve_paint_db_path(), 'r') as f:
                 _paints_cache = json.load(f)
         return {"paints": _paints_cache}
@@ -194,23 +334,76 @@ async def get_paints():
 
 
 _MAX_UPLOAD_BYTES = 10 * 1024 * 1024  # 10 MB
+# A multi-angle batch: at most this many photographs, each within the
+# single-upload limit, and this much in total.
+_MAX_BATCH_IMAGES = 6
+_MAX_BATCH_UPLOAD_BYTES = 30 * 1024 * 1024
 
 
-def _reject_oversize(request: Request) -> None:
+def _reject_oversize(request: Request, limit: int = _MAX_UPLOAD_BYTES) -> None:
     """Reject an over-limit upload from the Content-Length header BEFORE the body
     is buffered into memory — guards the single Render worker against OOM (H-2)."""
     cl = request.headers.get("content-length")
-    if cl is not None and cl.isdigit() and int(cl) > _MAX_UPLOAD_BYTES:
-        raise HTTPException(status_code=413, detail="Image exceeds 10 MB limit.")
+    if cl is not None and cl.isdigit() and int(cl) > limit:
+        raise HTTPException(status_code=413, detail=f"Image exceeds {limit // (1024 * 1024)} MB limit.")
 
 
-def _validate_upload(file: UploadFile, contents: bytes) -> None:
+def _validate_upload(file: UploadFile) -> None:
+    """Check the type and the size of the spooled body. Starlette has already
+    streamed the multipart body into a SpooledTemporaryFile (memory up to
+    1 MB, then disk), so the size is read from the file, not from a copy of
+    its contents."""
     if not (file.content_type or "").startswith("image/"):
         raise HTTPException(status_code=400, detail="Only image files are accepted.")
-    if len(contents) > _MAX_UPLOAD_BYTES:
+    file.file.seek(0, io.SEEK_END)
+    size = file.file.tell()
+    file.file.seek(0)
+    if size > _MAX_UPLOAD_BYTES:
         raise HTTPException(status_code=413, detail="Image exceeds 10 MB limit.")
 
 
+def _open_upload(file: UploadFile, require_alpha: bool = False) -> Image.Image:
+    """Decode an upload at (close to) scan resolution.
+
+    Image.open reads only the header, so the mode and dimensions are checked
+    before any pixel is decoded. JPEGs are then drafted: libjpeg's DCT
+    scaling decodes straight at the smallest 1/2, 1/4 or 1/8 scale that
+    still covers the scan frame, so a 12 MP phone JPEG never exists at full
+    size in memory. Formats without reduced-resolution decoding (PNG, WebP)
+    decode in full, which is why their pixel count is capped here first.
+    """
+    image = Image.open(file.file)
+    # The engine requires a client-removed background (alpha channel). A
+    # plain RGB image would crash downstream, so reject it cleanly (C-3).
+    if require_alpha and image.mode != 'RGBA':
+        raise HTTPException(
+            status_code=400,
+            detail="Miniature image must have its background removed (upload a transparent PNG).",
+        )
+    # A square box, so the draft scale does not depend on the EXIF rotation
+    # applied below. draft() is a no-op for non-JPEG formats.
+    image.draft('RGB' if image.mode in ('RGB', 'YCbCr') else None,
+                (_SCAN_MAX_SIDE, _SCAN_MAX_SIDE))
+    width, height = image.size  # what will actually be decoded
+    if width * height > Image.MAX_IMAGE_PIXELS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Image dimensions exceed {Image.MAX_IMAGE_PIXELS // 1_000_000} megapixels.",
+        )
+    # Phones write a landscape sensor array plus an EXIF rotation and
+    # leave the turn to the viewer. Apply it before anything measures
+    # the array: the analysis width is fixed, so a sideways frame
+    # changes the pixel budget and with it superpixel granularity
+    # (O-A2). in_place avoids copying the full frame in the common
+    # case where there is nothing to correct.
+    ImageOps.exif_transpose(image, in_place=True)
+    if not require_alpha and image.mode != 'RGB':
+        image = image.convert('RGB')
+    image.thumbnail((_SCAN_MAX_SIDE, _SCAN_MAX_SIDE))  # optimise memory/CPU early
+    image.load()  # a frame already inside the box is still lazy; detach it from the upload
+    return image
+
+
 @app.post("/api/scan/miniature")
 @limiter.limit("10/minute")
 async def scan_miniature(request: Request, file: UploadFile = File(...), inventory: str = Form(None)):
@@ -221,33 +414,16 @@ async def scan_miniature(request: Request, file: UploadFile = File(...), invento
     """
     await _await_scanner_ready()
 
-    if _miniature_scanner is None:
+    if not _scanners_available("miniature"):
         raise HTTPException(status_code=503, detail="Scanner failed to initialise. Please try again.")
 
     image = None
-    contents = None
     try:
         _reject_oversize(request)
-        contents = await file.read()
-        _validate_upload(file, contents)
+        _validate_upload(file)
 
         try:
-            image = Image.open(io.BytesIO(contents))
-            # Phones write a landscape sensor array plus an EXIF rotation and
-            # leave the turn to the viewer. Apply it before anything measures
-            # the array: the analysis width is fixed, so a sideways frame
-            # changes the pixel budget and with it superpixel granularity
-            # (O-A2). in_place avoids copying the full frame in the common
-            # case where there is nothing to correct.
-            ImageOps.exif_transpose(image, in_place=True)
-            # The engine requires a client-removed background (alpha channel). A
-            # plain RGB image would crash downstream, so reject it cleanly (C-3).
-            if image.mode != 'RGBA':
-                raise HTTPException(
-                    status_code=400,
-                    detail="Miniature image must have its background removed (upload a transparent PNG).",
-                )
-            image.thumbnail((1024, 1024))  # optimise memory/CPU early
+            image = _open_upload(file, require_alpha=True)
         except HTTPException:
             raise
         except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
@@ -257,12 +433,10 @@ async def scan_miniature(request: Request, file: UploadFile = File(...), invento
 
         logger.info(f"Processing miniature scan: {file.filename}, size: {image.size}, mode: {image.mode}")
 
-        loop = asyncio.get_running_loop()
-        
         inventory_set = set(json.loads(inventory)) if inventory else None
-        
-        async with _scan_semaphore:
-            result = await loop.run_in_executor(None, _miniature_scanner.scan, image, inventory_set)
+
+        async with _memory_governor.admit(scan_cost(*image.size)):
+            result = await _run_scan("miniature", image, inventory_set)
 
         logger.info(f"Miniature scan complete: {len(result['colors'])} colors detected")
         return JSONResponse(content=result)
@@ -273,10 +447,60 @@ async def scan_miniature(request: Request, file: UploadFile = File(...), invento
         logger.error(f"Miniature scan error: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail="Scan processing failed.")
     finally:
-        # Aggressive memory cleanup
-        image = None
-        contents = None
-        gc.collect()
+        image = None  # release the frame promptly
+
+
+@app.post("/api/scan/miniature/batch")
+@limiter.limit("10/minute")
+async def scan_miniature_batch(request: Request, files: List[UploadFile] = File(...),
+                               inventory: str = Form(None)):
+    """
+    Scan several photographs (angles) of ONE painted miniature together.
+    Each photograph is clustered on its own, in parallel across the scan
+    pool when it is configured; the clusters are merged across angles into
+    one palette whose recipes are built once. Returns the combined palette
+    (`colors`, `paints`) and, per photograph, its region masks keyed to
+    palette entries (`images[i].regions[j].colorIndex`).
+    """
+    await _await_scanner_ready()
+
+    if not _scanners_available("miniature"):
+        raise HTTPException(status_code=503, detail="Scanner failed to initialise. Please try again.")
+    if len(files) > _MAX_BATCH_IMAGES:
+        raise HTTPException(status_code=400, detail=f"At most {_MAX_BATCH_IMAGES} photos per batch.")
+
+    images = []
+    try:
+        _reject_oversize(request, _MAX_BATCH_UPLOAD_BYTES)
+        for file in files:
+            _validate_upload(file)
+            try:
+                images.append(_open_upload(file, require_alpha=True))
+            except HTTPException:
+                raise
+            except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+                logger.warning(f"Invalid image file uploaded: {file.filename}")
+                raise HTTPException(status_code=400, detail="Invalid image file format.")
+
+        logger.info(f"Processing miniature batch: {len(images)} photos")
+
+        inventory_set = set(json.loads(inventory)) if inventory else None
+
+        with metrics.stage("batch_total"):
+            views = await asyncio.gather(*(_run_view(image) for image in images))
+            images = None
+            result = await _run_combine(list(views), inventory_set)
+
+        logger.info(f"Miniature batch complete: {len(result['colors'])} colors detected")
+        return JSONResponse(content=result)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Miniature batch scan error: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Scan processing failed.")
+    finally:
+        images = None  # release the frames promptly
 
 
 @app.post("/api/scan/inspiration")
@@ -288,24 +512,18 @@ async def scan_inspiration(request: Request, file: UploadFile = File(...), inven
     """
     await _await_scanner_ready()
 
-    if _inspiration_scanner is None:
+    if not _scanners_available("inspiration"):
         raise HTTPException(status_code=503, detail="Scanner failed to initialise. Please try again.")
 
     image = None
-    contents = None
     try:
         _reject_oversize(request)
-        contents = await file.read()
-        _validate_upload(file, contents)
+        _validate_upload(file)
 
         try:
-            image = Image.open(io.BytesIO(contents))
-            # Apply the camera's EXIF rotation before the resize reads the
-            # shape (O-A2) -- see the miniature endpoint above.
-            ImageOps.exif_transpose(image, in_place=True)
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            image.thumbnail((1024, 1024))  # optimise memory/CPU early
+            image = _open_upload(file)
+        except HTTPException:
+            raise
         except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
             # Any PIL decode failure is a bad upload, not a server fault (H-4).
             logger.warning(f"Invalid image file uploaded: {file.filename}")
@@ -313,12 +531,10 @@ async def scan_inspiration(request: Request, file: UploadFile = File(...), inven
 
         logger.info(f"Processing inspiration scan: {file.filename}, size: {image.size}")
 
-        loop = asyncio.get_running_loop()
-        
         inventory_set = set(json.loads(inventory)) if inventory else None
-        
-        async with _scan_semaphore:
-            result = await loop.run_in_executor(None, _inspiration_scanner.scan, image, inventory_set)
+
+        async with _memory_governor.admit(scan_cost(*image.size)):
+            result = await _run_scan("inspiration", image, inventory_set)
 
         logger.info(f"Inspiration scan complete: {len(result['colors'])} colors detected")
         return JSONResponse(content=result)
@@ -329,10 +545,36 @@ async def scan_inspiration(request: Request, file: UploadFile = File(...), inven
         logger.error(f"Inspiration scan error: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail="Scan processing failed.")
     finally:
-        # Aggressive memory cleanup
-        image = None
-        contents = None
-        gc.collect()
+        image = None  # release the frame promptly
+
+
+class InventoryAnnotation(BaseModel):
+    scanId: str = Field(max_length=64)
+    inventory: List[str] = Field(default_factory=list, max_length=5000)
+
+
+@app.post("/api/scan/annotate")
+@limiter.limit("30/minute")
+async def annotate_scan(request: Request, body: InventoryAnnotation):
+    """
+    Re-annotate a recent scan's recipes for a changed inventory. Returns the
+    same payload as the original scan, with owned alternatives recomputed;
+    the image is not re-uploaded or re-analysed. 404 once the scan has aged
+    out of the artefact store — the client then re-scans.
+    """
+    stored = _scan_artefacts.get(body.scanId)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Scan not found or expired. Please scan the image again.")
+    kind, artefact = stored
+    if not _scanners_available(kind):
+        raise HTTPException(status_code=503, detail="Scanner failed to initialise. Please try again.")
+    try:
+        async with _memory_governor.admit(RENDER_BYTES):
+            result = await _run_render(kind, body.scanId, artefact, set(body.inventory) or None)
+        return JSONResponse(content=result)
+    except Exception as e:
+        logger.error(f"Scan annotation error: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Scan annotation failed.")
 
 
 class SimpleFeedback(BaseModel):
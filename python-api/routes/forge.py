@@ -3,10 +3,10 @@ from pydantic import BaseModel
 from typing import List, Dict, Any
 import numpy as np
 import json
-from skimage.color import deltaE_ciede2000
 
-from core.schemestealer_engine import resolve_paint_db_path
-from core.color_engine import _ciede2000_single
+from core.paint_db import resolve_paint_db_path
+from core.ciede2000 import ciede2000_matrix, ciede2000_one_to_many, precompute
+from core import delta_e_matrix
 
 router = APIRouter(prefix="/api/forge", tags=["Forge"])
 
@@ -14,12 +14,16 @@ class RackAnalysisRequest(BaseModel):
     inventory: List[str]
 
 _paints_cache = None
+_distances_cache = None
 
 def get_opaque_paints():
-    global _paints_cache
+    global _paints_cache, _distances_cache
     if _paints_cache is None:
         with open(resolve_paint_db_path(), 'r') as f:
             raw = json.load(f)
+        # Build-time ΔE matrix (memory-mapped, shared with the engine via the
+        # page cache); None falls back to the kernel below.
+        _distances_cache = delta_e_matrix.load(raw)
         # Filter for standard opaque paints (no washes/shades/technical)
         _paints_cache = [
             p for p in raw
@@ -54,11 +58,17 @@ async def rack_analysis(req: RackAnalysisRequest) -> Dict[str, Any]:
     owned_labs = np.array([p['lab'] for p in owned])
     unowned_labs = np.array([p['lab'] for p in unowned])
     
-    # Precompute distances from unowned to owned
-    min_dists = np.zeros(len(unowned))
-    for i, u_lab in enumerate(unowned_labs):
-        dists = deltaE_ciede2000(u_lab.reshape(1, 3), owned_labs)
-        min_dists[i] = np.min(dists)
+    # Distances from unowned to owned: rows of the build-time matrix when it
+    # covers every paint involved, else the kernel.
+    rows = None
+    if _distances_cache is not None:
+        rows = _distances_cache.rows(p.get('paint_id') for p in owned + unowned)
+    if rows is not None:
+        owned_rows, unowned_rows = rows[:len(owned)], rows[len(owned):]
+        min_dists = np.asarray(_distances_cache.matrix[np.ix_(unowned_rows, owned_rows)],
+                               dtype=float).min(axis=1)
+    else:
+        min_dists = ciede2000_matrix(unowned_labs, precompute(owned_labs)).min(axis=1)
         
     # Gamut coverage
     covered = np.sum(min_dists <= 4.0)
@@ -83,8 +93,12 @@ async def rack_analysis(req: RackAnalysisRequest) -> Dict[str, Any]:
             "gap_size": round(float(min_dists[farthest_idx]), 1)
         })
         
-        new_lab = unowned_labs[farthest_idx]
-        new_dists = deltaE_ciede2000(unowned_labs, new_lab.reshape(1, 3))
+        if rows is not None:
+            new_dists = np.asarray(_distances_cache.matrix[unowned_rows[farthest_idx], unowned_rows],
+                                   dtype=float)
+            unowned_rows = np.delete(unowned_rows, farthest_idx)
+        else:
+            new_dists = ciede2000_one_to_many(unowned_labs[farthest_idx], unowned_labs)
         min_dists = np.minimum(min_dists, new_dists)
         
         unowned.pop(farthest_idx)
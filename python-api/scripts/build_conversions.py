@@ -10,6 +10,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 from core.schemestealer_engine import resolve_paint_db_path
 from core.color_engine import PaintMatcher, Paint
+from core import delta_e_matrix
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("build_conversions")
@@ -102,7 +103,9 @@ def main():
         paint.slug = slugify(p['brand'], p['name'])
         paint_db.append(paint)
 
-    matcher = PaintMatcher(paint_db)
+    # match_top_n's near-duplicate check reads the build-time ΔE matrix when
+    # it matches this DB (scripts/build_delta_e_matrix.py).
+    matcher = PaintMatcher(paint_db, distances=delta_e_matrix.load(paint_data))
     supported_brands = sorted(list(set(p.brand for p in paint_db if p.matchable)))
     
     conversions = {
@@ -0,0 +1,42 @@
+"""
+Build the paint-to-paint CIEDE2000 matrix (core/delta_e_matrix.py).
+
+Writes data/paint_delta_e.npy (N × N, ordered by paint_id) and its sidecar
+data/paint_delta_e.json from the canonical paint DB. Run at deploy time
+(render.yaml's buildCommand) and after any change to paints_groundtruth.json;
+a stale matrix is detected by digest and ignored, never served.
+
+    python scripts/build_delta_e_matrix.py [--float16] [--out PATH]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.delta_e_matrix import DEFAULT_MATRIX_PATH, write  # noqa: E402
+from core.schemestealer_engine import resolve_paint_db_path  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--out', default=str(DEFAULT_MATRIX_PATH))
+    parser.add_argument('--float16', action='store_true',
+                        help='halve the file; ΔE resolution drops to ~0.002 near 2')
+    args = parser.parse_args()
+    out = os.path.abspath(args.out)
+
+    os.chdir(os.path.join(os.path.dirname(__file__), '..'))
+    with open(resolve_paint_db_path(), 'r', encoding='utf-8') as f:
+        paints = json.load(f)
+    path = write(paints, out, dtype=np.float16 if args.float16 else np.float32)
+    n = len(np.load(path, mmap_mode='r'))
+    print(f"Wrote {n}×{n} ΔE matrix to {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
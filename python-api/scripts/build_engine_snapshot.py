@@ -0,0 +1,44 @@
+"""
+Build the engine snapshot (core/engine_snapshot.py).
+
+Derives the engine's paint and recipe state from paints_groundtruth.json
+and recipes.json — exactly as SchemeStealerEngine's JSON path does — and
+writes it to data/engine_snapshot.npz. Run at deploy time (render.yaml's
+buildCommand) and after any change to the inputs; a stale snapshot is
+detected by digest and ignored, never served.
+
+    python scripts/build_engine_snapshot.py [--out PATH]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core import delta_e_matrix, engine_snapshot  # noqa: E402
+from core.recipe_graph import RecipeGraph  # noqa: E402
+from core.schemestealer_engine import load_paint_db, resolve_paint_db_path  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--out', default=str(engine_snapshot.DEFAULT_SNAPSHOT_PATH))
+    args = parser.parse_args()
+    out = os.path.abspath(args.out)
+
+    os.chdir(os.path.join(os.path.dirname(__file__), '..'))
+    db_path = resolve_paint_db_path()
+    with open(db_path, 'r') as f:
+        paint_data = json.load(f)
+    paints = load_paint_db(paint_data)
+    graph = RecipeGraph({p.paint_id: p for p in paints if p.paint_id})
+    path = engine_snapshot.write(paints, graph, delta_e_matrix.db_digest(paint_data),
+                                 engine_snapshot.inputs_digest(db_path), out)
+    print(f"Wrote engine snapshot ({len(paints)} paints, {graph.edge_count()} recipe edges) "
+          f"to {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,9 +2,11 @@ import json
 import os
 import sys
 
+import numpy as np
+
 # Ensure we can import from core
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from core.colour_maths import ciede2000_single
+from core import delta_e_matrix
 
 def build_schemes():
     groundtruth_path = os.path.join(os.path.dirname(__file__), '..', 'paints_groundtruth.json')
@@ -29,6 +31,10 @@ def build_schemes():
 
     paint_dict = {p['paint_id']: p for p in valid_paints}
 
+    # Paint-to-paint ΔE: the build-time matrix, or the same matrix computed
+    # here when it is missing or stale.
+    distances = delta_e_matrix.load(paints) or delta_e_matrix.build(paints)[0]
+
     schemes = [
         {"model": "Ultramarines Intercessor", "paints": ["citadel-macragge-blue", "citadel-calgar-blue", "citadel-abaddon-black"]},
         {"model": "Blood Angels Assault Intercessor", "paints": ["citadel-mephiston-red", "citadel-evil-sunz-scarlet", "citadel-abaddon-black"]},
@@ -66,6 +72,7 @@ def build_schemes():
     output_schemes = []
     
     non_citadel = [p for p in valid_paints if p['brand'] != 'Citadel']
+    alt_rows = distances.rows(p['paint_id'] for p in non_citadel)
 
     for i, scheme in enumerate(schemes):
         budget_palette = []
@@ -73,19 +80,9 @@ def build_schemes():
             if pid not in paint_dict:
                 raise ValueError(f"Missing paint ID in scheme {scheme['model']}: {pid}")
                 
-            orig = paint_dict[pid]
-            orig_lab = orig.get('lab') or orig.get('measured_lab')
-            
             # find closest non-Citadel paint
-            best_match = None
-            best_dist = float('inf')
-            
-            for alt in non_citadel:
-                alt_lab = alt.get('lab') or alt.get('measured_lab')
-                dist = ciede2000_single(orig_lab, alt_lab)
-                if dist < best_dist:
-                    best_dist = dist
-                    best_match = alt['paint_id']
+            dists = distances.matrix[distances.index[pid], alt_rows]
+            best_match = non_citadel[int(np.argmin(dists))]['paint_id']
                     
             budget_palette.append(best_match)
             
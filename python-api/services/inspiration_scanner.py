@@ -6,11 +6,14 @@ Extracts color palettes from any image WITHOUT background removal
 import numpy as np
 from PIL import Image
 import logging
-from typing import Dict, List, Any, Optional
+from dataclasses import replace
+from typing import Dict, List, Any, Optional, Tuple
 
-from core.schemestealer_engine import SchemeStealerEngine
+from core.schemestealer_engine import ScanArtefact, SchemeStealerEngine
 from core.colour_maths import ciede2000_single
 from services.recipe_builder import build_paint_recipe
+from services.result_cache import ScanResultCache, annotated_recipes, cached_artefact
+from utils.metrics import stage
 from config import Affiliate
 
 logger = logging.getLogger(__name__)
@@ -31,6 +34,7 @@ class InspirationScannerService:
         paint_db_path = resolve_paint_db_path(paint_db_path)
         self.engine = SchemeStealerEngine(paint_db_path=paint_db_path)
         self._load_wash_database(paint_db_path)
+        self.result_cache = ScanResultCache()
         logger.info("Inspiration Scanner Service ready")
 
     def _load_wash_database(self, paint_db_path: str):
@@ -66,35 +70,65 @@ class InspirationScannerService:
             - paints: List of recommended paint matches (legacy)
             - metadata: Scan information
         """
-        try:
-            # Convert PIL to numpy array (RGB)
-            img_rgb = np.array(image.convert('RGB'))
-
-            logger.info("Extracting color palette from inspiration image...")
-
-            # Call the engine's analyze_miniature method
-            # mode="inspiration" disables background removal
-            recipes, _, quality_report = self.engine.analyze_miniature(
-                img_np=img_rgb,
-                mode="inspiration",
-                remove_base=False,
-                use_awb=True,
-                detect_details=False,
-                brands=Affiliate.SUPPORTED_BRANDS,
-                inventory=inventory,
-            )
-
-            logger.info(f"Detected {len(recipes)} colors")
-
-            # Format results for API response
-            result = self._format_results(recipes, mode='inspiration')
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGB')
+        return self.scan_array(np.asarray(image), inventory)
 
-            return result
+    def scan_array(self, frame: np.ndarray, inventory: set = None) -> Dict[str, Any]:
+        """
+        Extract a palette from a decoded HxWx3 or HxWx4 frame. Any alpha
+        channel is ignored (sliced off as a view, not converted), and the
+        frame itself is never written to. Repeat scans of the same pixels
+        are served from the result cache.
+        """
+        return self.scan_array_with_artefact(frame, inventory)[0]
 
+    def scan_array_with_artefact(self, frame: np.ndarray,
+                                 inventory: set = None) -> Tuple[Dict[str, Any], ScanArtefact]:
+        """scan_array, also returning the inventory-free ScanArtefact so the
+        caller can keep it for later re-annotation (render)."""
+        try:
+            scan_id, artefact = cached_artefact(self.result_cache, 'inspiration',
+                                                frame, self._extract)
+            result = self.render(scan_id, artefact, inventory)
+            logger.info(f"Detected {len(result['colors'])} colors")
+            return result, artefact
         except Exception as e:
             logger.error(f"Inspiration scan failed: {str(e)}", exc_info=True)
             raise
 
+    def render(self, scan_id: str, artefact: ScanArtefact,
+               inventory: set = None) -> Dict[str, Any]:
+        """Phase two: annotate an artefact's recipes for `inventory` and
+        format the API response. `scanId` lets the client ask for this again
+        with a different inventory, without re-uploading the image."""
+        recipes = annotated_recipes(self.result_cache, self.engine, scan_id,
+                                    artefact, inventory)
+        with stage("format_results"):
+            result = self._format_results(recipes, mode='inspiration')
+        result['scanId'] = scan_id
+        return result
+
+    def _extract(self, frame: np.ndarray) -> ScanArtefact:
+        """Phase one: the engine's ScanArtefact in the form the result cache
+        keeps — inspiration results carry no masks, so the raw boolean masks
+        are dropped."""
+        img_rgb = frame[:, :, :3]
+
+        logger.info("Extracting color palette from inspiration image...")
+
+        # mode="inspiration" disables background removal
+        artefact = self.engine.extract(
+            img_rgb,
+            mode="inspiration",
+            remove_base=False,
+            use_awb=True,
+            detect_details=False,
+            brands=Affiliate.SUPPORTED_BRANDS,
+        )
+        return replace(artefact, recipes=tuple(dict(recipe, spatial_mask=None)
+                                               for recipe in artefact.recipes))
+
     def _format_results(self, recipes: List[Dict], mode: str) -> Dict[str, Any]:
         """
         Format scan results for API response with full recipe structure
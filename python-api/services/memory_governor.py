@@ -0,0 +1,232 @@
+"""
+Memory-budget admission for scans.
+
+Scans used to be admitted by a fixed count (MAX_CONCURRENT_SCANS, default 1)
+and every scan request ended in a full gc.collect(). Neither tracks what
+actually exhausts a 512 MB instance: a scan's working set scales with its
+frame — about 240 bytes per pixel at peak (SLIC, Lab and KMeans arrays;
+measured with tracemalloc across the Testimages set) — so an 800x400
+inspiration photo costs ~80 MB and a 1024x1024 miniature ~250 MB.
+
+The governor instead reserves each scan's estimated peak against a byte
+budget and admits scans while the reservations fit, so several small scans
+run side by side and a large one runs alone. Admission is first come, first
+served: once a scan is queued every later one queues behind it, so a stream
+of small scans cannot starve a large one (the fixed-count semaphore it
+replaced was FIFO too). A scan larger than the whole budget is admitted once
+nothing else is in flight, never refused. After each scan, the process's
+resident set is compared with a high-water mark, and only above it is a
+gc.collect() run — on an executor thread, after the response, never on the
+event loop.
+
+The budget is for the whole instance (instance_budget()): what is left of
+its memory (instance_memory_bytes(): the container's cgroup limit, else
+physical memory) once the fixed residents are paid for — each scanning process's
+warm engine and its two scanner result caches, the artefact store, and on
+the process backend the API process itself. On the process backend the
+reservations model the workers' memory (which this process cannot see); RSS
+and the collection are this process's own.
+"""
+
+import asyncio
+import gc
+import os
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Deque, Dict, Optional, Sequence, Tuple
+
+from services.result_cache import DEFAULT_MAX_BYTES as CACHE_BYTES
+from utils import metrics
+
+# Peak bytes one scan allocates per pixel of its (post-thumbnail) frame.
+SCAN_BYTES_PER_PIXEL = 240
+# Reservation for phase two of a stored scan (/api/scan/annotate): recipes
+# and the formatted response only, no frame.
+RENDER_BYTES = 4 * 1024 * 1024
+
+_MB = 1024 * 1024
+# Assumed instance size where neither a cgroup limit nor physical memory
+# can be read: the Render instance this service deploys to.
+INSTANCE_BYTES = 512 * _MB
+# cgroup v2, then v1. v2 writes "max" and v1 a near-2**63 value when the
+# container is unlimited; physical memory bounds both.
+_CGROUP_MEMORY_LIMITS = ("/sys/fs/cgroup/memory.max",
+                         "/sys/fs/cgroup/memory/memory.limit_in_bytes")
+# Resident set of one scanning process once both scanners are warm.
+ENGINE_BYTES = 150 * _MB
+# Resident set of the API process alone (process backend), measured.
+API_PROCESS_BYTES = 60 * _MB
+DEFAULT_HIGH_WATER_BYTES = 384 * _MB
+
+
+def physical_memory_bytes() -> int:
+    """Physical memory of the host, or 0 where it cannot be read."""
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def instance_memory_bytes(cgroup_paths: Sequence[str] = _CGROUP_MEMORY_LIMITS,
+                          physical: Callable[[], int] = physical_memory_bytes) -> int:
+    """Memory this instance may use: the smaller of the container's cgroup
+    limit and physical memory, falling back to INSTANCE_BYTES."""
+    limits = [physical()]
+    for path in cgroup_paths:
+        try:
+            with open(path) as f:
+                text = f.read().strip()
+        except OSError:
+            continue
+        if text.isdigit():
+            limits.append(int(text))
+        break
+    limits = [limit for limit in limits if limit > 0]
+    return min(limits) if limits else INSTANCE_BYTES
+
+
+def instance_budget(scan_processes: int = 1, separate_api_process: bool = False,
+                    instance_bytes: int = INSTANCE_BYTES,
+                    cache_bytes: int = CACHE_BYTES) -> int:
+    """Bytes one instance has for scan working sets.
+
+    Each scanning process holds a warm engine and two result caches (one per
+    scanner); the API process holds the artefact store, and on the process
+    backend is a process of its own. On a 512 MB instance with the default
+    32 MB caches: 266 MB on the thread backend, 206 MB with one worker
+    process, nothing with two — admission is then strictly one scan at a
+    time, which is all such an instance can afford.
+    """
+    fixed = scan_processes * (ENGINE_BYTES + 2 * cache_bytes) + cache_bytes
+    if separate_api_process:
+        fixed += API_PROCESS_BYTES
+    return max(int(instance_bytes) - fixed, 0)
+
+
+def workers_that_fit(instance_bytes: int, full_scan_bytes: int,
+                     cache_bytes: int = CACHE_BYTES) -> int:
+    """Most scan worker processes an instance can hold while the budget left
+    still admits one full-size scan; at least one. 1 on a 512 MB instance,
+    8 on 2 GB."""
+    workers = 1
+    while instance_budget(workers + 1, True, instance_bytes, cache_bytes) >= full_scan_bytes:
+        workers += 1
+    return workers
+
+
+# Thread backend on one 512 MB instance: one full-size scan, or several
+# smaller ones.
+DEFAULT_BUDGET_BYTES = instance_budget()
+
+
+def scan_cost(width: int, height: int) -> int:
+    """Estimated peak bytes of one scan of a width x height frame."""
+    return int(width) * int(height) * SCAN_BYTES_PER_PIXEL
+
+
+def rss_bytes() -> int:
+    """This process's resident set size, or 0 where it cannot be read."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class MemoryGovernor:
+    """FIFO byte-budget admission plus a high-water-mark collector."""
+
+    def __init__(self, budget_bytes: int = DEFAULT_BUDGET_BYTES,
+                 high_water_bytes: int = DEFAULT_HIGH_WATER_BYTES,
+                 rss: Callable[[], int] = rss_bytes,
+                 collect: Callable[[], int] = gc.collect):
+        self.budget_bytes = max(int(budget_bytes), 1)
+        self.high_water_bytes = int(high_water_bytes)
+        self._rss = rss
+        self._collect = collect
+        self._reserved = 0
+        self._in_flight = 0
+        # (cost, future) per queued scan, oldest first. A waiter's future is
+        # resolved once its reservation has been made for it.
+        self._waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+        self._collection: Optional[asyncio.Future] = None
+
+    def _fits(self, cost: int) -> bool:
+        return self._in_flight == 0 or self._reserved + cost <= self.budget_bytes
+
+    def _reserve(self, cost: int) -> None:
+        self._reserved += cost
+        self._in_flight += 1
+
+    def _release(self, cost: int) -> None:
+        self._reserved -= cost
+        self._in_flight -= 1
+        self._admit_waiters()
+
+    def _admit_waiters(self) -> None:
+        """Admit queued scans from the head while the head fits."""
+        while self._waiters:
+            cost, future = self._waiters[0]
+            if future.cancelled():
+                self._waiters.popleft()
+                continue
+            if not self._fits(cost):
+                return
+            self._waiters.popleft()
+            self._reserve(cost)
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def admit(self, cost: int) -> AsyncIterator[None]:
+        """Hold `cost` bytes of the budget for the enclosed block, waiting
+        behind every scan queued before it until they fit."""
+        if not self._waiters and self._fits(cost):
+            self._reserve(cost)
+        else:
+            metrics.count("memory_admission_waits")
+            waiter = (cost, asyncio.get_running_loop().create_future())
+            self._waiters.append(waiter)
+            try:
+                with metrics.stage("admission_wait"):
+                    await waiter[1]
+            except BaseException:
+                if waiter[1].done() and not waiter[1].cancelled():
+                    # Admitted, then cancelled before resuming.
+                    self._release(cost)
+                elif waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    self._admit_waiters()
+                raise
+        try:
+            yield
+        finally:
+            self._release(cost)
+            self._schedule_collection()
+
+    def _schedule_collection(self) -> None:
+        """maybe_collect() on the default executor, at most one at a time;
+        the releasing request does not wait for it."""
+        if self._collection is not None and not self._collection.done():
+            return
+        if self._rss() <= self.high_water_bytes:
+            return
+        self._collection = asyncio.get_running_loop().run_in_executor(
+            None, self.maybe_collect)
+
+    def maybe_collect(self) -> bool:
+        """Run a full collection if RSS is above the high-water mark."""
+        if self._rss() <= self.high_water_bytes:
+            return False
+        self._collect()
+        metrics.count("memory_gc_collections")
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "budget_bytes": self.budget_bytes,
+            "high_water_bytes": self.high_water_bytes,
+            "reserved_bytes": self._reserved,
+            "in_flight": self._in_flight,
+            "queued": len(self._waiters),
+            "rss_bytes": self._rss(),
+        }
@@ -5,14 +5,17 @@ Scans painted miniatures with background removal and color detection
 import numpy as np
 from PIL import Image
 import logging
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 import base64
 import io
 import cv2
 import math
-from core.schemestealer_engine import SchemeStealerEngine
+from dataclasses import replace
+from core.schemestealer_engine import ScanArtefact, SchemeStealerEngine
 from core.colour_maths import ciede2000_single
 from services.recipe_builder import build_paint_recipe
+from services.result_cache import ScanResultCache, annotated_recipes, cached_artefact
+from utils.metrics import stage
 from config import Affiliate, Display
 logger = logging.getLogger(__name__)
 
@@ -66,6 +69,7 @@ class MiniatureScannerService:
         paint_db_path = resolve_paint_db_path(paint_db_path)
         self.engine = SchemeStealerEngine(paint_db_path=paint_db_path)
         self._load_wash_database(paint_db_path)
+        self.result_cache = ScanResultCache()
         logger.info("Miniature Scanner Service ready")
     def _load_wash_database(self, paint_db_path: str):
         """Load wash paints from the database for wash matching"""
@@ -96,41 +100,146 @@ class MiniatureScannerService:
             - paints: List of recommended paint matches (legacy)
             - metadata: Scan information
         """
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGB')
+        return self.scan_array(np.asarray(image), inventory)
+
+    def scan_array(self, frame: np.ndarray, inventory: set = None) -> Dict[str, Any]:
+        """
+        Scan a decoded HxWx4 (client-removed background) or HxWx3 frame.
+        The frame is only read — the engine works on views of it, so a
+        read-only shared-memory frame can be passed straight in. Repeat
+        scans of the same pixels are served from the result cache.
+        """
+        return self.scan_array_with_artefact(frame, inventory)[0]
+
+    def scan_array_with_artefact(self, frame: np.ndarray,
+                                 inventory: set = None) -> Tuple[Dict[str, Any], ScanArtefact]:
+        """scan_array, also returning the inventory-free ScanArtefact so the
+        caller can keep it for later re-annotation (render)."""
         try:
-            if image.mode == 'RGBA':
-                # Client already removed background — pass RGBA array directly
-                img_rgba_np = np.array(image)
-                img_rgb = img_rgba_np[:, :, :3]
-                logger.info("Analyzing miniature (client-side background removal)...")
-                recipes, cropped_rgba, quality_report = self.engine.analyze_miniature(
-                    img_np=img_rgb,
-                    mode="mini",
-                    remove_base=True,
-                    use_awb=True,
-                    detect_details=True,
-                    brands=Affiliate.SUPPORTED_BRANDS,
-                    precomputed_rgba=img_rgba_np,
-                    inventory=inventory,
-                )
-            else:
-                img_rgb = np.array(image.convert('RGB'))
-                logger.info("Analyzing miniature with background removal...")
-                recipes, cropped_rgba, quality_report = self.engine.analyze_miniature(
-                    img_np=img_rgb,
-                    mode="mini",
-                    remove_base=True,
-                    use_awb=True,
-                    detect_details=True,
-                    brands=Affiliate.SUPPORTED_BRANDS,
-                    inventory=inventory,
-                )
-            logger.info(f"Detected {len(recipes)} color regions")
-            # Format results for API response
-            result = self._format_results(recipes, mode='miniature')
-            return result
+            scan_id, artefact = cached_artefact(self.result_cache, 'miniature',
+                                                frame, self._extract)
+            result = self.render(scan_id, artefact, inventory)
+            logger.info(f"Detected {len(result['colors'])} color regions")
+            return result, artefact
         except Exception as e:
             logger.error(f"Miniature scan failed: {str(e)}", exc_info=True)
             raise
+
+    def render(self, scan_id: str, artefact: ScanArtefact,
+               inventory: set = None) -> Dict[str, Any]:
+        """Phase two: annotate an artefact's recipes for `inventory` and
+        format the API response. `scanId` lets the client ask for this again
+        with a different inventory, without re-uploading the image."""
+        recipes = annotated_recipes(self.result_cache, self.engine, scan_id,
+                                    artefact, inventory)
+        with stage("format_results"):
+            result = self._format_results(recipes, mode='miniature')
+        result['scanId'] = scan_id
+        return result
+
+    def extract_view(self, frame: np.ndarray) -> Tuple[str, ScanArtefact]:
+        """Phase one for one photograph of a multi-angle batch: (scan id,
+        artefact of UNMATCHED cluster recipes). Matching waits for
+        combine_views, which runs it once on the merged palette."""
+        return cached_artefact(self.result_cache, 'miniature-view', frame,
+                               lambda f: self._extract(f, match=False))
+
+    def combine_views(self, views: List[Tuple[str, ScanArtefact]],
+                      inventory: set = None) -> Dict[str, Any]:
+        """Merge extract_view results into one palette, build its recipes
+        once, and format the batch response: the combined palette plus,
+        per photograph, its regions' masks keyed to palette entries."""
+        with stage("merge_views"):
+            palette, assignment = self.engine.merge_views([a.recipes for _, a in views])
+        with stage("build_recipes"):
+            self.engine.match_recipes(palette, Affiliate.SUPPORTED_BRANDS)
+        if inventory:
+            palette = self.engine.annotate_inventory(palette, inventory)
+        logger.info(f"Merged {sum(len(a.recipes) for _, a in views)} regions from "
+                    f"{len(views)} photographs into {len(palette)} colours")
+        with stage("format_results"):
+            return self._format_batch(palette, views, assignment)
+
+    def _format_batch(self, palette: List[Dict], views: List[Tuple[str, ScanArtefact]],
+                      assignment: List[List[int]]) -> Dict[str, Any]:
+        entries = [dict(self._color_entry(recipe), index=k) for k, recipe in enumerate(palette)]
+        colors = _protect_vivid_details(entries, limit=5)
+        shown = {c.pop('index'): i for i, c in enumerate(colors)}
+        paints = self._legacy_paints(palette)[:12]
+        images = []
+        for (scan_id, artefact), indices in zip(views, assignment):
+            regions = []
+            for recipe, k in zip(artefact.recipes, indices):
+                if k not in shown:
+                    continue
+                regions.append({
+                    'colorIndex': shown[k],
+                    'percentage': float(recipe.get('dominance', 0)),
+                    'mask': recipe.get('mask_png'),
+                    'position': self._position(recipe),
+                })
+            images.append({
+                'scanId': scan_id,
+                'regions': regions,
+                'mask_frame': self._mask_frame(artefact.recipes[0]) if artefact.recipes else None,
+            })
+        return {
+            'mode': 'miniature_batch',
+            'colors': colors,
+            'paints': paints,
+            'images': images,
+            'metadata': {
+                'color_count': len(colors),
+                'paint_count': len(paints),
+                'image_count': len(images),
+                'background_removed': True,
+            }
+        }
+
+    def _extract(self, frame: np.ndarray, match: bool = True) -> ScanArtefact:
+        """Phase one: the engine's ScanArtefact, with each region's mask
+        already PNG-encoded (mask_png) and the raw boolean mask dropped —
+        the form the result cache keeps."""
+        if frame.shape[-1] == 4:
+            # Client already removed background — pass RGBA array directly
+            img_rgb = frame[:, :, :3]
+            logger.info("Analyzing miniature (client-side background removal)...")
+            artefact = self.engine.extract(
+                img_rgb,
+                mode="mini",
+                remove_base=True,
+                use_awb=True,
+                detect_details=True,
+                brands=Affiliate.SUPPORTED_BRANDS,
+                precomputed_rgba=frame,
+                match=match,
+            )
+        else:
+            logger.info("Analyzing miniature with background removal...")
+            artefact = self.engine.extract(
+                frame,
+                mode="mini",
+                remove_base=True,
+                use_awb=True,
+                detect_details=True,
+                brands=Affiliate.SUPPORTED_BRANDS,
+                match=match,
+            )
+        with stage("encode_masks"):
+            recipes = tuple(
+                dict(recipe, spatial_mask=None,
+                     mask_png=self._encode_mask(recipe.get('spatial_mask'), self._recipe_hex(recipe)))
+                for recipe in artefact.recipes
+            )
+        return replace(artefact, recipes=recipes)
+
+    @staticmethod
+    def _recipe_hex(recipe: Dict) -> str:
+        rgb = recipe.get('rgb', recipe.get('rgb_preview', [0, 0, 0]))
+        return '#{:02x}{:02x}{:02x}'.format(int(rgb[0]), int(rgb[1]), int(rgb[2]))
+
     def _format_results(self, recipes: List[Dict], mode: str) -> Dict[str, Any]:
         """
         Format scan results for API response with full recipe structure.
@@ -138,51 +247,73 @@ class MiniatureScannerService:
         a full JPEG composite — the frontend composites client-side.
         """
         colors = []
-        paints = []  # Legacy format
-        seen_paints = set()
+        for recipe in recipes:
+            color = self._color_entry(recipe)
+            # Encode spatial mask as a lightweight alpha PNG (replaces JPEG
+            # composite) — already done by _extract for scanned recipes.
+            color['mask'] = recipe.get('mask_png') or self._encode_mask(recipe.get('spatial_mask'), color['hex'])
+            # Normalised (0-1) centre of this colour's region, so the frontend
+            # can draw a numbered chip at the real location on the image.
+            color['position'] = self._position(recipe)
+            colors.append(color)
+        paints = self._legacy_paints(recipes)
+        # Limit results (vivid painted details may not be displaced by
+        # dull dark minor cards — see _protect_vivid_details)
+        colors = _protect_vivid_details(colors, limit=5)
+        paints = paints[:12]
         # All recipes share the same analysis resolution and crop geometry
-        analysis_shape = None
-        crop_rect = None
-        frame_shape = None
+        mask_frame = self._mask_frame(recipes[0]) if recipes else None
+        return {
+            'mode': mode,
+            'colors': colors,
+            'paints': paints,
+            'mask_frame': mask_frame,
+            'metadata': {
+                'color_count': len(colors),
+                'paint_count': len(paints),
+                'background_removed': True,
+            }
+        }
+
+    def _color_entry(self, recipe: Dict) -> Dict[str, Any]:
+        """A recipe's colour card, without its mask and position."""
+        rgb = recipe.get('rgb', recipe.get('rgb_preview', [0, 0, 0]))
+        if isinstance(rgb, np.ndarray):
+            rgb = rgb.tolist()
+        lab = recipe.get('lab', [0, 0, 0])
+        if isinstance(lab, np.ndarray):
+            lab = lab.tolist()
+        # Create hex from RGB
+        hex_color = '#{:02x}{:02x}{:02x}'.format(
+            int(rgb[0]), int(rgb[1]), int(rgb[2])
+        )
+        family = recipe.get('family', 'Unknown')
+        return {
+            'rgb': [int(rgb[0]), int(rgb[1]), int(rgb[2])],
+            'lab': [float(lab[0]), float(lab[1]), float(lab[2])],
+            'hex': hex_color,
+            'percentage': float(recipe.get('dominance', 0)),
+            'family': family,
+            # Build structured paint recipe for each brand
+            'paintRecipe': self._build_paint_recipe(recipe, family, lab),
+        }
+
+    @staticmethod
+    def _position(recipe: Dict) -> Dict[str, float]:
+        return {
+            'x': float(recipe.get('reticle_x', recipe.get('position_x', 0.5))),
+            'y': float(recipe.get('reticle_y', recipe.get('position_y', 0.5))),
+        }
+
+    def _legacy_paints(self, recipes: List[Dict]) -> List[Dict]:
+        """Legacy: paint recommendations from the base matches, one per
+        brand and name."""
+        paints = []
+        seen_paints = set()
         for recipe in recipes:
-            # Extract color info
-            rgb = recipe.get('rgb', recipe.get('rgb_preview', [0, 0, 0]))
-            if isinstance(rgb, np.ndarray):
-                rgb = rgb.tolist()
             lab = recipe.get('lab', [0, 0, 0])
             if isinstance(lab, np.ndarray):
                 lab = lab.tolist()
-            # Create hex from RGB
-            hex_color = '#{:02x}{:02x}{:02x}'.format(
-                int(rgb[0]), int(rgb[1]), int(rgb[2])
-            )
-            family = recipe.get('family', 'Unknown')
-            # Encode spatial mask as a lightweight alpha PNG (replaces JPEG composite)
-            mask_base64 = self._encode_mask(recipe.get('spatial_mask'), hex_color)
-            # Capture spatial geometry from the first recipe (shared by all)
-            if analysis_shape is None:
-                analysis_shape = recipe.get('analysis_shape')
-                crop_rect = recipe.get('crop_rect')
-                frame_shape = recipe.get('frame_shape')
-            # Build structured paint recipe for each brand
-            paint_recipe = self._build_paint_recipe(recipe, family, lab)
-            # Add color with mask data and paintRecipe
-            colors.append({
-                'rgb': [int(rgb[0]), int(rgb[1]), int(rgb[2])],
-                'lab': [float(lab[0]), float(lab[1]), float(lab[2])],
-                'hex': hex_color,
-                'percentage': float(recipe.get('dominance', 0)),
-                'family': family,
-                'mask': mask_base64,
-                # Normalised (0-1) centre of this colour's region, so the frontend
-                # can draw a numbered chip at the real location on the image.
-                'position': {
-                    'x': float(recipe.get('reticle_x', recipe.get('position_x', 0.5))),
-                    'y': float(recipe.get('reticle_y', recipe.get('position_y', 0.5))),
-                },
-                'paintRecipe': paint_recipe,
-            })
-            # Legacy: Extract paint recommendations from base matches
             base_matches = recipe.get('base', {})
             for brand, match_data in base_matches.items():
                 if match_data:
@@ -202,41 +333,35 @@ class MiniatureScannerService:
                             'rgb': paint_rgb,
                             'lab': paint_lab,
                         })
-        # Limit results (vivid painted details may not be displaced by
-        # dull dark minor cards — see _protect_vivid_details)
-        colors = _protect_vivid_details(colors, limit=5)
-        paints = paints[:12]
-        # Build mask_frame: full spatial geometry so the frontend can place
-        # the analysis-resolution masks onto the user's uploaded image —
-        # masks live in the alpha-bbox CROP, so the crop rect and the full
-        # frame dims are required (the crop offset was previously dropped,
-        # stretching masks across the whole frame).
-        mask_frame = None
-        if analysis_shape:
-            mask_frame = {
-                'height': int(analysis_shape[0]),
-                'width': int(analysis_shape[1]),
-            }
-            if crop_rect and frame_shape:
-                mask_frame.update({
-                    'cropX': int(crop_rect[0]),
-                    'cropY': int(crop_rect[1]),
-                    'cropW': int(crop_rect[2]),
-                    'cropH': int(crop_rect[3]),
-                    'frameW': int(frame_shape[1]),
-                    'frameH': int(frame_shape[0]),
-                })
-        return {
-            'mode': mode,
-            'colors': colors,
-            'paints': paints,
-            'mask_frame': mask_frame,
-            'metadata': {
-                'color_count': len(colors),
-                'paint_count': len(paints),
-                'background_removed': True,
-            }
+        return paints
+
+    @staticmethod
+    def _mask_frame(recipe: Dict) -> Optional[Dict[str, int]]:
+        """Full spatial geometry so the frontend can place the
+        analysis-resolution masks onto the user's uploaded image — masks
+        live in the alpha-bbox CROP, so the crop rect and the full frame
+        dims are required (the crop offset was previously dropped,
+        stretching masks across the whole frame)."""
+        analysis_shape = recipe.get('analysis_shape')
+        crop_rect = recipe.get('crop_rect')
+        frame_shape = recipe.get('frame_shape')
+        if not analysis_shape:
+            return None
+        mask_frame = {
+            'height': int(analysis_shape[0]),
+            'width': int(analysis_shape[1]),
         }
+        if crop_rect and frame_shape:
+            mask_frame.update({
+                'cropX': int(crop_rect[0]),
+                'cropY': int(crop_rect[1]),
+                'cropW': int(crop_rect[2]),
+                'cropH': int(crop_rect[3]),
+                'frameW': int(frame_shape[1]),
+                'frameH': int(frame_shape[0]),
+            })
+        return mask_frame
+
     def _build_paint_recipe(self, recipe: Dict, family: str, color_lab: List[float]) -> Dict:
         """Build the structured per-brand recipe via the shared builder (graph-driven
         base/shade/highlight + graph-or-WashMapping wash)."""
@@ -0,0 +1,46 @@
+"""
+Preload mode: build the warm scanners once in the gunicorn master.
+
+By default every gunicorn worker builds its own scanners in main.py's
+pre-warm thread (threads do not survive fork, so the thread must start in
+the worker): with N workers the paint DB, matcher arrays, anchor stacks and
+recipe graph are built N times and held N times. With PRELOAD_SCANNERS=1
+and `gunicorn --preload`, main.py builds them at import — in the master,
+before it forks — and every worker inherits them copy-on-write and is warm
+the moment it starts.
+
+Sharing only lasts while nothing writes the shared pages. The engine's
+arrays are read-only buffers (PaintMatcher, the anchor stacks), the ΔE
+matrix is a read-only memory map, and gc.freeze() moves every object built
+so far out of the collector's reach, so a worker's collections never touch
+(and so never copy) the inherited heap. Reference counting still dirties
+the pages of the objects a worker actually uses; the bulk stays shared.
+
+Only the thread scan backend preloads: SCAN_BACKEND=process workers are
+spawned, not forked, and build their own scanners (services/scan_pool.py).
+"""
+
+import gc
+import logging
+import os
+import time
+from typing import Any, Callable, Dict
+
+from services.scan_pool import build_scanners
+
+logger = logging.getLogger(__name__)
+
+
+def preload_enabled() -> bool:
+    return os.environ.get("PRELOAD_SCANNERS", "").strip().lower() in ("1", "true", "yes")
+
+
+def preload_scanners(factory: Callable[[], Dict[str, Any]] = build_scanners) -> Dict[str, Any]:
+    """Build the scanners, then freeze the heap for copy-on-write sharing."""
+    start = time.perf_counter()
+    scanners = factory()
+    gc.collect()
+    gc.freeze()
+    logger.info(f"Preloaded scanners in {time.perf_counter() - start:.1f}s "
+                f"({gc.get_freeze_count()} objects frozen for fork)")
+    return scanners
@@ -70,6 +70,17 @@ def format_paint_match(match: Optional[Dict], color_lab: List[float] = None,
         except Exception:
             result['deltaE'] = 0
 
+    # The closest paint the user owns, when they don't own this one. Its
+    # deltaE is the engine's substitution distance to THIS paint, not to the
+    # card colour, so it is copied rather than recomputed — and, like every
+    # wash distance, dropped on the wash slot (DEC-8).
+    alt = match.get('owned_alternative')
+    if alt:
+        alt_result = format_paint_match(alt, is_wash=is_wash)
+        if alt.get('deltaE') is not None and not is_wash:
+            alt_result['deltaE'] = alt['deltaE']
+        result['owned_alternative'] = alt_result
+
     return result
 
 
@@ -0,0 +1,167 @@
+"""
+Content-addressed scan result cache.
+
+Users re-upload the same photo — a retry after a timeout, or the same scan
+with their paint rack toggled — and every upload used to pay for the full
+SLIC + KMeans + six-brand matching pipeline. The scanners now key their
+inventory-INDEPENDENT scan artefacts (engine.extract) on a hash of the
+decoded, post-thumbnail pixels and keep them here. The inventory-DEPENDENT owned-alternative annotations
+are cached separately under (pixel key, inventory digest). A retry is then a
+lookup, and an inventory change costs one annotation pass.
+
+Bounded by an approximate byte budget (least recently used entries are
+evicted first) and a per-entry TTL. Hit, miss, eviction and expiry counts are
+kept on the cache (stats()) and reported as scan_cache_* events on
+/api/metrics. Each scanner owns its cache, so on the process backend each
+worker process has its own.
+"""
+
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from utils import metrics
+
+# Defaults sized for a 512 MB instance: a cached miniature scan (recipes with
+# PNG masks, raw masks dropped) is a few tens of KB.
+DEFAULT_MAX_BYTES = int(os.environ.get("SCAN_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+DEFAULT_TTL_SECONDS = float(os.environ.get("SCAN_CACHE_TTL_SECONDS", 15 * 60))
+
+
+def frame_key(frame: np.ndarray, kind: str) -> str:
+    """Digest of a decoded frame's pixels, shape, dtype and scan kind."""
+    h = hashlib.blake2b(digest_size=20)
+    h.update(f"{kind}|{frame.shape}|{frame.dtype.str}|".encode())
+    h.update(memoryview(np.ascontiguousarray(frame)).cast('B'))
+    return h.hexdigest()
+
+
+def inventory_digest(inventory: Optional[Iterable[str]]) -> str:
+    """Order-independent digest of an inventory (a set of paint ids)."""
+    h = hashlib.blake2b(digest_size=16)
+    for paint_id in sorted(inventory or ()):
+        h.update(paint_id.encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _approx_size(value: Any) -> int:
+    """Bytes an entry is charged against the budget. Pickled length tracks
+    array payloads and string-heavy recipe dicts closely enough for a cap."""
+    return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+class ScanResultCache:
+    """Thread-safe LRU with a byte budget and TTL.
+
+    Values must be treated as immutable by callers: get() returns the stored
+    object itself, not a copy.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES,
+                 ttl_seconds: float = DEFAULT_TTL_SECONDS, clock=time.monotonic):
+        self.max_bytes = int(max_bytes)
+        self.ttl_seconds = float(ttl_seconds)
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (value, size, expires)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 and self.ttl_seconds > 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._clock() >= entry[2]:
+                self._drop(key, entry[1])
+                self.expirations += 1
+                metrics.count("scan_cache_expired")
+                entry = None
+            if entry is None:
+                self.misses += 1
+                metrics.count("scan_cache_miss")
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        metrics.count("scan_cache_hit")
+        return entry[0]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if not self.enabled:
+            return
+        size = _approx_size(value)
+        if size > self.max_bytes:
+            return  # would evict everything else and still not fit
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size, self._clock() + self.ttl_seconds)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                old_key, (_, old_size, _) = next(iter(self._entries.items()))
+                self._drop(old_key, old_size)
+                self.evictions += 1
+                metrics.count("scan_cache_evicted")
+
+    def _drop(self, key: Hashable, size: int) -> None:
+        del self._entries[key]
+        self._bytes -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+def cached_artefact(cache: ScanResultCache, kind: str, frame: np.ndarray,
+                    extract: Callable[[np.ndarray], Any]) -> Tuple[str, Any]:
+    """(scan id, artefact) for `frame`: the artefact comes from the cache or
+    from `extract(frame)`. The scan id is the frame key, so it is stable
+    across re-uploads of the same pixels."""
+    scan_id = frame_key(frame, kind)
+    artefact = cache.get(scan_id) if cache.enabled else None
+    if artefact is None:
+        artefact = extract(frame)
+        cache.put(scan_id, artefact)
+    return scan_id, artefact
+
+
+def annotated_recipes(cache: ScanResultCache, engine, scan_id: str, artefact,
+                      inventory: Optional[set]) -> List[dict]:
+    """The artefact's recipes annotated for `inventory`, with the annotations
+    from the cache or from one engine.ownership_annotations pass. Cached
+    values are never mutated — apply_ownership returns copies."""
+    recipes = artefact.recipes
+    if not inventory:
+        return list(recipes)
+    ann_key = (scan_id, inventory_digest(inventory))
+    annotations = cache.get(ann_key) if cache.enabled else None
+    if annotations is None:
+        annotations = engine.ownership_annotations(recipes, inventory)
+        cache.put(ann_key, annotations)
+    return engine.apply_ownership(recipes, annotations)
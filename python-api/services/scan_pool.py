@@ -0,0 +1,235 @@
+"""
+Process-pool scan backend.
+
+The thread backend runs every scan on the event loop's default executor, so one
+gunicorn worker serialises all KMeans/SLIC/CIEDE2000 work behind a single GIL.
+This pool pre-forks N worker processes; each builds its own warm scanners ONCE
+(in the pool initializer) and then serves scans for the lifetime of the pool,
+so N concurrent scans run on N cores.
+
+Frames travel through shared memory (utils/shared_frame.py): the API process
+writes the decoded pixels once, the worker scans a read-only view of the same
+pages, and only a small FrameRef is pickled.
+
+Selected with SCAN_BACKEND=process (see main.py). A worker that dies — the
+kernel OOM killer is the realistic cause on a 512 MB instance — breaks the
+executor; the pool rebuilds itself on the next submit rather than failing every
+later scan.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils import metrics
+from utils.metrics import Sample, collect_stages
+from utils.shared_frame import FrameRef, FrameSource, SharedFrame, share_frame
+
+logger = logging.getLogger(__name__)
+
+SCAN_KINDS = ('miniature', 'inspiration')
+
+# Per-process scanner registry, filled by the pool initializer. Only ever
+# populated inside a worker process.
+_worker_scanners: Dict[str, Any] = {}
+
+
+def build_scanners() -> Dict[str, Any]:
+    """The production scanner factory: one warm service per scan kind."""
+    from services.miniature_scanner import MiniatureScannerService
+    from services.inspiration_scanner import InspirationScannerService
+    return {
+        'miniature': MiniatureScannerService(),
+        'inspiration': InspirationScannerService(),
+    }
+
+
+def _init_worker(factory: Callable[[], Dict[str, Any]]) -> None:
+    """Pool initializer — runs once per worker, before it accepts any task."""
+    _worker_scanners.update(factory())
+    logger.info(f"Scan worker {os.getpid()} ready")
+
+
+def _ping(delay: float) -> int:
+    """Warm-up probe. The short sleep keeps one already-warm worker from
+    draining every probe while its siblings are still initialising."""
+    time.sleep(delay)
+    return os.getpid()
+
+
+def _run_scan(kind: str, ref: FrameRef,
+              inventory: Optional[set]) -> Tuple[Tuple[Dict[str, Any], Any], List[Sample]]:
+    """Worker-side scan: attach to the shared frame and hand a read-only view
+    of it to this process's warm scanner. Returns (result, artefact) together
+    with the scan's stage timings, which only the API process can publish."""
+    shared = SharedFrame.attach(ref)
+    try:
+        with collect_stages() as timings:
+            outcome = _worker_scanners[kind].scan_array_with_artefact(shared.view(), inventory)
+        return outcome, timings
+    finally:
+        shared.close()
+
+
+def _run_extract_view(kind: str, ref: FrameRef) -> Tuple[Tuple[str, Any], List[Sample]]:
+    """Worker-side phase one for one photograph of a multi-angle batch."""
+    shared = SharedFrame.attach(ref)
+    try:
+        with collect_stages() as timings:
+            outcome = _worker_scanners[kind].extract_view(shared.view())
+        return outcome, timings
+    finally:
+        shared.close()
+
+
+def _run_combine(kind: str, views: List[Tuple[str, Any]],
+                 inventory: Optional[set]) -> Tuple[Dict[str, Any], List[Sample]]:
+    """Worker-side merge and recipe build for a multi-angle batch."""
+    with collect_stages() as timings:
+        result = _worker_scanners[kind].combine_views(views, inventory)
+    return result, timings
+
+
+def _run_render(kind: str, scan_id: str, artefact: Any,
+                inventory: Optional[set]) -> Tuple[Dict[str, Any], List[Sample]]:
+    """Worker-side phase two: re-annotate a stored artefact for an inventory."""
+    with collect_stages() as timings:
+        result = _worker_scanners[kind].render(scan_id, artefact, inventory)
+    return result, timings
+
+
+def _unwrap(inner: Future, outer: Future) -> None:
+    """Settle the caller's future from a worker's (value, timings) pair,
+    merging the timings into this process's metrics registry."""
+    if inner.cancelled():
+        outer.cancel()
+        return
+    exc = inner.exception()
+    if exc is not None:
+        outer.set_exception(exc)
+        return
+    value, timings = inner.result()
+    metrics.REGISTRY.merge(timings)
+    outer.set_result(value)
+
+
+class ScanPool:
+    """A fixed-size pool of worker processes, each owning warm scanners."""
+
+    def __init__(self, workers: int, start_method: str = 'spawn',
+                 factory: Callable[[], Dict[str, Any]] = build_scanners):
+        self.workers = max(int(workers), 1)
+        # spawn, not fork: the API process is multi-threaded (uvicorn, the
+        # prewarm thread) and forking it can copy a held lock into the child.
+        self._context = multiprocessing.get_context(start_method)
+        self._factory = factory
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.ready = False
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers,
+                                   mp_context=self._context,
+                                   initializer=_init_worker,
+                                   initargs=(self._factory,))
+
+    def start(self, timeout: float = 250.0) -> None:
+        """Create the executor and block until every worker has initialised.
+
+        ProcessPoolExecutor spawns workers on demand, so probes are submitted
+        until each worker has answered at least once."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._new_executor()
+            executor = self._executor
+        deadline = time.monotonic() + timeout
+        seen = set()
+        while len(seen) < self.workers and time.monotonic() < deadline:
+            probes = [executor.submit(_ping, 0.05) for _ in range(self.workers)]
+            seen.update(p.result(timeout=max(deadline - time.monotonic(), 0.1))
+                        for p in probes)
+        self.ready = True
+        logger.info(f"Scan pool ready: {len(seen)}/{self.workers} warm worker processes")
+
+    def submit(self, kind: str, frame: FrameSource,
+               inventory: Optional[set] = None) -> Future:
+        """Queue one scan of a PIL image or ndarray frame; returns a
+        concurrent.futures.Future of (result dict, ScanArtefact).
+
+        The frame is copied into shared memory here, so the caller may drop
+        its own copy as soon as this returns. The block is unlinked when the
+        future settles, whatever the outcome."""
+        return self._submit_frame(_run_scan, kind, frame, inventory)
+
+    def submit_view(self, kind: str, frame: FrameSource) -> Future:
+        """Queue phase one for one photograph of a multi-angle batch; returns
+        a Future of (scan id, ScanArtefact of unmatched clusters). The
+        photographs of one batch spread across the workers."""
+        return self._submit_frame(_run_extract_view, kind, frame)
+
+    def submit_combine(self, kind: str, views: List[Tuple[str, Any]],
+                       inventory: Optional[set] = None) -> Future:
+        """Queue the merge of submit_view results; returns a Future of the
+        batch result dict."""
+        return self._submit_plain(_run_combine, kind, views, inventory)
+
+    def submit_render(self, kind: str, scan_id: str, artefact: Any,
+                      inventory: Optional[set] = None) -> Future:
+        """Queue phase two for a stored artefact; returns a Future of the
+        result dict. Any worker can serve it — the artefact travels with
+        the task (it is a few tens of KB)."""
+        return self._submit_plain(_run_render, kind, scan_id, artefact, inventory)
+
+    def _submit_frame(self, fn: Callable, kind: str, frame: FrameSource, *args) -> Future:
+        if kind not in SCAN_KINDS:
+            raise ValueError(f"Unknown scan kind: {kind!r}")
+        shared = share_frame(frame)
+        try:
+            inner = self._submit(fn, kind, shared.ref, *args)
+        except BaseException:
+            shared.release()
+            raise
+        outer: Future = Future()
+        outer.set_running_or_notify_cancel()
+
+        def _settle(f: Future) -> None:
+            shared.release()
+            _unwrap(f, outer)
+
+        inner.add_done_callback(_settle)
+        return outer
+
+    def _submit_plain(self, fn: Callable, kind: str, *args) -> Future:
+        if kind not in SCAN_KINDS:
+            raise ValueError(f"Unknown scan kind: {kind!r}")
+        inner = self._submit(fn, kind, *args)
+        outer: Future = Future()
+        outer.set_running_or_notify_cancel()
+        inner.add_done_callback(lambda f: _unwrap(f, outer))
+        return outer
+
+    def _submit(self, fn: Callable, *args) -> Future:
+        with self._lock:
+            if self._executor is None:
+                raise RuntimeError("Scan pool has not been started")
+            try:
+                return self._executor.submit(fn, *args)
+            except BrokenProcessPool:
+                # A worker died (most likely OOM-killed). Replace the whole
+                # executor — a broken one refuses every later submit.
+                logger.error("Scan pool broken — restarting worker processes")
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._new_executor()
+                return self._executor.submit(fn, *args)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            self.ready = False
@@ -56,3 +56,21 @@ if 'cv2' not in sys.modules and not os.environ.get('USE_REAL_CV2'):
     cv2_mock.drawContours = lambda image, contours, contourIdx, color, thickness=1, lineType=8, hierarchy=None, maxLevel=None, offset=None: image
     
     sys.modules['cv2'] = cv2_mock
+
+
+import pytest
+
+
+@pytest.fixture
+def ml_data_dir(tmp_path, monkeypatch):
+    """Point the ML logging endpoints' local file store at tmp_path, so
+    tests that post to /api/ml never write into data/ml/."""
+    from routes import ml_data
+
+    base = tmp_path / "ml"
+    monkeypatch.setattr(ml_data, "DATA_BASE_DIR", base)
+    monkeypatch.setattr(ml_data, "SCANS_DIR", base / "scans")
+    monkeypatch.setattr(ml_data, "COLOURS_CSV", base / "colours" / "colours_training.csv")
+    monkeypatch.setattr(ml_data, "FEEDBACK_DIR", base / "feedback")
+    monkeypatch.setattr(ml_data, "BEHAVIOUR_DIR", base / "behaviour")
+    return base
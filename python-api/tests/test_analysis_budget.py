@@ -0,0 +1,80 @@
+"""
+Analysis resolution (schemestealer_engine.analysis_size).
+
+Fixed mode keeps the historical RESIZE_WIDTH-wide working image; budget
+mode sizes the crop so its foreground, not its width, is held constant —
+whatever the miniature's aspect ratio — and never upscales. The engine test
+needs the real pipeline and is gated on USE_REAL_CV2; latency and pixel
+spread on the real photographs: benchmarks/analysis_budget.py.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import ColorDetection  # noqa: E402
+from core.schemestealer_engine import analysis_size  # noqa: E402
+
+
+def test_fixed_mode_keeps_resize_width():
+    assert analysis_size(600, 900, 300_000, budget=0) == (
+        ColorDetection.RESIZE_WIDTH, int(ColorDetection.RESIZE_WIDTH * 1.5))
+
+
+def test_budget_mode_ignores_aspect_ratio():
+    """A tall thin crop and a squat one with the same foreground area get
+    the same working foreground; at a fixed width they differ ninefold."""
+    tall = analysis_size(200, 1800, 360_000, budget=40_000)
+    squat = analysis_size(600, 600, 360_000, budget=40_000)
+    for w, h in (tall, squat):
+        assert w * h == pytest.approx(40_000, rel=0.02)
+    fixed_tall = analysis_size(200, 1800, 360_000, budget=0)
+    fixed_squat = analysis_size(600, 600, 360_000, budget=0)
+    assert fixed_tall[0] * fixed_tall[1] == 9 * fixed_squat[0] * fixed_squat[1]
+
+
+def test_budget_scales_by_foreground_not_crop():
+    """Half the crop transparent: the foreground, not the box, meets the budget."""
+    w, h = analysis_size(800, 800, 320_000, budget=40_000)
+    assert (w * h) * (320_000 / 640_000) == pytest.approx(40_000, rel=0.02)
+
+
+def test_budget_never_upscales():
+    assert analysis_size(120, 90, 10_800, budget=40_000) == (120, 90)
+    assert analysis_size(3, 1, 1, budget=1) == (3, 1)
+
+
+@pytest.mark.skipif(not os.environ.get("USE_REAL_CV2"),
+                    reason="full engine pipeline needs real OpenCV")
+@pytest.mark.parametrize("fig_w, fig_h", [(140, 520), (520, 200)])
+def test_engine_analyses_about_the_budget(monkeypatch, fig_w, fig_h):
+    from core.schemestealer_engine import SchemeStealerEngine
+
+    rng = np.random.default_rng(3)
+    rgba = np.zeros((fig_h + 40, fig_w + 40, 4), dtype=np.uint8)
+    figure = np.clip(np.array([60, 120, 170]) + rng.normal(0, 12, (fig_h, fig_w, 3)),
+                     0, 255).astype(np.uint8)
+    figure[::14] = (230, 200, 90)
+    rgba[20:20 + fig_h, 20:20 + fig_w, :3] = figure
+    rgba[20:20 + fig_h, 20:20 + fig_w, 3] = 255
+
+    engine = SchemeStealerEngine()
+    masked = []
+    extract = engine.smart_extractor.extract_colors
+
+    def counting(img, mask, **kwargs):
+        masked.append(int(mask.sum()))
+        return extract(img, mask, **kwargs)
+
+    monkeypatch.setattr(engine.smart_extractor, "extract_colors", counting)
+    monkeypatch.setattr(ColorDetection, "ANALYSIS_PIXEL_BUDGET", 20_000)
+    recipes, _, _ = engine.analyze_miniature(
+        rgba[:, :, :3].copy(), mode="mini", remove_base=False,
+        use_awb=False, precomputed_rgba=rgba)
+    assert recipes
+    assert masked[-1] == pytest.approx(20_000, rel=0.1)
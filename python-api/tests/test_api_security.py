@@ -3,9 +3,9 @@ Security / penetration fuzzing of the FastAPI upload surface.
 
 Simulates the chaotic and malicious uploads the prompt calls out — oversized
 payloads, corrupted bytes, corrupted EXIF, and a 0-byte file — and pins that the
-backend answers with the correct 4xx (never a 500/crash) and always runs its
-aggressive memory cleanup (`gc.collect()` in the `finally`) so a hostile client
-cannot exhaust the single Render worker's RAM.
+backend answers with the correct 4xx (never a 500/crash) and that the memory
+governor always returns a scan's reservation and collects above its high-water
+mark, so a hostile client cannot exhaust the single Render worker's RAM.
 
 Design notes (why it's structured this way):
   * We mock the scanner (`_miniature_scanner`) and pre-set `_scanner_ready` so the
@@ -17,13 +17,14 @@ Design notes (why it's structured this way):
     in one dedicated test, so slowapi's in-process counter cannot leak between tests.
 
 Audit cross-refs (documented, not asserted here):
-  * H2 — `await file.read()` buffers the whole body before the 10 MB check, so the
-    413 below still fires but the body is already resident (an OOM vector).
+  * H2 — the body is spooled (to disk past 1 MB) and sized from the spool, never
+    copied into a bytes object; a declared Content-Length is refused up front.
   * H1 — the 10/min limit keys on a spoofable X-Forwarded-For.
 """
 
 import io
 import sys
+import time
 from pathlib import Path
 from unittest.mock import Mock
 
@@ -35,7 +36,8 @@ sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 import main  # noqa: E402
 
-_CANNED_RESULT = {"mode": "miniature", "colors": [], "paints": [], "metadata": {}}
+_CANNED_RESULT = {"mode": "miniature", "colors": [], "paints": [], "metadata": {},
+                  "scanId": "canned"}
 
 
 @pytest.fixture
@@ -48,7 +50,7 @@ def client(monkeypatch):
     original_enabled = main.limiter.enabled
     main._scanner_ready.set()
     fake = Mock()
-    fake.scan.return_value = _CANNED_RESULT
+    fake.scan_array_with_artefact.return_value = (_CANNED_RESULT, None)
     monkeypatch.setattr(main, "_miniature_scanner", fake)
     monkeypatch.setattr(main, "_inspiration_scanner", fake)
     main.limiter.enabled = False
@@ -102,7 +104,7 @@ def test_oversize_50mb_payload_is_rejected_413(client):
     big = b"\x00" * (50 * 1024 * 1024)
     r = _post(c, big, "huge.png", "image/png")
     assert r.status_code == 413
-    fake.scan.assert_not_called()  # rejected before it ever reaches the scanner
+    fake.scan_array_with_artefact.assert_not_called()  # rejected before it ever reaches the scanner
 
 
 def test_unsigned_garbage_with_image_mime_rejected_400(client):
@@ -147,7 +149,30 @@ def test_valid_transparent_rgba_png_is_accepted_200(client):
     r = _post(c, _transparent_rgba_png(), "mini.png", "image/png")
     assert r.status_code == 200
     assert r.json()["colors"] == []
-    fake.scan.assert_called_once()
+    fake.scan_array_with_artefact.assert_called_once()
+
+
+def test_oversize_dimensions_are_rejected_413_before_decode(client):
+    """A 30 MP PNG compresses to a few KB but decodes to 90 MB. PNG has no
+    reduced-resolution decode, so its header dimensions are refused."""
+    c, fake = client
+    buf = io.BytesIO()
+    Image.new("1", (6000, 5000)).save(buf, "PNG")
+    r = _post(c, buf.getvalue(), "bomb.png", "image/png", endpoint="/api/scan/inspiration")
+    assert r.status_code == 413
+    fake.scan_array_with_artefact.assert_not_called()
+
+
+def test_large_jpeg_is_decoded_at_reduced_scale(client):
+    """The same 30 MP as a JPEG is drafted — decoded at 1/4 scale by libjpeg —
+    so it is accepted and reaches the scanner at scan resolution."""
+    c, fake = client
+    buf = io.BytesIO()
+    Image.new("RGB", (6000, 5000), (120, 40, 40)).save(buf, "JPEG")
+    r = _post(c, buf.getvalue(), "phone.jpg", "image/jpeg", endpoint="/api/scan/inspiration")
+    assert r.status_code == 200
+    frame = fake.scan_array_with_artefact.call_args[0][0]
+    assert frame.shape == (853, 1024, 3)
 
 
 def test_inspiration_endpoint_also_rejects_non_image(client):
@@ -157,27 +182,49 @@ def test_inspiration_endpoint_also_rejects_non_image(client):
 
 
 # ===========================================================================
-# Memory-safety contract — gc.collect() always runs (OOM prevention)
+# Memory-safety contract — the governor (OOM prevention)
 # ===========================================================================
 
-def test_gc_collect_runs_after_successful_scan(client, monkeypatch):
-    c, _ = client
+def _governor(monkeypatch, rss):
     spy = Mock()
-    monkeypatch.setattr(main.gc, "collect", spy)
+    governor = main.MemoryGovernor(budget_bytes=1 << 30, high_water_bytes=100,
+                                   rss=lambda: rss, collect=spy)
+    monkeypatch.setattr(main, "_memory_governor", governor)
+    return governor, spy
+
+
+def test_gc_collect_runs_when_rss_crosses_the_high_water_mark(client, monkeypatch):
+    c, _ = client
+    _, spy = _governor(monkeypatch, rss=101)
     r = _post(c, _transparent_rgba_png(), "mini.png", "image/png")
     assert r.status_code == 200
-    assert spy.called, "gc.collect() not invoked after a successful scan"
+    # Collected on an executor thread after the response, not before it.
+    for _ in range(200):
+        if spy.called:
+            break
+        time.sleep(0.01)
+    assert spy.called, "gc.collect() not invoked above the high-water mark"
 
 
-def test_gc_collect_runs_after_failed_scan(client, monkeypatch):
-    """Even when the upload is rejected, the `finally` cleanup must still fire —
-    a hostile client spamming bad uploads must not leak memory."""
+def test_gc_collect_is_skipped_below_the_high_water_mark(client, monkeypatch):
+    """A full-heap collection per request was hot-path cost for nothing."""
     c, _ = client
-    spy = Mock()
-    monkeypatch.setattr(main.gc, "collect", spy)
-    r = _post(c, b"not an image", "evil.png", "image/png")
-    assert r.status_code == 400
-    assert spy.called, "gc.collect() not invoked after a rejected scan"
+    _, spy = _governor(monkeypatch, rss=99)
+    r = _post(c, _transparent_rgba_png(), "mini.png", "image/png")
+    assert r.status_code == 200
+    assert not spy.called
+
+
+def test_failed_scan_returns_its_memory_reservation(client, monkeypatch):
+    """A scan that raises must not leak budget — a hostile client spamming
+    uploads that crash the engine must not wedge admission shut."""
+    c, fake = client
+    governor, _ = _governor(monkeypatch, rss=0)
+    fake.scan_array_with_artefact.side_effect = RuntimeError("engine fault")
+    r = _post(c, _transparent_rgba_png(), "mini.png", "image/png")
+    assert r.status_code == 500
+    assert governor.stats()["reserved_bytes"] == 0
+    assert governor.stats()["in_flight"] == 0
 
 
 # ===========================================================================
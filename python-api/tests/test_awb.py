@@ -24,7 +24,9 @@ sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 from skimage import color as skcolor  # noqa: E402
 
 from core.colour_maths import ciede2000_single  # noqa: E402
-from utils.helpers import apply_white_balance, _srgb_to_linear, _linear_to_srgb  # noqa: E402
+from utils.helpers import (  # noqa: E402
+    apply_white_balance, apply_white_balance_crop, _srgb_to_linear, _linear_to_srgb,
+)
 
 
 def _lab_of_patch(img_u8, sl_rows, sl_cols):
@@ -133,3 +135,33 @@ def test_neutral_grey_under_cast_is_pulled_toward_neutral():
     assert patch_chroma(out) < patch_chroma(cast) * 0.6, (
         f"cast chroma {patch_chroma(cast):.1f} only reduced to "
         f"{patch_chroma(out):.1f}")
+
+
+def _cutout(opaque_rows, opaque_cols):
+    """The warm-cast scene on a busy 200x200 background, alpha-opaque only
+    over the given window — a client-removed-background upload."""
+    frame = np.zeros((200, 200, 3), dtype=np.uint8)
+    frame[:] = (200, 40, 180)
+    frame[50:130, 30:150] = _warm_cast(_scene())
+    alpha = np.zeros((200, 200), dtype=np.uint8)
+    alpha[opaque_rows, opaque_cols] = 255
+    return frame, alpha
+
+
+def test_crop_balance_matches_full_frame_balance_then_crop():
+    """Balancing only the alpha bounding box must be bit-identical to the
+    old balance-the-frame-then-crop order: the estimate only ever sees
+    opaque pixels, and the correction is per-pixel."""
+    frame, alpha = _cutout(slice(50, 130), slice(30, 150))
+    rect = (30, 50, 120, 80)
+    expected = apply_white_balance(frame, alpha_mask=alpha)[50:130, 30:150]
+    np.testing.assert_array_equal(apply_white_balance_crop(frame, alpha, rect), expected)
+
+
+def test_crop_balance_with_too_few_opaque_pixels_uses_the_whole_frame():
+    """Under the opaque-pixel floor the estimate falls back to every pixel
+    of the frame, so the crop path must too."""
+    frame, alpha = _cutout(slice(60, 65), slice(40, 45))   # 25 opaque pixels
+    rect = (40, 60, 5, 5)
+    expected = apply_white_balance(frame, alpha_mask=alpha)[60:65, 40:45]
+    np.testing.assert_array_equal(apply_white_balance_crop(frame, alpha, rect), expected)
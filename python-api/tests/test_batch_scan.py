@@ -0,0 +1,135 @@
+"""
+Multi-angle miniature batches (/api/scan/miniature/batch).
+
+Each photograph is clustered on its own (extract_view: no paint matching),
+the clusters are merged across angles (engine.merge_views) and the merged
+palette is matched once. These tests pin the merge rule — same surface
+re-lit from another angle joins, a different colour does not — that the
+palette's recipes are the single-scan recipes for the merged colours, and
+the response shape the frontend composites per photograph.
+"""
+
+import io
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.engine_load import get_engine  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return get_engine()
+
+
+def _cluster(lab, dominance, family, **extra):
+    recipe = {'lab': list(lab), 'dominance': dominance, 'heuristic_family': family,
+              'family': family, 'brightness_std': 10.0, 'is_metallic': False,
+              'is_detail': False}
+    recipe.update(extra)
+    return recipe
+
+
+def test_relit_surface_merges_across_views_and_other_colours_do_not(engine):
+    red, relit_red = (40.0, 55.0, 35.0), (47.0, 54.0, 34.0)
+    blue = (35.0, 10.0, -45.0)
+    views = [
+        (_cluster(red, 60.0, 'Red'), _cluster(blue, 40.0, 'Blue')),
+        (_cluster(relit_red, 90.0, 'Red'),),
+    ]
+    palette, assignment = engine.merge_views(views)
+
+    assert [p['heuristic_family'] for p in palette] == ['Red', 'Blue']
+    assert assignment == [[0, 1], [0]]
+    # Coverage is the mean over every view; a colour one angle misses
+    # counts for less.
+    assert palette[0]['dominance'] == pytest.approx(75.0)
+    assert palette[1]['dominance'] == pytest.approx(20.0)
+    # The merged colour is the coverage-weighted LAB blend.
+    assert palette[0]['lab'] == pytest.approx(
+        list(np.average([red, relit_red], axis=0, weights=[60, 90])))
+
+
+def test_a_single_view_merges_to_itself(engine):
+    views = [(_cluster((40.0, 55.0, 35.0), 100.0, 'Red'),)]
+    palette, assignment = engine.merge_views(views)
+    assert assignment == [[0]]
+    assert palette[0]['lab'] == pytest.approx([40.0, 55.0, 35.0])
+
+
+def test_merged_palette_is_matched_like_a_single_scan(engine):
+    """match_recipes on a merged colour gives the recipe a one-photo scan of
+    that colour would get — the batch adds no second matching rule."""
+    rng = np.random.default_rng(7)
+    scene = np.zeros((300, 300, 3), np.uint8)
+    scene[:, :150] = (150, 20, 25)
+    scene[:, 150:] = (20, 60, 130)
+    scene = np.clip(scene.astype(int) + rng.integers(-6, 7, scene.shape), 0, 255).astype(np.uint8)
+    recipes, _, _ = engine.analyze_miniature(scene, mode="inspiration")
+    unmatched = engine.extract(scene, mode="inspiration", match=False).recipes
+    assert 'base' not in unmatched[0]
+    assert len(recipes) >= 2
+
+    palette, _ = engine.merge_views([unmatched, unmatched])
+    engine.match_recipes(palette)
+    assert len(palette) == len(recipes)
+    for merged, single in zip(palette, recipes):
+        assert merged['lab'] == pytest.approx(single['lab'])
+        assert {b: (m or {}).get('name') for b, m in merged['base'].items()} == \
+            {b: (m or {}).get('name') for b, m in single['base'].items()}
+
+
+def _angle(shift: int) -> bytes:
+    img = np.zeros((300, 300, 4), np.uint8)
+    img[60:240, 80:220, :3] = np.clip(np.array([150, 20, 25]) + shift, 0, 255)
+    img[60:110, 80:220, :3] = np.clip(np.array([20, 60, 130]) + shift, 0, 255)
+    img[60:240, 80:220, 3] = 255
+    buf = io.BytesIO()
+    Image.fromarray(img, "RGBA").save(buf, "PNG")
+    return buf.getvalue()
+
+
+def test_batch_endpoint_returns_one_palette_and_masks_per_photo():
+    from fastapi.testclient import TestClient
+    import main
+
+    main._prewarm()
+    main._scanner_ready.wait(timeout=60)
+    client = TestClient(main.app)
+    response = client.post(
+        "/api/scan/miniature/batch",
+        files=[("files", (f"angle{i}.png", _angle(shift), "image/png"))
+               for i, shift in enumerate((0, 12))])
+    assert response.status_code == 200, response.text
+    data = response.json()
+
+    assert data["mode"] == "miniature_batch"
+    assert data["colors"] and all("paintRecipe" in c for c in data["colors"])
+    assert len(data["images"]) == 2
+    for image in data["images"]:
+        assert image["scanId"] and image["mask_frame"]
+        assert image["regions"]
+        for region in image["regions"]:
+            assert 0 <= region["colorIndex"] < len(data["colors"])
+            assert region["mask"]
+    # The same two surfaces, re-lit: both photographs map onto shared cards.
+    shared = set.intersection(*({r["colorIndex"] for r in image["regions"]}
+                                for image in data["images"]))
+    assert shared
+
+
+def test_batch_endpoint_rejects_too_many_photos():
+    from fastapi.testclient import TestClient
+    import main
+
+    client = TestClient(main.app)
+    response = client.post(
+        "/api/scan/miniature/batch",
+        files=[("files", (f"a{i}.png", b"x", "image/png"))
+               for i in range(main._MAX_BATCH_IMAGES + 1)])
+    assert response.status_code == 400
@@ -0,0 +1,116 @@
+"""
+The core.ciede2000 kernel against skimage's deltaE_ciede2000.
+
+The kernel replaced skimage on every hot path (matcher, family classifier,
+shadow/uniqueness checks, forge), so it must BE skimage's formula: every
+entry point is held to 1e-9 of skimage on the cross-stack parity fixtures,
+on random LAB pairs across the whole gamut, and on the achromatic and
+hue-wrap cases where the formula branches. float32 is held to a ΔE
+tolerance far below anything the app displays or gates on.
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+from skimage.color import deltaE_ciede2000
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.ciede2000 import (  # noqa: E402
+    ciede2000, ciede2000_matrix, ciede2000_one_to_many, ciede2000_scalar, precompute,
+)
+
+_PARITY = (Path(__file__).resolve().parent.parent.parent / "schemestealer-react"
+           / "tests" / "fixtures" / "parity.json")
+
+
+def _random_labs(n, seed):
+    rng = np.random.default_rng(seed)
+    labs = np.column_stack([rng.uniform(0, 100, n), rng.uniform(-128, 128, n),
+                            rng.uniform(-128, 128, n)])
+    labs[: n // 10, 1:] = 0.0                      # achromatic: C' = 0
+    return labs
+
+
+def _skimage(lab1, lab2):
+    return deltaE_ciede2000(np.asarray(lab1, float), np.asarray(lab2, float))
+
+
+def test_parity_fixture_pairs():
+    if not _PARITY.exists():
+        pytest.skip("parity fixtures not present")
+    deltas = json.loads(_PARITY.read_text(encoding="utf-8"))["deltas"]
+    lab1 = np.array([d["lab1"] for d in deltas], float)
+    lab2 = np.array([d["lab2"] for d in deltas], float)
+    want = _skimage(lab1, lab2)
+    np.testing.assert_allclose(ciede2000(lab1, lab2), want, rtol=0, atol=1e-9)
+    for a, b, w, d in zip(lab1, lab2, want, deltas):
+        assert ciede2000_scalar(a, b) == pytest.approx(w, abs=1e-9)
+        assert d["de"] == pytest.approx(w, abs=1e-9)
+
+
+def test_row_wise_and_scalar_match_skimage_across_the_gamut():
+    lab1, lab2 = _random_labs(5000, 1), _random_labs(5000, 2)
+    lab2[2000:3000] = lab1[2000:3000] + np.random.default_rng(3).normal(0, 0.5, (1000, 3))
+    want = _skimage(lab1, lab2)
+    np.testing.assert_allclose(ciede2000(lab1, lab2), want, rtol=0, atol=1e-9)
+    got = np.array([ciede2000_scalar(a, b) for a, b in zip(lab1[:1500], lab2[:1500])])
+    np.testing.assert_allclose(got, want[:1500], rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize("pair", [
+    ((50.0, 0.0, 0.0), (50.0, 0.0, 0.0)),          # identical neutrals
+    ((50.0, 0.0, 0.0), (60.0, 20.0, -3.0)),        # one achromatic side
+    ((50.0, 30.0, -1.0), (50.0, 30.0, 1.0)),       # hues either side of 0/2π
+    ((50.0, -30.0, -1.0), (50.0, -30.0, 1.0)),     # hues either side of π
+    ((50.0, 2.5, 0.0), (73.0, 25.0, -18.0)),       # Sharma pair 7
+])
+def test_branch_cases(pair):
+    a, b = pair
+    want = float(_skimage(a, b))
+    assert ciede2000_scalar(a, b) == pytest.approx(want, abs=1e-9)
+    assert float(ciede2000(a, b)) == pytest.approx(want, abs=1e-9)
+
+
+def test_one_to_many_and_matrix_with_and_without_prepared_terms():
+    targets, candidates = _random_labs(40, 4), _random_labs(300, 5)
+    want = _skimage(targets[:, None, :], candidates[None, :, :])
+    terms = precompute(candidates)
+    for cands in (candidates, terms):
+        np.testing.assert_allclose(ciede2000_matrix(targets, cands), want, rtol=0, atol=1e-9)
+        np.testing.assert_allclose(ciede2000_one_to_many(targets[7], cands), want[7],
+                                   rtol=0, atol=1e-9)
+    subset = np.array([3, 50, 299])
+    np.testing.assert_allclose(ciede2000_one_to_many(targets[0], terms.take(subset)),
+                               want[0, subset], rtol=0, atol=1e-9)
+
+
+def test_matrix_blocks_cover_every_row(monkeypatch):
+    from core import ciede2000 as kernel
+    monkeypatch.setattr(kernel, "_MATRIX_BLOCK_ELEMENTS", 7)
+    targets, candidates = _random_labs(13, 6), _random_labs(5, 7)
+    np.testing.assert_allclose(ciede2000_matrix(targets, candidates),
+                               _skimage(targets[:, None, :], candidates[None, :, :]),
+                               rtol=0, atol=1e-9)
+
+
+def test_float32_variant_stays_float32_and_close():
+    lab1, lab2 = _random_labs(2000, 8), _random_labs(2000, 9)
+    got = ciede2000(lab1, lab2, dtype=np.float32)
+    assert got.dtype == np.float32
+    np.testing.assert_allclose(got, _skimage(lab1, lab2), rtol=0, atol=1e-3)
+    terms = precompute(lab2, dtype=np.float32)
+    assert ciede2000_one_to_many(lab1[0], terms, dtype=np.float32).dtype == np.float32
+
+
+def test_prepared_terms_are_one_contiguous_block():
+    labs = _random_labs(50, 10)
+    terms = precompute(labs)
+    assert terms.block.shape == (4, 50) and terms.block.flags.c_contiguous
+    np.testing.assert_array_equal(terms.C, np.hypot(labs[:, 1], labs[:, 2]))
+    picked = terms.take([4, 1])
+    assert len(picked) == 2
+    np.testing.assert_array_equal(picked.L, labs[[4, 1], 0])
@@ -0,0 +1,80 @@
+"""
+ClusterGraph (core/cluster_graph.py): the scan's pairwise cluster distances.
+
+The graph must answer exactly what the extractor's steps used to compute
+for themselves — the ramp metric over OKLab medians and CIEDE2000 between
+medians — for any subset of its clusters, including clusters added after a
+merge, and one scan must build it once.
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core import smart_color_system  # noqa: E402
+from core.ciede2000 import ciede2000_scalar  # noqa: E402
+from core.cluster_graph import ClusterGraph  # noqa: E402
+from core.colour_maths import lab_to_oklab  # noqa: E402
+from core.smart_color_system import SmartColorExtractor  # noqa: E402
+
+
+def _clusters(n, seed=0):
+    rng = np.random.default_rng(seed)
+    labs = rng.uniform([5, -60, -60], [95, 60, 60], (n, 3))
+    return [{'median_lab': lab} for lab in labs]
+
+
+def test_graph_matches_direct_computation():
+    extractor = SmartColorExtractor()
+    clusters = _clusters(12)
+    graph = ClusterGraph(clusters, extractor._ramp_distance)
+    subset = clusters[7:2:-2]
+    oks = lab_to_oklab(np.array([c['median_lab'] for c in subset]))
+    np.testing.assert_allclose(graph.ramp_matrix(subset),
+                               extractor._ramp_distance(oks, oks), atol=1e-12)
+    expected = [ciede2000_scalar(clusters[0]['median_lab'], c['median_lab']) for c in subset]
+    np.testing.assert_array_equal(graph.delta_e(clusters[0], subset), expected)
+
+
+def test_merged_clusters_join_incrementally():
+    extractor = SmartColorExtractor()
+    clusters = _clusters(8)
+    graph = ClusterGraph(clusters, extractor._ramp_distance)
+    before = graph.ramp_matrix(clusters)
+    # A merge result with the same median as an existing cluster is still
+    # its own node: nodes are keyed by identity, not value.
+    merged = [{'median_lab': clusters[0]['median_lab'].copy()},
+              {'median_lab': np.array([50.0, 10.0, -20.0])}]
+    everything = clusters + merged
+    ramp = graph.ramp_matrix(everything)
+    assert len(graph) == 10
+    np.testing.assert_array_equal(ramp[:8, :8], before)
+    np.testing.assert_allclose(ramp, ramp.T)
+    np.testing.assert_allclose(ramp[8], ramp[0], atol=1e-12)
+    oks = lab_to_oklab(np.array([c['median_lab'] for c in everything]))
+    np.testing.assert_allclose(ramp, extractor._ramp_distance(oks, oks), atol=1e-12)
+    assert graph.delta_e(merged[1], clusters[:3])[2] == ciede2000_scalar(
+        merged[1]['median_lab'], clusters[2]['median_lab'])
+
+
+def test_one_graph_per_scan(monkeypatch):
+    built = []
+
+    class CountingGraph(ClusterGraph):
+        def __init__(self, *args, **kwargs):
+            built.append(self)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(smart_color_system, "ClusterGraph", CountingGraph)
+    rng = np.random.default_rng(2)
+    img = np.zeros((120, 120, 3), dtype=float)
+    img[:, :40] = (150, 40, 50)
+    img[:, 40:80] = (60, 90, 160)
+    img[:, 80:] = (30, 30, 35)
+    img[::6] = (230, 190, 30)
+    img = np.clip(img + rng.normal(0.0, 6.0, img.shape), 0, 255).astype(np.uint8)
+    assert SmartColorExtractor().extract_colors(img, np.ones((120, 120), dtype=bool))
+    assert len(built) == 1
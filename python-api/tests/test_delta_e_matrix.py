@@ -0,0 +1,101 @@
+"""
+The build-time paint-to-paint ΔE matrix (core/delta_e_matrix.py).
+
+The matrix is a cache of the kernel, so it may only ever change speed: its
+entries are the kernel's to float32 rounding in the kernel's orientation, it
+is memory-mapped rather than read, a DB edit since the build makes it stale
+(load returns None, never wrong numbers), and the consumers — match_top_n's
+near-duplicate check and the forge — return exactly what the kernel path
+returns.
+"""
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core import delta_e_matrix  # noqa: E402
+from core.ciede2000 import ciede2000_scalar  # noqa: E402
+from core.color_engine import Paint, PaintMatcher  # noqa: E402
+
+_DB = Path(__file__).resolve().parent.parent / "paints_groundtruth.json"
+
+
+def _records(n, seed=0):
+    rng = np.random.default_rng(seed)
+    labs = np.column_stack([rng.uniform(5, 95, n), rng.uniform(-60, 60, n),
+                            rng.uniform(-60, 60, n)])
+    # Ids deliberately out of order: the matrix is ordered by paint_id.
+    return [{'paint_id': f"brand-{k:03d}" if k % 2 else f"another-{k:03d}",
+             'brand': 'Brand' if k % 3 else 'Other', 'lab': labs[k].tolist()}
+            for k in range(n)]
+
+
+def test_written_matrix_is_memory_mapped_and_matches_the_kernel(tmp_path):
+    records = _records(40)
+    path = delta_e_matrix.write(records, tmp_path / "de.npy")
+    distances = delta_e_matrix.load(records, path)
+    assert distances is not None
+    assert isinstance(distances.matrix, np.memmap) and distances.matrix.dtype == np.float32
+    assert distances.ids == sorted(r['paint_id'] for r in records)
+    for a, b in [(records[0], records[1]), (records[7], records[30]), (records[5], records[5])]:
+        want = ciede2000_scalar(a['lab'], b['lab'])
+        assert distances.distance(a['paint_id'], b['paint_id']) == pytest.approx(want, abs=1e-4)
+    assert distances.rows(['brand-001', 'nope']) is None
+
+
+def test_stale_or_missing_matrix_is_not_used(tmp_path):
+    records = _records(10)
+    path = delta_e_matrix.write(records, tmp_path / "de.npy")
+    edited = json.loads(json.dumps(records))
+    edited[3]['lab'][0] += 0.01
+    assert delta_e_matrix.load(edited, path) is None
+    assert delta_e_matrix.load(records[::-1], path) is not None      # DB order is irrelevant
+    assert delta_e_matrix.load(records, tmp_path / "absent.npy") is None
+
+
+def test_match_top_n_dedup_is_unchanged_by_the_matrix():
+    records = _records(300, seed=1)
+    # Near-duplicates inside one brand so the ΔE 2 dedup actually bites.
+    for k in range(0, 60, 2):
+        records[k + 1]['lab'] = (np.asarray(records[k]['lab']) + 0.6).tolist()
+        records[k + 1]['brand'] = records[k]['brand']
+    paints = []
+    for r in records:
+        p = Paint(name=r['paint_id'], brand=r['brand'], hex="#808080", type="layer",
+                  paint_id=r['paint_id'], measured_lab=r['lab'])
+        p.compute_properties()
+        paints.append(p)
+    plain = PaintMatcher(paints)
+    mapped = PaintMatcher(paints, distances=delta_e_matrix.build(records)[0])
+    assert mapped._distance_rows is not None
+    for r in records[:80]:
+        for brand in ('Brand', 'Other'):
+            got = mapped.match_top_n(r['lab'], brand, n=6)
+            want = plain.match_top_n(r['lab'], brand, n=6)
+            assert [p.paint_id for p, _ in got] == [p.paint_id for p, _ in want]
+
+
+def test_forge_rack_analysis_is_unchanged_by_the_matrix(monkeypatch):
+    import routes.forge as forge
+    raw = json.loads(_DB.read_text(encoding="utf-8"))
+    monkeypatch.setattr(forge, "_paints_cache", None)
+    paints = forge.get_opaque_paints()
+    monkeypatch.setattr(forge, "_distances_cache", delta_e_matrix.build(raw)[0])
+    rng = np.random.default_rng(2)
+    ids = [p['paint_id'] for p in paints]
+    inventories = [[], list(rng.choice(ids, 12, replace=False)),
+                   list(rng.choice(ids, 150, replace=False))]
+
+    def run():
+        return [asyncio.run(forge.rack_analysis(forge.RackAnalysisRequest(inventory=inv)))
+                for inv in inventories]
+
+    with_matrix = run()
+    monkeypatch.setattr(forge, "_distances_cache", None)
+    assert with_matrix == run()
@@ -69,7 +69,7 @@ def create_synthetic_miniature(degradation="none"):
     return buf.getvalue()
 
 @pytest.mark.parametrize("degradation", ["none", "blur", "noise", "tint"])
-def test_miniature_scan_pipeline(degradation):
+def test_miniature_scan_pipeline(degradation, ml_data_dir):
     image_bytes = create_synthetic_miniature(degradation)
     
     # 1. Test the scan endpoint
@@ -135,6 +135,30 @@ def test_miniature_scan_pipeline(degradation):
     assert "colours_logged" in ml_data
     assert ml_data["colours_logged"] == len(colors)
 
+def test_scan_stages_are_published_on_the_metrics_endpoint():
+    # Scans through main._run_scan rather than the HTTP route, so this module
+    # stays under the scan rate limit that later modules also draw on.
+    import asyncio
+    from main import _miniature_scanner, _run_scan
+    _miniature_scanner.result_cache.clear()
+    image = Image.open(io.BytesIO(create_synthetic_miniature()))
+    asyncio.run(_run_scan("miniature", image, None))
+    text = client.get("/api/metrics").text
+    for name in ("quality_check", "white_balance", "base_detection",
+                 "extract_colors", "build_recipes", "format_results", "scan_total"):
+        assert f'schemestealer_stage_seconds_count{{stage="{name}"}}' in text, name
+
+def test_repeat_scan_is_served_from_the_result_cache():
+    from main import _miniature_scanner
+    cache = _miniature_scanner.result_cache
+    cache.clear()
+    image = Image.open(io.BytesIO(create_synthetic_miniature("noise")))
+    first = _miniature_scanner.scan(image)
+    hits = cache.hits
+    second = _miniature_scanner.scan(image)
+    assert cache.hits == hits + 1
+    assert second == first
+
 def test_invalid_image_upload_returns_400():
     fake_image_bytes = b"This is not a real image file, just text data."
     
@@ -145,3 +169,44 @@ def test_invalid_image_upload_returns_400():
     
     assert response.status_code == 400
     assert "Invalid image file format" in response.json()["detail"]
+
+
+def test_scan_array_reads_a_read_only_frame():
+    """The process backend hands workers a read-only shared-memory view; the
+    engine must analyse it in place and agree with the PIL entry point."""
+    from main import _miniature_scanner
+
+    frame = np.array(Image.open(io.BytesIO(create_synthetic_miniature())))
+    frame.flags.writeable = False
+    _miniature_scanner.result_cache.clear()
+    from_view = _miniature_scanner.scan_array(frame)
+    _miniature_scanner.result_cache.clear()
+    from_image = _miniature_scanner.scan(Image.fromarray(frame.copy()))
+    assert [c['hex'] for c in from_view['colors']] == [c['hex'] for c in from_image['colors']]
+
+
+def test_annotate_re_renders_a_stored_scan_for_a_new_inventory():
+    import asyncio
+    from main import _miniature_scanner, _run_scan
+    image = Image.open(io.BytesIO(create_synthetic_miniature()))
+    first = asyncio.run(_run_scan("miniature", image, None))
+    assert first["scanId"]
+
+    # Own every paint except the ones recommended, so slots gain substitutes.
+    recommended = {slots["base"]["name"] for c in first["colors"]
+                   for slots in c["paintRecipe"].values() if slots["base"]}
+    inventory = [p.paint_id for p in _miniature_scanner.engine.paint_db
+                 if p.name not in recommended]
+    response = client.post("/api/scan/annotate",
+                           json={"scanId": first["scanId"], "inventory": inventory})
+    assert response.status_code == 200
+    annotated = response.json()
+    assert annotated["scanId"] == first["scanId"]
+    assert [c["hex"] for c in annotated["colors"]] == [c["hex"] for c in first["colors"]]
+    assert any(slots["base"] and slots["base"].get("owned_alternative")
+               for c in annotated["colors"] for slots in c["paintRecipe"].values())
+
+
+def test_annotate_unknown_scan_is_404():
+    response = client.post("/api/scan/annotate", json={"scanId": "nope", "inventory": []})
+    assert response.status_code == 404
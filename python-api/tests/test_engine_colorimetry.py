@@ -59,7 +59,7 @@ def test_colours_are_measured_from_unenhanced_image(engine, monkeypatch):
 
     captured = {}
 
-    def spy(img_rgb, mask):
+    def spy(img_rgb, mask, **_):
         captured["img"] = np.asarray(img_rgb).copy()
         return []
 
@@ -0,0 +1,112 @@
+"""
+The engine snapshot (core/engine_snapshot.py).
+
+A snapshot is a cache of the engine's JSON path, so restoring one must give
+back exactly the state that path derives — every Paint field, value and
+type, in DB order, and every validated recipe edge in load order — and a
+change to any input must make it stale rather than served.
+"""
+
+import dataclasses
+import functools
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core import engine_snapshot  # noqa: E402
+from core.delta_e_matrix import db_digest  # noqa: E402
+from core.recipe_graph import RecipeGraph  # noqa: E402
+from core.schemestealer_engine import SchemeStealerEngine, load_paint_db  # noqa: E402
+
+_API = Path(__file__).resolve().parent.parent
+_DB = _API / "paints_groundtruth.json"
+
+
+@pytest.fixture(scope="module")
+def built(tmp_path_factory):
+    paint_data = json.loads(_DB.read_text(encoding="utf-8"))
+    paints = load_paint_db(paint_data)
+    graph = RecipeGraph({p.paint_id: p for p in paints if p.paint_id})
+    path = engine_snapshot.write(paints, graph, db_digest(paint_data),
+                                 engine_snapshot.inputs_digest(_DB),
+                                 tmp_path_factory.mktemp("snap") / "engine.npz")
+    return paints, graph, path
+
+
+def _same(x, y) -> bool:
+    if isinstance(x, np.ndarray) or isinstance(y, np.ndarray):
+        return type(x) is type(y) and x.dtype == y.dtype and np.array_equal(x, y)
+    return type(x) is type(y) and x == y
+
+
+def test_snapshot_restores_the_json_path_state_exactly(built):
+    paints, graph, path = built
+    snapshot = engine_snapshot.load(_DB, path)
+    assert snapshot is not None
+    assert len(snapshot.paints) == len(paints)
+    for restored, derived in zip(snapshot.paints, paints):
+        for f in dataclasses.fields(derived):
+            assert _same(getattr(restored, f.name), getattr(derived, f.name)), \
+                (derived.paint_id, f.name)
+    assert snapshot.edges == list(graph.edges())
+    assert snapshot.delta_e_digest == db_digest(json.loads(_DB.read_text(encoding="utf-8")))
+
+
+def test_changed_inputs_make_the_snapshot_stale(built, tmp_path):
+    _, _, path = built
+    edited = json.loads(_DB.read_text(encoding="utf-8"))
+    edited[0]['lab'][0] += 0.5
+    db = tmp_path / "paints.json"
+    db.write_text(json.dumps(edited), encoding="utf-8")
+    assert engine_snapshot.load(db, path) is None
+    recipes = tmp_path / "recipes.json"
+    recipes.write_text('{"edges": []}', encoding="utf-8")
+    assert engine_snapshot.load(_DB, path, recipes_path=recipes) is None
+    assert engine_snapshot.load(_DB, tmp_path / "absent.npz") is None
+    (tmp_path / "junk.npz").write_bytes(b"not a zip")
+    assert engine_snapshot.load(_DB, tmp_path / "junk.npz") is None
+
+
+def test_digest_covers_the_classifier_and_recipe_code():
+    """Every core module the paint and recipe loaders reach (transitively)
+    is a digest input: a classifier or scoring change must not be served a
+    snapshot derived by the old code."""
+    import re
+    inputs = {p.name for p in engine_snapshot._DERIVING_INPUTS}
+    pending, seen = ["color_engine", "recipe_graph"], set()
+    while pending:
+        name = pending.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        source = (_API / "core" / f"{name}.py").read_text(encoding="utf-8")
+        pending += re.findall(r"^\s*from core\.(\w+) import", source, re.M)
+    assert {f"{name}.py" for name in seen} <= inputs
+
+
+def test_engine_from_snapshot_matches_engine_from_json(built, monkeypatch):
+    _, _, path = built
+    with monkeypatch.context() as m:
+        m.setattr(engine_snapshot, "load", lambda *a, **k: None)
+        from_json = SchemeStealerEngine(str(_DB))
+    monkeypatch.setattr(engine_snapshot, "load",
+                        functools.partial(engine_snapshot.load, path=path))
+    from_snapshot = SchemeStealerEngine(str(_DB))
+    assert from_snapshot.recipe_graph.edge_count() == from_json.recipe_graph.edge_count()
+    rng = np.random.default_rng(0)
+    for lab in np.column_stack([rng.uniform(10, 90, 40), rng.uniform(-50, 50, 40),
+                                rng.uniform(-50, 50, 40)]):
+        for brand in ("Citadel", "Vallejo"):
+            a = from_snapshot.matcher.match_color(None, brand, target_lab=lab)
+            b = from_json.matcher.match_color(None, brand, target_lab=lab)
+            assert getattr(a, "paint_id", None) == getattr(b, "paint_id", None)
+    for paint in from_json.paint_db:
+        for rel in ("highlight", "shade"):
+            restored = from_snapshot._paints_by_id[paint.paint_id]
+            assert (from_snapshot.recipe_graph.get_edge(restored, rel)
+                    == from_json.recipe_graph.get_edge(paint, rel))
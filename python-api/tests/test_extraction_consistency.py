@@ -309,3 +309,34 @@ def test_three_colour_scene_recovers_all_three(extractor):
     # And no fragmentation explosion: three flat regions must not balloon
     # into more than a handful of clusters after merging/dedup.
     assert len(clusters) <= 6
+
+
+def test_initial_cluster_statistics_describe_their_own_pixels(extractor, monkeypatch):
+    """The per-cluster statistics are computed in one sorted sweep, not per
+    cluster — each must still equal the statistic of exactly the cluster's
+    pixels, and local_indices must stay in pixel order."""
+    captured = {}
+    original = extractor._merge_perceptually_similar
+
+    def capture(clusters, pixels_lab, *args):
+        captured.update(clusters=clusters, pixels_lab=pixels_lab)
+        return original(clusters, pixels_lab, *args)
+
+    monkeypatch.setattr(extractor, "_merge_perceptually_similar", capture)
+    rng = np.random.default_rng(1)
+    img = np.zeros((120, 120, 3), dtype=float)
+    img[:, :60] = (150, 40, 50)
+    img[:, 60:] = (60, 90, 160)
+    img[40:80] *= np.linspace(0.5, 1.0, 120)[:, None]
+    img = np.clip(img + rng.normal(0.0, 6.0, img.shape), 0, 255).astype(np.uint8)
+    extractor.extract_colors(img, np.ones((120, 120), dtype=bool))
+
+    pixels_lab = captured["pixels_lab"]
+    assert len(captured["clusters"]) >= 2
+    for c in captured["clusters"]:
+        idx = c["local_indices"]
+        assert np.all(np.diff(idx) > 0)
+        own = pixels_lab[idx]
+        np.testing.assert_array_equal(c["median_lab"], np.median(own, axis=0))
+        np.testing.assert_allclose(c["mean_lab"], own.mean(axis=0), rtol=1e-12)
+        np.testing.assert_allclose(c["std_lab"], own.std(axis=0), rtol=1e-9)
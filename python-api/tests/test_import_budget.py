@@ -0,0 +1,35 @@
+"""
+Importing the API must not import the scan stack.
+
+main binds the port and answers /health and /api/ready before the pre-warm
+thread has built the scanners; that only holds while `import main` stays
+clear of sklearn, skimage, scipy and cv2 (about 1.5 s of imports) and of
+supabase, which loads on first use. A router that reaches for the engine
+at module level — as routes/forge once did for a DB path helper — puts
+them all back on the boot path. Checked in a fresh interpreter, since this
+one has long since imported everything.
+"""
+
+import subprocess
+import sys
+from pathlib import Path
+
+_API = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(_API))
+
+from benchmarks.import_time import HEAVY  # noqa: E402
+
+
+def test_importing_main_leaves_the_scan_stack_unimported():
+    probe = ("import sys, main; "
+             f"print(' '.join(sorted({{m.split('.')[0] for m in sys.modules}} & {set(HEAVY)!r})))")
+    out = subprocess.run([sys.executable, "-c", probe], cwd=_API,
+                         capture_output=True, text=True, check=True).stdout.strip()
+    assert out == ""
+
+
+def test_engine_module_still_re_exports_the_db_path_helpers():
+    from core import paint_db, schemestealer_engine
+    assert schemestealer_engine.resolve_paint_db_path is paint_db.resolve_paint_db_path
+    assert schemestealer_engine.CANONICAL_PAINT_DB == paint_db.CANONICAL_PAINT_DB
@@ -0,0 +1,90 @@
+"""
+Coarse-to-fine extraction (SmartColorExtractor.extract_colors(pyramid=True)).
+
+The pyramid finds the palette at half resolution, so what it must not lose
+is what half resolution blurs: cluster boundaries (refined back to the
+pixel) and thin high-chroma detail (recovered as its own cluster). The
+engine takes the pyramid for inspiration scans only, and only when
+INSPIRATION_PYRAMID is set. Card-level agreement with full-resolution
+extraction on real photographs is measured, not asserted:
+benchmarks/inspiration_pyramid.py.
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import ColorDetection  # noqa: E402
+from core.colour_maths import ciede2000_single, rgb_to_lab  # noqa: E402
+from core.smart_color_system import SmartColorExtractor  # noqa: E402
+
+_BANDS_RGB = [(140, 30, 40), (40, 60, 140), (220, 210, 180)]
+_TRIM_RGB = (40, 170, 60)
+
+
+def _artwork(seed=0):
+    """Three 40-px colour bands with a 3-px green trim line across them."""
+    rng = np.random.default_rng(seed)
+    img = np.zeros((160, 120, 3), dtype=float)
+    for i, colour in enumerate(_BANDS_RGB):
+        img[:, i * 40:(i + 1) * 40] = colour
+    img[79:82] = _TRIM_RGB
+    return np.clip(img + rng.normal(0.0, 4.0, img.shape), 0, 255).astype(np.uint8)
+
+
+def _nearest(clusters, rgb):
+    target = rgb_to_lab(np.asarray(rgb, dtype=float))
+    return min(clusters, key=lambda c: ciede2000_single(target, c["median_lab"]))
+
+
+def test_pyramid_keeps_the_palette_and_the_trim():
+    img = _artwork()
+    mask = np.ones(img.shape[:2], dtype=bool)
+    full = SmartColorExtractor().extract_colors(img, mask)
+    coarse = SmartColorExtractor().extract_colors(img, mask, pyramid=True)
+    assert sorted(c["family"] for c in coarse) == sorted(c["family"] for c in full)
+    for target in _BANDS_RGB + [_TRIM_RGB]:
+        target_lab = rgb_to_lab(np.asarray(target, dtype=float))
+        assert ciede2000_single(target_lab, _nearest(coarse, target)["median_lab"]) < 8.0
+
+
+def test_pyramid_boundaries_are_refined_to_the_pixel():
+    """Bands start on odd columns here, so a 2×2 labelling would put a
+    column of every band in its neighbour's cluster."""
+    img = _artwork()[:, 1:119]
+    mask = np.ones(img.shape[:2], dtype=bool)
+    clusters = SmartColorExtractor().extract_colors(img, mask, pyramid=True)
+    ys, xs = np.nonzero(mask)
+    for i, colour in enumerate(_BANDS_RGB):
+        cluster = _nearest(clusters, colour)
+        band = (xs[cluster["pixel_indices"]] + 1) // 40
+        trim = np.isin(ys[cluster["pixel_indices"]], (79, 80, 81))
+        assert (band[~trim] == i).mean() > 0.999, colour
+
+
+@pytest.mark.parametrize("mode, flag, expected", [
+    ("inspiration", True, True),
+    ("inspiration", False, False),
+    ("mini", True, False),
+])
+def test_engine_uses_the_pyramid_for_inspiration_only(monkeypatch, mode, flag, expected):
+    from core.schemestealer_engine import SchemeStealerEngine
+
+    engine = SchemeStealerEngine()
+    seen = []
+
+    def spy(img_rgb, mask, pyramid=False):
+        seen.append(pyramid)
+        return []
+
+    monkeypatch.setattr(engine.smart_extractor, "extract_colors", spy)
+    monkeypatch.setattr(ColorDetection, "INSPIRATION_PYRAMID", flag)
+    img = _artwork()
+    rgba = np.dstack([img, np.full(img.shape[:2], 255, dtype=np.uint8)])
+    engine.analyze_miniature(img, mode=mode, remove_base=False, use_awb=False,
+                             precomputed_rgba=rgba)
+    assert seen == [expected]
@@ -0,0 +1,98 @@
+"""
+LabSketch (core/lab_sketch.py): union medians without gathering the union.
+
+A merged cluster's median must be exactly what np.median over the
+concatenated members' pixels returns — odd and even counts, ties, parts of
+very different sizes — or merges would classify and match differently.
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.lab_sketch import LabSketch  # noqa: E402
+from core.smart_color_system import SmartColorExtractor  # noqa: E402
+
+
+def _parts(sizes, seed, quantise=False):
+    rng = np.random.default_rng(seed)
+    parts = [rng.normal([50, 0, 10], [20, 15, 15], (n, 3)) for n in sizes]
+    # Quantised values make ties across parts (and straddling the median).
+    return [np.round(p / 5) * 5 for p in parts] if quantise else parts
+
+
+def _sketched(parts, seed=0):
+    """pixels_lab holding the parts' rows shuffled, and a sketch per part."""
+    rows = np.concatenate(parts)
+    perm = np.random.default_rng(seed).permutation(len(rows))
+    pixels_lab = np.empty_like(rows)
+    pixels_lab[perm] = rows
+    bounds = np.cumsum([0] + [len(p) for p in parts])
+    return pixels_lab, [LabSketch.of(pixels_lab, perm[lo:hi])
+                        for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+
+@pytest.mark.parametrize("sizes", [(1,), (7,), (8, 1), (40, 3, 17, 1), (500, 2, 2, 500)])
+@pytest.mark.parametrize("quantise", [False, True])
+def test_union_median_is_exact(sizes, quantise):
+    parts = _parts(sizes, seed=sum(sizes), quantise=quantise)
+    union = LabSketch.merge(_sketched(parts)[1])
+    rows = np.concatenate(parts)
+    assert len(union) == len(rows)
+    np.testing.assert_array_equal(union.median(), np.median(rows, axis=0))
+
+
+def test_merges_nest():
+    """A merge of merges (dedup after the perceptual merge) is one union."""
+    parts = _parts((30, 11, 6, 90), seed=4)
+    _, sketches = _sketched(parts)
+    nested = LabSketch.merge([LabSketch.merge(sketches[:2]), LabSketch.merge(sketches[2:])])
+    np.testing.assert_array_equal(nested.median(), np.median(np.concatenate(parts), axis=0))
+
+
+def test_darker_half():
+    parts = _parts((25, 60, 4), seed=9, quantise=True)
+    pixels_lab, sketches = _sketched(parts)
+    union = LabSketch.merge(sketches)
+    rows = np.concatenate(parts)
+    expected = rows[rows[:, 0] <= np.median(rows[:, 0])]
+    darker = union.darker_half(pixels_lab, union.median()[0])
+    assert len(darker) == len(expected)
+    np.testing.assert_array_equal(np.median(darker, axis=0), np.median(expected, axis=0))
+
+
+def test_in_place_sketch_sorts_a_view_without_copying():
+    """The extractor's sketches live in its one cluster-ordered copy."""
+    parts = _parts((30, 50), seed=5)
+    columns = np.ascontiguousarray(np.concatenate(parts).T)
+    sketch = LabSketch.in_place(columns[:, 30:], np.arange(30, 80))
+    assert np.shares_memory(sketch._sorted[0], columns)
+    assert np.all(np.diff(columns[:, 30:], axis=1) >= 0)
+    np.testing.assert_array_equal(sketch.median(), np.median(parts[1], axis=0))
+
+
+def test_combine_clusters_matches_gathered_union():
+    """_combine_clusters on sketched clusters agrees with the same clusters
+    sketched from their local_indices (the path hand-built clusters take)."""
+    extractor = SmartColorExtractor()
+    pixels_lab = np.concatenate(_parts((120, 45, 80), seed=1))
+    bounds = [(0, 120), (120, 165), (165, 245)]
+    clusters = []
+    for lo, hi in bounds:
+        local = np.arange(lo, hi)
+        median = np.median(pixels_lab[local], axis=0)
+        clusters.append({
+            'median_lab': median, 'coverage': (hi - lo) / 245.0,
+            'brightness_std': 1.0, 'pixel_indices': local, 'local_indices': local,
+        })
+    plain = extractor._combine_clusters(clusters, pixels_lab)
+    sketched = extractor._combine_clusters(
+        [dict(c, lab_sketch=LabSketch.of(pixels_lab, c['local_indices'])) for c in clusters],
+        pixels_lab)
+    np.testing.assert_array_equal(plain['median_lab'], sketched['median_lab'])
+    np.testing.assert_array_equal(plain['median_lab'],
+                                  np.median(pixels_lab, axis=0))
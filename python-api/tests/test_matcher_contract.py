@@ -242,3 +242,101 @@ def test_match_top_n_deduplicates_same_brand_near_twins():
     assert len(results) == 2
     assert "distinct" in names
     assert not {"twin-a", "twin-b"}.issubset(set(names))
+
+
+# ---------------------------------------------------------------------------
+# match_many — the batched matcher is match_color, row for row
+# ---------------------------------------------------------------------------
+
+def test_match_many_is_identical_to_match_color():
+    """Every (target, brand) result of match_many must be the very paint
+    match_color returns: same family gate, shortlist, ceiling, penalty and
+    metallic competition. Pools larger than the retrieval shortlist, mixed
+    roles, metallic flags and unknown families are all exercised."""
+    rng = np.random.default_rng(11)
+    families = ["red", "orange", "blue", "green", "grey", "gold", "silver"]
+    categories = ["base", "layer", "contrast", "wash", "shade"]
+    paints = []
+    for k in range(240):
+        p = Paint(name=f"p{k}", brand=("A", "B")[k % 2], hex="#808080",
+                  type=categories[k % len(categories)],
+                  color_family=families[k % len(families)],
+                  metallic=families[k % len(families)] in ("gold", "silver"),
+                  transparency=float(rng.choice([0.0, 0.0, 0.7])), paint_id=f"p{k}",
+                  measured_lab=[float(rng.uniform(10, 90)), float(rng.uniform(-60, 60)),
+                                float(rng.uniform(-60, 60))])
+        p.compute_properties()
+        paints.append(p)
+    matcher = PaintMatcher(paints)
+
+    n = 60
+    labs = [(float(rng.uniform(5, 95)), float(rng.uniform(-70, 70)),
+             float(rng.uniform(-70, 70))) for _ in range(n)]
+    roles = [("dominant", "highlight", "shade", "wash")[k % 4] for k in range(n)]
+    target_families = [(None, "red", "blue", "grey", "nonesuch")[k % 5] for k in range(n)]
+    contexts = [None if k % 7 == 0 else {"is_metallic": k % 3 == 0} for k in range(n)]
+    brands = ["A", "B", "NoSuchBrand"]
+
+    got = matcher.match_many(labs, brands, roles, target_families, contexts)
+    for i in range(n):
+        for j, brand in enumerate(brands):
+            want = matcher.match_color(None, brand, role=roles[i], context=contexts[i],
+                                       target_family=target_families[i],
+                                       target_lab=np.asarray(labs[i]))
+            assert got[i][j] is want, (i, brand)
+    assert any(row[0] is not None for row in got)
+
+
+def test_match_many_accepts_a_single_role_and_no_targets():
+    paint = _paint("red-1", _lab_on_ray(TARGET_LAB, (1, 0, 0), 3.0))
+    matcher = PaintMatcher([paint])
+    assert matcher.match_many([TARGET_LAB], [BRAND]) == [[paint]]
+    assert matcher.match_many([], [BRAND]) == []
+
+
+def test_candidate_index_is_prebuilt_and_matches_a_fresh_mask():
+    """Every pool match_color can ask for on DB brands is built at init, and
+    each prebuilt pool is exactly the brand/role/family/metallic mask."""
+    from core.color_engine import ROLE_CATEGORIES
+    from core.recipe_geometry import FAMILY_ADJACENCY
+
+    paints = [_paint(f"{fam}-{k}", (40.0 + k, 10.0 * k, -5.0), family=fam,
+                     metallic=fam in ("gold", "silver"), category=cat)
+              for k, (fam, cat) in enumerate(
+                  [("red", "layer"), ("orange", "base"), ("gold", "layer"),
+                   ("silver", "base"), ("grey", "wash"), ("blue", "contrast")])]
+    matcher = PaintMatcher(paints)
+    size = len(matcher._index)
+    for role in ROLE_CATEGORIES:
+        for family in list(FAMILY_ADJACENCY) + [None]:
+            for flagged in (False, True):
+                matcher._pool(*matcher._candidate_key(BRAND, role, family, flagged))
+    assert len(matcher._index) == size
+
+    pool = matcher._pool(*matcher._candidate_key(BRAND, "dominant", "red", False))
+    assert pool.dtype == np.int32 and not pool.flags.writeable
+    assert [paints[i].name for i in pool] == ["red-0", "orange-1"]
+    flagged = matcher._pool(*matcher._candidate_key(BRAND, "dominant", "red", True))
+    assert [paints[i].name for i in flagged] == ["red-0", "orange-1", "gold-2", "silver-3"]
+
+
+def test_kdtree_shortlist_is_the_scan_shortlist():
+    """Above _KDTREE_MIN_POOL the shortlist comes from a k-d tree; it must be
+    the same set of paints the full OKLab scan keeps."""
+    from core import color_engine
+    from core.colour_maths import lab_to_oklab
+
+    rng = np.random.default_rng(5)
+    paints = [_paint(f"p{k}", (rng.uniform(10, 90), rng.uniform(-60, 60),
+                               rng.uniform(-60, 60)), family="red")
+              for k in range(color_engine._KDTREE_MIN_POOL + 300)]
+    matcher = PaintMatcher(paints)
+    key = matcher._candidate_key(BRAND, "dominant", "red", False)
+    pool = matcher._pool(*key)
+    assert len(pool) >= color_engine._KDTREE_MIN_POOL
+    for lab in rng.uniform([10, -50, -50], [90, 50, 50], size=(20, 3)):
+        ok = lab_to_oklab(lab)
+        tree = matcher._retrieval_shortlist(ok, pool, key)
+        scan = matcher._retrieval_shortlist(ok, pool)
+        assert sorted(tree.tolist()) == sorted(scan.tolist())
+    assert key in matcher._trees
@@ -0,0 +1,184 @@
+"""
+Memory-budget admission (services/memory_governor.py).
+
+The governor replaces a fixed scan count: scans are admitted while their
+estimated working sets fit the budget, first come first served, a scan
+larger than the budget runs alone rather than never, and gc.collect() runs
+only above the high-water mark, off the event loop.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.memory_governor import (  # noqa: E402
+    CACHE_BYTES, DEFAULT_BUDGET_BYTES, ENGINE_BYTES, INSTANCE_BYTES, MemoryGovernor,
+    instance_budget, instance_memory_bytes, scan_cost, workers_that_fit,
+)
+
+
+def _governor(budget=100, high_water=1000, rss=0):
+    collections = []
+    governor = MemoryGovernor(budget_bytes=budget, high_water_bytes=high_water,
+                              rss=lambda: rss, collect=lambda: collections.append(1))
+    return governor, collections
+
+
+async def _hold(governor, cost, log, name, release):
+    async with governor.admit(cost):
+        log.append(f"{name}+")
+        await release.wait()
+        log.append(f"{name}-")
+
+
+def test_small_scans_share_the_budget_and_a_large_one_waits():
+    async def main():
+        governor, _ = _governor(budget=100)
+        log, release = [], asyncio.Event()
+        tasks = [asyncio.create_task(_hold(governor, 40, log, "a", release)),
+                 asyncio.create_task(_hold(governor, 40, log, "b", release)),
+                 asyncio.create_task(_hold(governor, 40, log, "c", release))]
+        await asyncio.sleep(0.01)
+        assert log == ["a+", "b+"], "the third scan would overrun the budget"
+        assert governor.stats()["reserved_bytes"] == 80
+        release.set()
+        await asyncio.gather(*tasks)
+        assert log.index("c+") > log.index("a-")
+        assert governor.stats()["reserved_bytes"] == 0
+
+    asyncio.run(main())
+
+
+def test_a_scan_larger_than_the_budget_runs_alone():
+    async def main():
+        governor, _ = _governor(budget=100)
+        log, release = [], asyncio.Event()
+        small = asyncio.create_task(_hold(governor, 10, log, "small", release))
+        await asyncio.sleep(0)
+        huge = asyncio.create_task(_hold(governor, 500, log, "huge", release))
+        await asyncio.sleep(0.01)
+        assert log == ["small+"]
+        release.set()
+        await asyncio.gather(small, huge)
+        assert log == ["small+", "small-", "huge+", "huge-"]
+
+    asyncio.run(main())
+
+
+def test_reservation_is_returned_when_the_scan_raises():
+    async def main():
+        governor, _ = _governor()
+        with pytest.raises(RuntimeError):
+            async with governor.admit(50):
+                raise RuntimeError("scan failed")
+        assert governor.stats()["reserved_bytes"] == 0
+        assert governor.stats()["in_flight"] == 0
+
+    asyncio.run(main())
+
+
+def test_a_large_scan_is_not_starved_by_a_stream_of_small_ones():
+    """Small scans that would fit beside the running ones still queue behind
+    a waiting large scan, which is admitted as soon as the budget drains."""
+    async def main():
+        governor, _ = _governor(budget=100)
+        log, release = [], asyncio.Event()
+        first = asyncio.create_task(_hold(governor, 30, log, "s0", release))
+        await asyncio.sleep(0)
+        big = asyncio.create_task(_hold(governor, 90, log, "big", release))
+        await asyncio.sleep(0)
+        stream = []
+        for i in range(1, 6):
+            stream.append(asyncio.create_task(_hold(governor, 30, log, f"s{i}", release)))
+            await asyncio.sleep(0.002)
+        assert log == ["s0+"], "later small scans must not overtake the queued one"
+        assert governor.stats()["queued"] == 6
+        release.set()
+        await asyncio.gather(first, big, *stream)
+        assert log.index("big+") < min(log.index(f"s{i}+") for i in range(1, 6))
+
+    asyncio.run(main())
+
+
+def test_a_cancelled_waiter_leaves_the_queue():
+    async def main():
+        governor, _ = _governor(budget=100)
+        log, release = [], asyncio.Event()
+        holder = asyncio.create_task(_hold(governor, 80, log, "a", release))
+        await asyncio.sleep(0)
+        doomed = asyncio.create_task(_hold(governor, 80, log, "doomed", release))
+        behind = asyncio.create_task(_hold(governor, 10, log, "b", release))
+        await asyncio.sleep(0.01)
+        doomed.cancel()
+        await asyncio.sleep(0.01)
+        assert log == ["a+", "b+"]
+        release.set()
+        await asyncio.gather(holder, behind)
+        stats = governor.stats()
+        assert (stats["reserved_bytes"], stats["in_flight"], stats["queued"]) == (0, 0, 0)
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("rss,collected", [(999, False), (1001, True)])
+def test_collects_only_above_the_high_water_mark(rss, collected):
+    async def main():
+        governor, collections = _governor(high_water=1000, rss=rss)
+        async with governor.admit(10):
+            pass
+        # The collection runs on an executor thread after the release.
+        for _ in range(200):
+            if collections:
+                break
+            await asyncio.sleep(0.01)
+        assert bool(collections) is collected
+
+    asyncio.run(main())
+
+
+def test_scan_cost_scales_with_the_frame():
+    assert scan_cost(1024, 1024) == 4 * scan_cost(512, 512)
+    # A full-size scan must fit the default budget, or nothing would ever
+    # run alongside the engine on a 512 MB instance.
+    assert scan_cost(1024, 1024) <= MemoryGovernor().budget_bytes
+
+
+def test_budget_is_what_the_instance_has_left():
+    """Fixed residents — engines, both scanner caches per process, the
+    artefact store, the API process — come out of one instance-wide budget."""
+    assert DEFAULT_BUDGET_BYTES == instance_budget(1)
+    one_worker = instance_budget(1, separate_api_process=True)
+    assert one_worker < DEFAULT_BUDGET_BYTES
+    assert instance_budget(2, separate_api_process=True) <= max(one_worker - ENGINE_BYTES, 0)
+    assert instance_budget(4, separate_api_process=True) == 0
+    assert instance_budget(1, cache_bytes=0) - instance_budget(1) == 3 * CACHE_BYTES
+
+
+@pytest.mark.parametrize("limit,physical,expected", [
+    ("536870912\n", 8 << 30, 512 << 20),   # container limit below the host's memory
+    ("max\n", 2 << 30, 2 << 30),           # cgroup v2, unlimited
+    (str(2 ** 63 - 4096), 2 << 30, 2 << 30),  # cgroup v1, unlimited
+    (None, 1 << 30, 1 << 30),               # no cgroup file
+    (None, 0, INSTANCE_BYTES),              # nothing readable
+])
+def test_instance_memory_is_the_container_limit_or_the_host(tmp_path, limit, physical, expected):
+    path = tmp_path / "memory.max"
+    if limit is not None:
+        path.write_text(limit)
+    assert instance_memory_bytes([str(path)], physical=lambda: physical) == expected
+
+
+def test_default_worker_count_fits_the_instance():
+    """Each worker process holds its own engine: a 512 MB instance holds one
+    (the cpu_count default ran out of memory on a 4-core host), and however
+    many are chosen, a full-size scan still fits the budget they leave."""
+    full = scan_cost(1024, 1024)
+    assert workers_that_fit(512 << 20, full) == 1
+    for instance in (1 << 30, 2 << 30, 8 << 30):
+        n = workers_that_fit(instance, full)
+        assert instance_budget(n, True, instance) >= full
+        assert instance_budget(n + 1, True, instance) < full
@@ -0,0 +1,96 @@
+"""
+Stage latency metrics (utils/metrics.py) and the /api/metrics surface.
+
+The end-to-end pipeline tests cover the engine's stage names against a real
+scan; these pin the bookkeeping — quantiles, the Prometheus text format,
+and the worker-side collection that lets the process backend report
+timings the API process never measured itself.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils import metrics  # noqa: E402
+from utils.metrics import StageRegistry, collect_stages, stage  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def clean_registry():
+    metrics.REGISTRY.clear()
+    yield
+    metrics.REGISTRY.clear()
+
+
+def test_quantiles_come_from_the_recorded_samples():
+    reg = StageRegistry()
+    for ms in range(1, 101):
+        reg.observe("extract_colors", ms / 1000)
+    snap = reg.snapshot()["extract_colors"]
+    assert snap["count"] == 100
+    assert snap["sum"] == pytest.approx(5.05)
+    assert snap["quantiles"][0.5] == pytest.approx(0.0505)
+    assert snap["quantiles"][0.99] == pytest.approx(0.09901)
+
+
+def test_quantile_window_is_bounded_but_count_is_cumulative():
+    reg = StageRegistry(window=10)
+    for _ in range(50):
+        reg.observe("resize", 1.0)
+    for _ in range(10):
+        reg.observe("resize", 0.001)
+    snap = reg.snapshot()["resize"]
+    assert snap["count"] == 60
+    assert snap["quantiles"][0.99] == pytest.approx(0.001)
+
+
+def test_stage_records_even_when_the_block_raises():
+    with pytest.raises(RuntimeError):
+        with stage("build_recipes"):
+            raise RuntimeError("boom")
+    assert metrics.REGISTRY.snapshot()["build_recipes"]["count"] == 1
+
+
+def test_collect_stages_diverts_samples_from_the_registry():
+    with collect_stages() as samples:
+        with stage("quality_check"):
+            pass
+    assert [(kind, name) for kind, name, _ in samples] == [("stage", "quality_check")]
+    assert metrics.REGISTRY.snapshot() == {}
+    metrics.REGISTRY.merge(samples)
+    assert metrics.REGISTRY.snapshot()["quality_check"]["count"] == 1
+
+
+def test_counts_are_collected_and_rendered():
+    with collect_stages() as samples:
+        metrics.count("scan_cache_hit")
+        metrics.count("scan_cache_hit")
+    assert metrics.REGISTRY.counters() == {}
+    metrics.REGISTRY.merge(samples)
+    assert metrics.REGISTRY.counters() == {"scan_cache_hit": 2}
+    text = metrics.REGISTRY.render_prometheus()
+    assert "# TYPE schemestealer_events_total counter" in text
+    assert 'schemestealer_events_total{event="scan_cache_hit"} 2' in text
+
+
+def test_prometheus_text_format():
+    metrics.REGISTRY.observe("white_balance", 0.25)
+    text = metrics.REGISTRY.render_prometheus()
+    assert "# TYPE schemestealer_stage_seconds summary" in text
+    assert 'schemestealer_stage_seconds{stage="white_balance",quantile="0.95"} 0.250000' in text
+    assert 'schemestealer_stage_seconds_count{stage="white_balance"} 1' in text
+    assert text.endswith("\n")
+
+
+def test_metrics_endpoint_serves_prometheus_text():
+    from fastapi.testclient import TestClient
+    import main
+
+    metrics.REGISTRY.observe("format_results", 0.01)
+    response = TestClient(main.app).get("/api/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'stage="format_results"' in response.text
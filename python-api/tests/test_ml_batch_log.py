@@ -99,7 +99,7 @@ def _frontend_payload(colours: list) -> dict:
     }], "behaviours": [], "feedbacks": []}
 
 
-def test_scan_batch_log_round_trip_is_accepted(client):
+def test_scan_batch_log_round_trip_is_accepted(client, ml_data_dir):
     """Why it matters: a schema mismatch here silently destroys the ML data
     collection pipeline — every colour of every scan is rejected with 422
     and dropped after the retry budget."""
@@ -114,7 +114,7 @@ def test_scan_batch_log_round_trip_is_accepted(client):
     assert body["behaviours_logged"] == 1
 
 
-def test_hsv_boundary_values_are_accepted(client):
+def test_hsv_boundary_values_are_accepted(client, ml_data_dir):
     """h/s/v are 0-1 fractions; the exact boundaries must validate (a pure
     red has h=0.0, a fully saturated bright colour has s=v=1.0)."""
     colours = _scan_colours(client)
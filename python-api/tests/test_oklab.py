@@ -19,7 +19,7 @@ import pytest
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 from core.colour_maths import (  # noqa: E402
-    ciede2000_single, lab_to_oklab, oklab_distance, rgb_to_oklab,
+    ciede2000_single, lab_to_oklab, oklab_distance, pixels_to_lab_oklab, rgb_to_oklab,
 )
 from core.color_engine import Paint, PaintMatcher  # noqa: E402
 
@@ -55,6 +55,28 @@ def test_oklab_vectorised_matches_single():
     assert np.allclose(batch, singles, atol=1e-12)
 
 
+def test_pixel_kernel_matches_the_canonical_conversions():
+    """The uint8 LUT kernel is a faster route to the same numbers: LAB equal
+    to skimage's rgb2lab (every code value on each channel included), OKLab
+    equal to the rgb→lab→oklab chain to rounding; float32 only rounds."""
+    from skimage.color import rgb2lab
+    rng = np.random.default_rng(11)
+    pixels = rng.integers(0, 256, (70000, 3), dtype=np.uint8)   # > one chunk
+    pixels[:256] = np.arange(256)[:, None]
+    lab, oklab = pixels_to_lab_oklab(pixels)
+    assert lab.dtype == oklab.dtype == np.float64
+    np.testing.assert_array_equal(lab, rgb2lab(pixels.reshape(-1, 1, 3) / 255.0).reshape(-1, 3))
+    np.testing.assert_allclose(oklab, rgb_to_oklab(pixels), rtol=0, atol=1e-12)
+
+    lab32, oklab32 = pixels_to_lab_oklab(pixels, dtype=np.float32)
+    assert lab32.dtype == oklab32.dtype == np.float32
+    np.testing.assert_allclose(lab32, lab, atol=1e-3)
+    np.testing.assert_allclose(oklab32, oklab, atol=1e-5)
+
+    with pytest.raises(TypeError):
+        pixels_to_lab_oklab(pixels.astype(float))
+
+
 def test_oklab_distance_is_a_metric_on_samples():
     """Identity, symmetry, and the triangle inequality — the properties
     CIEDE2000 lacks and the reason OKLab owns the geometry role."""
@@ -0,0 +1,66 @@
+"""
+Preload mode (services/preload.py): the scanners are built once, at import,
+in the gunicorn master, and forked workers share them copy-on-write.
+
+Pinned here: the shared engine state is read-only (a write would both copy
+the page and silently diverge one worker from the rest), preloading freezes
+the heap, and main.py with PRELOAD_SCANNERS=1 is warm the moment it is
+imported — on the thread backend only.
+"""
+
+import gc
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+_API = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_API))
+
+from core.color_engine import Paint, PaintMatcher, _load_anchors  # noqa: E402
+from services.preload import preload_enabled, preload_scanners  # noqa: E402
+
+
+def test_matcher_and_anchor_arrays_are_read_only():
+    paints = []
+    for k, lab in enumerate([(50, 40, 20), (60, -30, 10), (30, 5, -40)]):
+        p = Paint(name=f"p{k}", brand="B", hex="#808080", type="layer",
+                  paint_id=f"p{k}", measured_lab=list(lab))
+        p.compute_properties()
+        paints.append(p)
+    m = PaintMatcher(paints)
+    for arr in (m.lab_matrix, m.oklab_matrix, m.ciede_terms.block, m.family_arr,
+                m.metallic_arr, m.transp_arr):
+        with pytest.raises(ValueError):
+            arr[0] = arr[0]
+    with pytest.raises(ValueError):
+        _load_anchors()['chromatic'][0].block[0, 0] = 0.0
+    # Selecting candidates still yields ordinary working arrays.
+    assert m.ciede_terms.take(np.array([0, 2])).block.flags.writeable
+
+
+def test_preload_builds_once_and_freezes_the_heap(monkeypatch):
+    built = []
+    try:
+        scanners = preload_scanners(lambda: built.append(1) or {"miniature": "m"})
+        assert scanners == {"miniature": "m"} and built == [1]
+        assert gc.get_freeze_count() > 0
+    finally:
+        gc.unfreeze()
+    monkeypatch.setenv("PRELOAD_SCANNERS", "1")
+    assert preload_enabled()
+    monkeypatch.setenv("PRELOAD_SCANNERS", "0")
+    assert not preload_enabled()
+
+
+@pytest.mark.parametrize("backend, warm", [("thread", True), ("process", False)])
+def test_main_is_warm_at_import_only_when_preloading_threads(backend, warm):
+    probe = ("import gc, main; "
+             "print(main._scanner_ready.is_set(), main._miniature_scanner is not None, "
+             "gc.get_freeze_count() > 0)")
+    env = {"PATH": "", "PRELOAD_SCANNERS": "1", "SCAN_BACKEND": backend}
+    out = subprocess.run([sys.executable, "-c", probe], cwd=_API, env=env,
+                         capture_output=True, text=True, check=True).stdout.split()
+    assert out == [str(warm)] * 3
@@ -0,0 +1,220 @@
+"""
+Scan result cache (services/result_cache.py) and the split it relies on:
+inventory-free recipes from the engine, owned-alternative annotations
+applied afterwards.
+
+The split must be invisible — annotating cached recipes for an inventory has
+to produce exactly what a one-shot scan with that inventory produced — and
+the cache must never hand out a recipe mutated by an earlier annotation.
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.engine_load import get_engine  # noqa: E402
+from core.schemestealer_engine import ScanArtefact  # noqa: E402
+from services.recipe_builder import format_paint_match  # noqa: E402
+from services.result_cache import (  # noqa: E402
+    ScanResultCache, annotated_recipes, cached_artefact, frame_key, inventory_digest,
+)
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+# ---------------------------------------------------------------------------
+# Cache mechanics
+# ---------------------------------------------------------------------------
+
+def test_hit_and_miss_counters():
+    cache = ScanResultCache(max_bytes=1 << 20, ttl_seconds=60)
+    assert cache.get("a") is None
+    cache.put("a", [1, 2, 3])
+    assert cache.get("a") == [1, 2, 3]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+def test_byte_budget_evicts_least_recently_used_first():
+    blob = b"x" * 4000
+    cache = ScanResultCache(max_bytes=10_000, ttl_seconds=60)
+    cache.put("a", blob)
+    cache.put("b", blob)
+    cache.get("a")                      # "b" is now the least recently used
+    cache.put("c", blob)
+    assert cache.get("b") is None
+    assert cache.get("a") == blob and cache.get("c") == blob
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] <= 10_000
+
+
+def test_entry_larger_than_the_budget_is_not_stored():
+    cache = ScanResultCache(max_bytes=100, ttl_seconds=60)
+    cache.put("a", b"x" * 1000)
+    assert cache.stats()["entries"] == 0
+
+
+def test_entries_expire_after_the_ttl():
+    clock = _Clock()
+    cache = ScanResultCache(max_bytes=1 << 20, ttl_seconds=10, clock=clock)
+    cache.put("a", "value")
+    clock.now = 9.9
+    assert cache.get("a") == "value"
+    clock.now = 10.0
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_frame_key_tracks_pixels_shape_and_kind():
+    frame = np.zeros((4, 5, 4), np.uint8)
+    key = frame_key(frame, "miniature")
+    assert frame_key(frame.copy(), "miniature") == key
+    assert frame_key(frame, "inspiration") != key
+    assert frame_key(np.zeros((5, 4, 4), np.uint8), "miniature") != key
+    changed = frame.copy()
+    changed[3, 4, 0] = 1
+    assert frame_key(changed, "miniature") != key
+
+
+def test_inventory_digest_ignores_order():
+    assert inventory_digest({"a", "b"}) == inventory_digest(["b", "a"])
+    assert inventory_digest({"a"}) != inventory_digest({"a", "b"})
+    assert inventory_digest(None) == inventory_digest(set())
+
+
+class _CountingEngine:
+    def __init__(self):
+        self.annotation_calls = 0
+
+    def ownership_annotations(self, recipes, inventory):
+        self.annotation_calls += 1
+        return {(0, "base", "Citadel"): {"name": sorted(inventory)[0]}}
+
+    @staticmethod
+    def apply_ownership(recipes, annotations):
+        from core.schemestealer_engine import SchemeStealerEngine
+        return SchemeStealerEngine.apply_ownership(recipes, annotations)
+
+
+def test_artefact_is_extracted_once_and_annotated_once_per_inventory():
+    cache = ScanResultCache(max_bytes=1 << 20, ttl_seconds=60)
+    engine = _CountingEngine()
+    extracted = []
+
+    def extract(frame):
+        extracted.append(frame.shape)
+        return ScanArtefact(recipes=({"base": {"Citadel": {"name": "Mephiston Red"}}},))
+
+    frame = np.ones((3, 3, 4), np.uint8)
+    scan_id, artefact = cached_artefact(cache, "miniature", frame, extract)
+    again_id, again_artefact = cached_artefact(cache, "miniature", frame, extract)
+    assert len(extracted) == 1
+    assert again_id == scan_id == frame_key(frame, "miniature")
+    assert again_artefact is artefact
+
+    plain = annotated_recipes(cache, engine, scan_id, artefact, None)
+    owned = annotated_recipes(cache, engine, scan_id, artefact, {"p1"})
+    again = annotated_recipes(cache, engine, scan_id, artefact, {"p1"})
+    other = annotated_recipes(cache, engine, scan_id, artefact, {"p2"})
+
+    assert engine.annotation_calls == 2
+    assert owned == again
+    assert owned[0]["base"]["Citadel"]["owned_alternative"] == {"name": "p1"}
+    assert other[0]["base"]["Citadel"]["owned_alternative"] == {"name": "p2"}
+    # The cached, inventory-free recipe was never written to.
+    assert "owned_alternative" not in plain[0]["base"]["Citadel"]
+    assert "owned_alternative" not in artefact.recipes[0]["base"]["Citadel"]
+
+
+# ---------------------------------------------------------------------------
+# The engine split
+# ---------------------------------------------------------------------------
+
+@pytest.fixture(scope="module")
+def engine():
+    return get_engine()
+
+
+def _scene():
+    rng = np.random.default_rng(7)
+    # 300x300: the analysis size, so the conftest cv2 stub's no-op resize
+    # leaves shapes consistent.
+    img = np.zeros((300, 300, 3), np.uint8)
+    img[:, :150] = (150, 20, 25)
+    img[:, 150:] = (20, 60, 130)
+    img[110:190, 60:240] = (200, 170, 40)
+    noise = rng.integers(-6, 7, img.shape)
+    return np.clip(img.astype(int) + noise, 0, 255).astype(np.uint8)
+
+
+def test_annotating_later_matches_a_one_shot_scan(engine):
+    img = _scene()
+    plain, _, _ = engine.analyze_miniature(img, mode="inspiration")
+    # Own everything except the recommended base paints, so each base slot
+    # is offered its nearest owned substitute.
+    recommended = {m["paint_id"] for r in plain for m in r["base"].values() if m}
+    inventory = {p.paint_id for p in engine.paint_db} - recommended
+    one_shot, _, _ = engine.analyze_miniature(img, mode="inspiration", inventory=inventory)
+    split = engine.annotate_inventory(plain, inventory)
+
+    def owned(recipes):
+        return [{slot: {b: (m or {}).get("owned_alternative") for b, m in r[slot].items()}
+                 for slot in ("base", "highlight", "shade", "wash")} for r in recipes]
+
+    assert owned(split) == owned(one_shot)
+    assert any(alt for r in owned(split) for slot in r.values() for alt in slot.values())
+    assert not any(alt for r in owned(plain) for slot in r.values() for alt in slot.values())
+
+
+def test_extract_returns_a_frozen_inventory_free_artefact(engine):
+    import dataclasses
+    artefact = engine.extract(_scene(), mode="inspiration")
+    assert isinstance(artefact, ScanArtefact)
+    assert isinstance(artefact.recipes, tuple) and artefact.recipes
+    assert "enhanced_image" not in artefact.quality_report
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        artefact.recipes = ()
+    assert engine.annotate_inventory(artefact, None) == list(artefact.recipes)
+
+
+def test_substitute_memo_evicts_safely_under_concurrent_scans(engine, monkeypatch):
+    """The thread backend runs several scans on one engine: evictions racing
+    on the memo's oldest key must not raise inside a scan."""
+    from concurrent.futures import ThreadPoolExecutor
+    from core import schemestealer_engine
+
+    monkeypatch.setattr(schemestealer_engine, "_SUBSTITUTE_MEMO_SIZE", 4)
+    monkeypatch.setattr(engine, "_substitute_memo", {})
+    monkeypatch.setattr(engine.matcher, "match_top_n", lambda *a, **k: [])
+    paints = list(engine.paint_db)[:200]
+
+    def annotate(offset):
+        for paint in paints[offset:] + paints[:offset]:
+            engine._substitute_candidates(paint, paint.brand, "base", paint.color_family)
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(annotate, range(0, 200, 25)))
+    assert len(engine._substitute_memo) <= 4
+
+
+def test_owned_alternative_reaches_the_api_payload():
+    match = {"paint_id": "p", "name": "Khorne Red", "hex": "#6a0001", "type": "base",
+             "owned_alternative": {"paint_id": "q", "name": "Mephiston Red",
+                                   "hex": "#9a1115", "type": "base", "deltaE": 4.2}}
+    out = format_paint_match(match, color_lab=[30.0, 45.0, 30.0])
+    assert out["owned_alternative"]["name"] == "Mephiston Red"
+    assert out["owned_alternative"]["deltaE"] == 4.2
+    assert "paint_id" not in out and "paint_id" not in out["owned_alternative"]
+
+    wash = format_paint_match(match, color_lab=[30.0, 45.0, 30.0], is_wash=True)
+    assert "deltaE" not in wash["owned_alternative"]
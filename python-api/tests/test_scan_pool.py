@@ -0,0 +1,199 @@
+"""
+Process-pool scan backend (services/scan_pool.py).
+
+The pool is exercised with a lightweight echo scanner so these tests pin the
+DISPATCH contract — warm-up reaches every worker, each scan lands in a worker
+process with its frame (a read-only shared-memory view) and inventory intact,
+the shared block is unlinked afterwards, a dead worker is replaced — not
+the colour engine, which the end-to-end tests already cover in-process.
+
+The echo factory lives in this module; spawned workers import it by name,
+which works because pytest puts tests/ on sys.path and spawn hands the
+parent's sys.path to each child.
+"""
+
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import Future
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.scan_pool import ScanPool  # noqa: E402
+from utils import metrics  # noqa: E402
+from utils.metrics import stage  # noqa: E402
+
+
+class _EchoScanner:
+    def __init__(self, kind):
+        self.kind = kind
+
+    def scan_array_with_artefact(self, frame, inventory=None):
+        if inventory == {"crash"}:
+            os._exit(1)
+        with stage("echo"):
+            pass
+        return {
+            "kind": self.kind,
+            "shape": list(frame.shape),
+            "writeable": bool(frame.flags.writeable),
+            "checksum": int(frame.astype(np.int64).sum()),
+            "inventory": sorted(inventory or []),
+            "pid": os.getpid(),
+        }, None
+
+    def extract_view(self, frame):
+        return f"view-{int(frame.sum())}", list(frame.shape)
+
+    def combine_views(self, views, inventory=None):
+        return {"kind": self.kind, "views": views, "pid": os.getpid()}
+
+    def render(self, scan_id, artefact, inventory=None):
+        return {"kind": self.kind, "scanId": scan_id, "artefact": artefact,
+                "inventory": sorted(inventory or []), "pid": os.getpid()}
+
+
+def echo_scanners():
+    return {"miniature": _EchoScanner("miniature"),
+            "inspiration": _EchoScanner("inspiration")}
+
+
+@pytest.fixture(scope="module")
+def pool():
+    p = ScanPool(2, factory=echo_scanners)
+    p.start(timeout=60)
+    yield p
+    p.shutdown()
+
+
+def test_start_warms_every_worker(pool):
+    assert pool.ready
+    pids = {pool.submit("miniature", np.zeros((2, 2, 4), np.uint8)).result(30)[0]["pid"]
+            for _ in range(8)}
+    assert os.getpid() not in pids, "scans must run outside the API process"
+
+
+def test_frame_and_inventory_reach_the_worker_intact(pool):
+    frame = np.arange(5 * 7 * 4, dtype=np.uint8).reshape(5, 7, 4)
+    out, _ = pool.submit("miniature", frame, {"citadel-mephiston-red"}).result(30)
+    assert out["kind"] == "miniature"
+    assert out["shape"] == [5, 7, 4]
+    assert out["checksum"] == int(frame.astype(np.int64).sum())
+    assert out["inventory"] == ["citadel-mephiston-red"]
+
+
+def test_pil_images_reach_the_worker_as_a_read_only_view(pool):
+    # Taller than one copy strip, so the strip boundaries are exercised.
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, size=(300, 17, 4), dtype=np.uint8)
+    out, _ = pool.submit("miniature", Image.fromarray(pixels, "RGBA")).result(30)
+    assert out["shape"] == [300, 17, 4]
+    assert out["checksum"] == int(pixels.astype(np.int64).sum())
+    assert out["writeable"] is False, "workers must not be able to write the shared frame"
+
+
+def test_worker_stage_timings_reach_the_api_process_registry(pool):
+    before = metrics.REGISTRY.snapshot().get("echo", {"count": 0})["count"]
+    pool.submit("miniature", np.zeros((2, 2, 4), np.uint8)).result(30)
+    assert metrics.REGISTRY.snapshot()["echo"]["count"] == before + 1
+
+
+def test_rgb_frames_route_to_the_inspiration_scanner(pool):
+    out, _ = pool.submit("inspiration", np.full((3, 3, 3), 9, np.uint8)).result(30)
+    assert out["kind"] == "inspiration"
+    assert out["shape"] == [3, 3, 3]
+
+
+def test_shared_block_is_unlinked_once_the_scan_settles(pool, monkeypatch):
+    from utils import shared_frame
+
+    created = []
+    real_share = shared_frame.share_frame
+
+    def _spy(frame):
+        shared = real_share(frame)
+        created.append(shared.ref.name)
+        return shared
+
+    import services.scan_pool as scan_pool
+    monkeypatch.setattr(scan_pool, "share_frame", _spy)
+    future = pool.submit("miniature", np.ones((4, 4, 4), np.uint8))
+    future.result(30)
+    assert created
+    # Done-callbacks run just after result() wakes its waiter; allow for that.
+    ref = shared_frame.FrameRef(created[0], (4, 4, 4))
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        try:
+            shared_frame.SharedFrame.attach(ref).close()
+        except FileNotFoundError:
+            return
+        time.sleep(0.01)
+    pytest.fail("shared frame was not unlinked after the scan settled")
+
+
+def test_render_runs_phase_two_in_a_worker(pool):
+    out = pool.submit_render("inspiration", "abc", ("artefact",), {"p1"}).result(30)
+    assert out["kind"] == "inspiration"
+    assert out["scanId"] == "abc"
+    assert out["artefact"] == ("artefact",)
+    assert out["inventory"] == ["p1"]
+    assert out["pid"] != os.getpid()
+
+
+def test_batch_views_are_extracted_and_combined_in_workers(pool):
+    frames = [np.full((2, 3, 4), i, np.uint8) for i in (1, 2)]
+    views = [pool.submit_view("miniature", f).result(30) for f in frames]
+    assert views == [("view-24", [2, 3, 4]), ("view-48", [2, 3, 4])]
+    out = pool.submit_combine("miniature", views).result(30)
+    assert out["views"] == views
+    assert out["pid"] != os.getpid()
+
+
+def test_unknown_kind_is_rejected(pool):
+    with pytest.raises(ValueError):
+        pool.submit("portrait", np.zeros((1, 1, 3), np.uint8))
+
+
+def test_pool_recovers_after_a_worker_dies():
+    p = ScanPool(1, factory=echo_scanners)
+    p.start(timeout=60)
+    try:
+        crashed = p.submit("miniature", np.zeros((1, 1, 4), np.uint8), {"crash"})
+        with pytest.raises(Exception):
+            crashed.result(30)
+        out, _ = p.submit("miniature", np.zeros((1, 1, 4), np.uint8)).result(60)
+        assert out["kind"] == "miniature"
+    finally:
+        p.shutdown()
+
+
+def test_main_dispatches_to_the_pool_when_configured(monkeypatch):
+    import main
+
+    class _FakePool:
+        ready = True
+
+        def __init__(self):
+            self.calls = []
+
+        def submit(self, kind, frame, inventory):
+            self.calls.append((kind, frame.size, inventory))
+            f = Future()
+            f.set_result(({"colors": [], "scanId": "x"}, "artefact"))
+            return f
+
+    fake = _FakePool()
+    monkeypatch.setattr(main, "_scan_pool", fake)
+    image = Image.new("RGBA", (4, 3))
+    result = asyncio.run(main._run_scan("miniature", image, {"p1"}))
+    assert result == {"colors": [], "scanId": "x"}
+    assert fake.calls == [("miniature", image.size, {"p1"})]
+    assert main._scan_artefacts.get("x") == ("miniature", "artefact")
+    assert main._scanners_available("inspiration")
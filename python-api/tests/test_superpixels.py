@@ -0,0 +1,74 @@
+"""
+Superpixel backends (core/superpixels.py).
+
+Every backend must honour the label-image contract the extractor relies on
+— ids ≥ 1 on masked pixels only, about n_segments of them, each segment one
+colour — and the fast grid backend must keep the extractor's baseline
+promise on a simple scene. Card-level agreement with the skimage reference
+on real photographs is measured, not asserted: benchmarks/superpixels.py.
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core import superpixels  # noqa: E402
+from core.colour_maths import ciede2000_single, rgb_to_lab  # noqa: E402
+from core.smart_color_system import SmartColorExtractor  # noqa: E402
+
+_SCENE_RGB = [(140, 30, 40), (40, 60, 140), (220, 210, 180)]
+
+
+def _scene(seed=0):
+    rng = np.random.default_rng(seed)
+    img = np.zeros((120, 120, 3), dtype=float)
+    for i, colour in enumerate(_SCENE_RGB):
+        img[:, i * 40:(i + 1) * 40] = colour
+    img = np.clip(img + rng.normal(0.0, 6.0, img.shape), 0, 255).astype(np.uint8)
+    mask = np.zeros((120, 120), dtype=bool)
+    mask[10:110, 5:115] = True
+    return img, mask
+
+
+@pytest.mark.parametrize("name", sorted(superpixels.BACKENDS))
+def test_backend_label_contract(name):
+    img, mask = _scene()
+    seg = superpixels.BACKENDS[name](img, mask, 200)
+    assert seg.shape == mask.shape
+    assert (seg[~mask] == 0).all() and (seg[mask] >= 1).all()
+    ids = np.unique(seg[mask])
+    assert 100 <= len(ids) <= 400
+    # Each segment sits on one of the three colour bands.
+    bands = np.broadcast_to(np.arange(120) // 40, mask.shape)[mask]
+    for sid in ids:
+        assert len(np.unique(bands[seg[mask] == sid])) == 1, sid
+
+
+def test_grid_ids_are_consecutive_from_one():
+    img, mask = _scene()
+    ids = np.unique(superpixels.grid_slic(img, mask, 200)[mask])
+    np.testing.assert_array_equal(ids, np.arange(1, len(ids) + 1))
+
+
+def test_backend_selection(monkeypatch):
+    monkeypatch.delenv("SUPERPIXEL_BACKEND", raising=False)
+    assert superpixels.get_backend() is superpixels.skimage_slic
+    monkeypatch.setenv("SUPERPIXEL_BACKEND", "grid")
+    assert superpixels.get_backend() is superpixels.grid_slic
+    assert SmartColorExtractor().superpixel_backend is superpixels.grid_slic
+    assert superpixels.get_backend("skimage") is superpixels.skimage_slic
+    with pytest.raises(ValueError):
+        superpixels.get_backend("lsc")
+
+
+def test_grid_backend_recovers_a_three_colour_scene():
+    img, mask = _scene()
+    clusters = SmartColorExtractor(superpixel_backend="grid").extract_colors(img, mask)
+    assert 3 <= len(clusters) <= 6
+    for target in _SCENE_RGB:
+        target_lab = rgb_to_lab(np.asarray(target, dtype=float))
+        assert min(ciede2000_single(target_lab, c["median_lab"]) for c in clusters) < 8.0
@@ -0,0 +1,70 @@
+"""
+The extractor's weighted k-means (core/weighted_kmeans.py).
+
+It replaced sklearn's KMeans(n_init=10, random_state=42) in extract_colors
+and must only ever change speed: the same labels — numbering included,
+since cluster ids and the merge inherit it — and the same centres as the
+sklearn call it replaced, including on duplicate-heavy inputs where empty
+clusters get relocated, and on the extractor's real superpixel means.
+"""
+
+import sys
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core import smart_color_system  # noqa: E402
+from core.weighted_kmeans import weighted_kmeans  # noqa: E402
+
+KMeans = pytest.importorskip("sklearn.cluster").KMeans
+
+
+def _sklearn(X, w, k):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")     # ConvergenceWarning on duplicates
+        km = KMeans(n_clusters=k, n_init=10, random_state=42).fit(X, sample_weight=w)
+    return km.labels_, km.cluster_centers_
+
+
+def _cases(seed):
+    rng = np.random.default_rng(seed)
+    for t in range(24):
+        n = int(rng.integers(5, 1600))
+        k = int(min(20, n, rng.integers(1, 25)))
+        X = rng.normal(size=(n, 3)) * rng.uniform(0.01, 0.3, 3)
+        if t % 3 == 0:
+            X = np.round(X, 1)              # many duplicate points
+        yield X, rng.integers(1, 200, n).astype(float), k
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_matches_sklearn_kmeans(seed):
+    for X, w, k in _cases(seed):
+        labels, centers = weighted_kmeans(X, w, k)
+        ref_labels, ref_centers = _sklearn(X, w, k)
+        np.testing.assert_array_equal(labels, ref_labels)
+        np.testing.assert_allclose(centers, ref_centers, rtol=0, atol=1e-12)
+
+
+def test_matches_sklearn_on_extractor_superpixels(monkeypatch):
+    calls = []
+
+    def recording(X, w, k):
+        calls.append((X.copy(), w.copy(), k))
+        return weighted_kmeans(X, w, k)
+
+    monkeypatch.setattr(smart_color_system, "weighted_kmeans", recording)
+    rng = np.random.default_rng(3)
+    img = np.zeros((240, 200, 3), np.uint8)
+    for i, colour in enumerate([(180, 30, 40), (40, 60, 150), (200, 170, 60), (60, 120, 60)]):
+        img[i * 60:(i + 1) * 60] = colour
+    img = np.clip(img + rng.normal(0, 6, img.shape), 0, 255).astype(np.uint8)
+    smart_color_system.SmartColorExtractor().extract_colors(img, np.ones(img.shape[:2], bool))
+
+    assert calls
+    for X, w, k in calls:
+        np.testing.assert_array_equal(weighted_kmeans(X, w, k)[0], _sklearn(X, w, k)[0])
@@ -33,6 +33,9 @@ _XYZ_D65 = np.array([0.95047, 1.0, 1.08883])
 _AWB_DEGREE = 0.7
 _AWB_NEUTRAL_SPREAD = 0.40
 _AWB_MIN_NEUTRAL_FRACTION = 0.02
+# Opaque pixels (alpha >= 128) needed before the alpha mask restricts the
+# illuminant estimate; below this the estimate uses every pixel.
+_AWB_MIN_OPAQUE = 100
 
 
 def _srgb_to_linear(x: np.ndarray) -> np.ndarray:
@@ -77,7 +80,7 @@ def apply_white_balance(img_rgb: np.ndarray,
     candidates = np.ones(len(flat), dtype=bool)
     if alpha_mask is not None and alpha_mask.shape == img_rgb.shape[:2]:
         opaque = (alpha_mask.reshape(-1) >= 128)
-        if opaque.sum() >= 100:
+        if opaque.sum() >= _AWB_MIN_OPAQUE:
             candidates = opaque
 
     # Near-neutral pixels: small relative channel spread (in gamma-encoded
@@ -108,6 +111,29 @@ def apply_white_balance(img_rgb: np.ndarray,
     return (out * 255.0).astype(np.uint8)
 
 
+def apply_white_balance_crop(img_rgb: np.ndarray,
+                             alpha_mask: np.ndarray,
+                             rect: Tuple[int, int, int, int],
+                             p: int = 6) -> np.ndarray:
+    """apply_white_balance(img_rgb, alpha_mask)[crop], without balancing the
+    whole frame.
+
+    The correction is per-pixel and the illuminant is estimated only over
+    opaque pixels, so when `rect` (x, y, w, h) encloses every opaque pixel —
+    the bounding box of the non-zero alpha always does — balancing just the
+    crop gives the identical result while the float64 working copies shrink
+    from frame size to crop size. With too few opaque pixels the estimate
+    falls back to the whole frame, and so does this.
+    """
+    x, y, w, h = rect
+    if alpha_mask is not None and alpha_mask.shape == img_rgb.shape[:2]:
+        crop_alpha = alpha_mask[y:y + h, x:x + w]
+        if np.count_nonzero(crop_alpha >= 128) >= _AWB_MIN_OPAQUE:
+            return apply_white_balance(img_rgb[y:y + h, x:x + w],
+                                       alpha_mask=crop_alpha, p=p)
+    return apply_white_balance(img_rgb, alpha_mask=alpha_mask, p=p)[y:y + h, x:x + w]
+
+
 def increase_saturation(img: np.ndarray, scale: float = 1.3) -> np.ndarray:
     """
     Boost image saturation for visualization
@@ -0,0 +1,166 @@
+"""
+Per-stage latency metrics for the scan pipeline.
+
+Each analysis stage runs inside `with stage("name"):`. The elapsed wall time
+lands in a per-stage summary — a cumulative count and sum, plus a bounded
+window of the most recent samples that p50/p95/p99 are read from — and the
+lot is exposed as Prometheus text at /api/metrics, together with plain event
+counters (count(), e.g. result-cache hits and misses).
+
+Scans on the process backend run in worker processes whose registry nobody
+can scrape, so a worker collects its scan's samples and counts
+(collect_stages) and ships them back with the result; the API process merges
+them into its own registry. In-process scans record straight into the
+registry.
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Samples kept per stage for the quantiles. A sliding window rather than the
+# full history, so the percentiles describe current behaviour (a deploy that
+# fixes a slow stage shows up within a few hundred scans).
+_WINDOW = 1024
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+_METRIC = "schemestealer_stage_seconds"
+_COUNTER = "schemestealer_events_total"
+
+# A collected sample: ('stage', name, seconds) or ('count', name, increment).
+Sample = Tuple[str, str, float]
+
+
+class StageSummary:
+    """Count, sum and a recent-sample window for one stage."""
+
+    def __init__(self, window: int = _WINDOW):
+        self.count = 0
+        self.total = 0.0
+        self.samples: Deque[float] = deque(maxlen=window)
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.samples.append(seconds)
+
+    def quantiles(self) -> Dict[float, float]:
+        if not self.samples:
+            return {q: float('nan') for q in QUANTILES}
+        values = np.percentile(np.fromiter(self.samples, dtype=float),
+                               [q * 100 for q in QUANTILES])
+        return dict(zip(QUANTILES, (float(v) for v in values)))
+
+
+class StageRegistry:
+    """Thread-safe set of StageSummary objects keyed by stage name, plus
+    integer event counters."""
+
+    def __init__(self, window: int = _WINDOW):
+        self._window = window
+        self._stages: Dict[str, StageSummary] = {}
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            summary = self._stages.get(name)
+            if summary is None:
+                summary = self._stages[name] = StageSummary(self._window)
+            summary.observe(seconds)
+
+    def increment(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def merge(self, samples: List[Sample]) -> None:
+        """Fold in samples collected in another process."""
+        for kind, name, value in samples:
+            if kind == 'count':
+                self.increment(name, int(value))
+            else:
+                self.observe(name, value)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {
+                name: {'count': s.count, 'sum': s.total, 'quantiles': s.quantiles()}
+                for name, s in sorted(self._stages.items())
+            }
+
+    def counters(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(sorted(self._counters.items()))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+
+    def render_prometheus(self) -> str:
+        """The registry in Prometheus text exposition format (0.0.4)."""
+        lines = [
+            f"# HELP {_METRIC} Wall time spent in each scan pipeline stage.",
+            f"# TYPE {_METRIC} summary",
+        ]
+        for name, snap in self.snapshot().items():
+            for q, value in snap['quantiles'].items():
+                lines.append(f'{_METRIC}{{stage="{name}",quantile="{q:g}"}} {value:.6f}')
+            lines.append(f'{_METRIC}_sum{{stage="{name}"}} {snap["sum"]:.6f}')
+            lines.append(f'{_METRIC}_count{{stage="{name}"}} {snap["count"]}')
+        counters = self.counters()
+        if counters:
+            lines += [
+                f"# HELP {_COUNTER} Scan pipeline events.",
+                f"# TYPE {_COUNTER} counter",
+            ]
+            lines += [f'{_COUNTER}{{event="{name}"}} {n}' for name, n in counters.items()]
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = StageRegistry()
+
+# The per-thread sample list while collect_stages() is active.
+_local = threading.local()
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time the enclosed block as one sample of `name`. The sample is
+    recorded even when the block raises — a failing stage still cost time."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        collected: Optional[list] = getattr(_local, 'samples', None)
+        if collected is not None:
+            collected.append(('stage', name, elapsed))
+        else:
+            REGISTRY.observe(name, elapsed)
+
+
+def count(name: str, n: int = 1) -> None:
+    """Bump the event counter `name`."""
+    collected: Optional[list] = getattr(_local, 'samples', None)
+    if collected is not None:
+        collected.append(('count', name, n))
+    else:
+        REGISTRY.increment(name, n)
+
+
+@contextmanager
+def collect_stages() -> Iterator[List[Sample]]:
+    """Divert this thread's stage samples and counts into a list instead of
+    the registry — used by scan workers to return them with the result."""
+    previous = getattr(_local, 'samples', None)
+    _local.samples = []
+    try:
+        yield _local.samples
+    finally:
+        _local.samples = previous
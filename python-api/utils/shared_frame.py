@@ -0,0 +1,124 @@
+"""
+Shared-memory frames for the process scan backend.
+
+Pickling a decoded 1024×1024 RGBA frame into a worker costs a full copy on each
+side of the pipe plus the pickle buffer itself. A SharedFrame instead writes
+the decoded pixels ONCE into a multiprocessing.shared_memory block; only the
+tiny FrameRef (block name, shape, dtype) crosses the process boundary and the
+worker runs the engine on a read-only view of the same pages.
+
+Ownership: the API process creates the block and is the only side that
+unlinks it (release). Workers attach, view and close — never unlink.
+"""
+
+import logging
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Rows copied per strip in from_image. PIL exports pixels through tobytes(),
+# so copying in strips bounds the temporary to one strip instead of a second
+# full frame.
+_COPY_ROWS = 128
+
+
+@dataclass(frozen=True)
+class FrameRef:
+    """The picklable handle a worker needs to attach to a SharedFrame."""
+    name: str
+    shape: Tuple[int, ...]
+    dtype: str = '|u1'
+
+
+class SharedFrame:
+    """One image frame held in a shared-memory block."""
+
+    def __init__(self, shm: shared_memory.SharedMemory, ref: FrameRef, owner: bool):
+        self._shm = shm
+        self.ref = ref
+        self._owner = owner
+        self._closed = False
+
+    @classmethod
+    def create(cls, shape: Tuple[int, ...], dtype=np.uint8) -> 'SharedFrame':
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        # A zero-byte block is rejected by the OS; keep at least one byte.
+        shm = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+        return cls(shm, FrameRef(shm.name, tuple(int(s) for s in shape), dtype.str), owner=True)
+
+    @classmethod
+    def from_array(cls, frame: np.ndarray) -> 'SharedFrame':
+        shared = cls.create(frame.shape, frame.dtype)
+        np.copyto(shared.array(), frame)
+        return shared
+
+    @classmethod
+    def from_image(cls, image: Image.Image) -> 'SharedFrame':
+        """Write a decoded PIL image into a new block, strip by strip.
+
+        RGB and RGBA frames are stored as-is; any other mode is converted to
+        RGB, the same normalisation the scanners apply."""
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGB')
+        width, height = image.size
+        shared = cls.create((height, width, len(image.mode)))
+        dst = shared.array()
+        for top in range(0, height, _COPY_ROWS):
+            bottom = min(top + _COPY_ROWS, height)
+            dst[top:bottom] = np.asarray(image.crop((0, top, width, bottom)))
+        return shared
+
+    @classmethod
+    def attach(cls, ref: FrameRef) -> 'SharedFrame':
+        """Worker side: map an existing block without taking ownership."""
+        return cls(shared_memory.SharedMemory(name=ref.name), ref, owner=False)
+
+    def array(self) -> np.ndarray:
+        """A writable view over the block (owner side, for filling it)."""
+        return np.ndarray(self.ref.shape, dtype=np.dtype(self.ref.dtype),
+                          buffer=self._shm.buf)
+
+    def view(self) -> np.ndarray:
+        """A read-only view over the block — what the engine analyses."""
+        view = self.array()
+        view.flags.writeable = False
+        return view
+
+    def close(self) -> None:
+        """Unmap this process's handle. A view that outlived its caller (a
+        traceback holding a frame, say) keeps the mapping alive; it is then
+        released when that view is collected."""
+        if self._closed:
+            return
+        try:
+            self._shm.close()
+            self._closed = True
+        except BufferError:
+            logger.warning(f"Shared frame {self.ref.name} still has live views; "
+                           "deferring unmap to garbage collection")
+
+    def release(self) -> None:
+        """Owner side: unmap and unlink the block. Idempotent."""
+        self.close()
+        if self._owner:
+            self._owner = False
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+FrameSource = Union[Image.Image, np.ndarray]
+
+
+def share_frame(frame: FrameSource) -> SharedFrame:
+    """Place a PIL image or an ndarray in shared memory."""
+    if isinstance(frame, Image.Image):
+        return SharedFrame.from_image(frame)
+    return SharedFrame.from_array(np.asarray(frame))
@@ -22,6 +22,9 @@ interface ScanResponse {
   colors?: Color[];
   paints?: Paint[];
   mask_frame?: MaskFrame;
+  // Server-side key of the scan's stored analysis; POST it with a changed
+  // inventory to /api/scan/annotate to re-annotate without re-uploading.
+  scanId?: string;
 }
 
 /**